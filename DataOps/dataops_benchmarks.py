@@ -0,0 +1,318 @@
+"""Offline benchmarks for the YouTube data pipeline helpers.
+
+Run a single benchmark from the DataOps folder, e.g.
+
+    python dataops_benchmarks.py stats
+"""
+
+import argparse
+import copy
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from dataops_utils import (
+    VIDEO_DATA_VALIDATION_SCHEMA,
+    clean_video_data,
+    ingest_channel_video_ids,
+    ingest_video_stats,
+    ingest_video_transcript,
+    validate_video_data,
+)
+from youtube_api_stub import (
+    FakeTranscriptClient,
+    generate_channel_videos,
+    start_stub_server,
+)
+
+
+def _timed(func, *args, **kwargs):
+    """Run `func` and return its result along with the elapsed seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_video_stats(n_videos=2000, latency=0.05, max_workers=4):
+    """Compare per-video and batched statistics ingestion against the local stub
+    server.
+
+    Args:
+        n_videos (int, optional): Number of videos on the stub channel.
+        latency (float, optional): Simulated seconds per API round trip.
+        max_workers (int, optional): Concurrent chunks for the batched mode.
+
+    Returns:
+        dict: Elapsed seconds for each mode and the resulting speedup.
+    """
+    server, base_url = start_stub_server(
+        generate_channel_videos(n_videos), latency=latency
+    )
+    try:
+        video_ids = ingest_channel_video_ids("stub-key", "stub", base_url=base_url)
+
+        sequential, sequential_time = _timed(
+            ingest_video_stats, copy.deepcopy(video_ids), "stub-key", base_url=base_url
+        )
+        batched, batched_time = _timed(
+            ingest_video_stats,
+            copy.deepcopy(video_ids),
+            "stub-key",
+            batched=True,
+            max_workers=max_workers,
+            base_url=base_url,
+        )
+    finally:
+        server.shutdown()
+
+    assert sequential == batched, "batched mode returned different records"
+
+    return {
+        "videos": n_videos,
+        "sequential_seconds": round(sequential_time, 3),
+        "batched_seconds": round(batched_time, 3),
+        "speedup": round(sequential_time / batched_time, 1),
+    }
+
+
+def benchmark_transcripts(n_videos=200, latency=0.05, failure_rate=0.1, max_workers=16):
+    """Compare sequential and concurrent transcript ingestion against a fake
+    transcript client that fails transiently at `failure_rate`.
+
+    Args:
+        n_videos (int, optional): Number of videos to fetch transcripts for.
+        latency (float, optional): Simulated seconds per transcript request.
+        failure_rate (float, optional): Probability that a request fails.
+        max_workers (int, optional): Concurrent requests for the concurrent mode.
+
+    Returns:
+        dict: Elapsed seconds for each mode, the speedup and the concurrent
+        run's outcome report.
+    """
+    videos = [
+        {"video_id": video["video_id"]} for video in generate_channel_videos(n_videos)
+    ]
+
+    sequential, sequential_time = _timed(
+        ingest_video_transcript,
+        copy.deepcopy(videos),
+        FakeTranscriptClient(latency, failure_rate),
+        backoff=0.01,
+    )
+    (concurrent, report), concurrent_time = _timed(
+        ingest_video_transcript,
+        copy.deepcopy(videos),
+        FakeTranscriptClient(latency, failure_rate),
+        max_workers=max_workers,
+        backoff=0.01,
+        return_report=True,
+    )
+
+    assert sequential == concurrent, "concurrent mode returned different records"
+
+    return {
+        "videos": n_videos,
+        "sequential_seconds": round(sequential_time, 3),
+        "concurrent_seconds": round(concurrent_time, 3),
+        "speedup": round(sequential_time / concurrent_time, 1),
+        **report,
+    }
+
+
+def generate_video_corpus(n_rows=1_000_000, words=50, non_ascii_share=0.05, seed=9999):
+    """Generate a synthetic raw Youtube video dataset in the shape of
+    `pd.DataFrame(video_data)` (string counts, string timestamps, some missing
+    values and unicode characters).
+
+    Args:
+        n_rows (int, optional): Number of videos. Defaults to 1,000,000.
+        words (int, optional): Approximate words per transcript. Defaults to 50.
+        non_ascii_share (float, optional): Share of titles & transcripts that
+        contain unicode characters. Defaults to 0.05.
+        seed (int, optional): Random seed.
+
+    Returns:
+        pd.DataFrame: Raw video data.
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array(["data", "model", "pipeline", "drift", "feature", "deploy"])
+
+    # build transcripts from a small pool of distinct texts to keep generation fast
+    pool = [
+        " ".join(rng.choice(vocabulary, size=rng.integers(words // 2, words * 2)))
+        for _ in range(1000)
+    ]
+    transcripts = np.array(pool, dtype=object)[rng.integers(0, len(pool), n_rows)]
+    titles = np.array([f"Video {i}" for i in range(1000)], dtype=object)[
+        rng.integers(0, 1000, n_rows)
+    ]
+
+    unicode_rows = rng.random(n_rows) < non_ascii_share
+    transcripts[unicode_rows] = transcripts[unicode_rows] + " caf\u00e9 \u2014 na\u00efve"
+    titles[unicode_rows] = titles[unicode_rows] + " \u2013 r\u00e9sum\u00e9"
+
+    views = rng.lognormal(8, 1.5, n_rows).astype("int64").astype(str).astype(object)
+    views[rng.random(n_rows) < 0.001] = None
+    published = pd.Timestamp("2025-01-01", tz="UTC") - pd.to_timedelta(
+        rng.integers(0, 3650 * 24, n_rows), unit="h"
+    )
+
+    return pd.DataFrame(
+        {
+            "channel_id": "UC_STUB_CHANNEL",
+            "video_id": [f"vid{i:08d}" for i in range(n_rows)],
+            "datetime": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "title": titles,
+            "views": views,
+            "likes": rng.integers(0, 5000, n_rows).astype(str),
+            "comments": rng.integers(0, 500, n_rows).astype(str),
+            "transcript": transcripts,
+        }
+    )
+
+
+def _notebook_clean(raw_data):
+    """The cleaning cell of youtube-data-pipeline.ipynb before it was replaced by
+    `clean_video_data()`, kept as the benchmark baseline."""
+    cleaned_data = raw_data.dropna()
+    cleaned_data = cleaned_data.drop_duplicates()
+    for col in ["views", "likes", "comments"]:
+        cleaned_data[col] = pd.to_numeric(cleaned_data[col], errors="coerce")
+    cleaned_data["datetime"] = pd.to_datetime(cleaned_data["datetime"], errors="coerce")
+    cleaned_data = cleaned_data.dropna(subset=["datetime"])
+
+    mean_views = cleaned_data["views"].mean()
+    std_views = cleaned_data["views"].std()
+    cleaned_data = cleaned_data[cleaned_data["views"] >= (mean_views - 3 * std_views)]
+
+    cleaned_data["transcript_length"] = cleaned_data["transcript"].apply(
+        lambda x: len(x) if pd.notnull(x) else 0
+    )
+    mean_transcript_length = cleaned_data["transcript_length"].mean()
+    std_transcript_length = cleaned_data["transcript_length"].std()
+    cleaned_data = cleaned_data[
+        cleaned_data["transcript_length"]
+        >= (mean_transcript_length - 3 * std_transcript_length)
+    ]
+
+    def clean_text(text):
+        if isinstance(text, str):
+            return (
+                unicodedata.normalize("NFKD", text)
+                .encode("ascii", "ignore")
+                .decode("ascii")
+            )
+        return text
+
+    cleaned_data["title"] = cleaned_data["title"].apply(clean_text)
+    cleaned_data["transcript"] = cleaned_data["transcript"].apply(clean_text)
+    return cleaned_data
+
+
+def benchmark_cleaning(n_rows=1_000_000):
+    """Compare the notebook's original per-row cleaning cell with
+    `clean_video_data()` on a synthetic corpus.
+
+    Args:
+        n_rows (int, optional): Number of videos in the synthetic corpus.
+
+    Returns:
+        dict: Elapsed seconds and rows kept for each implementation.
+    """
+    raw_data = generate_video_corpus(n_rows)
+
+    with pd.option_context("mode.chained_assignment", None):
+        notebook, notebook_time = _timed(_notebook_clean, raw_data)
+    vectorized, vectorized_time = _timed(clean_video_data, raw_data)
+
+    assert notebook["transcript"].equals(vectorized["transcript"].reindex(notebook.index))
+
+    return {
+        "rows": n_rows,
+        "notebook_seconds": round(notebook_time, 3),
+        "vectorized_seconds": round(vectorized_time, 3),
+        "speedup": round(notebook_time / vectorized_time, 1),
+        "notebook_rows_kept": len(notebook),
+        "vectorized_rows_kept": len(vectorized),
+    }
+
+
+def _gx_validate(cleaned_data):
+    """The Great Expectations validation cells of youtube-data-pipeline.ipynb,
+    kept as the benchmark baseline."""
+    import great_expectations as gx
+
+    gx_types = {"string": "object", "int64": "int64", "datetime": "Timestamp"}
+
+    context = gx.get_context()
+    data_source = context.data_sources.add_pandas("pandas")
+    data_asset = data_source.add_dataframe_asset(name="Youtube video data")
+    batch_definition = data_asset.add_batch_definition_whole_dataframe("batch definition")
+    batch = batch_definition.get_batch(batch_parameters={"dataframe": cleaned_data})
+
+    suite = context.suites.add(gx.ExpectationSuite(name="Youtube video data expectations"))
+    for column, rules in VIDEO_DATA_VALIDATION_SCHEMA.items():
+        suite.add_expectation(gx.expectations.ExpectColumnToExist(column=column))
+        suite.add_expectation(
+            gx.expectations.ExpectColumnValuesToBeOfType(
+                column=column, type_=gx_types[rules["type"]]
+            )
+        )
+        suite.add_expectation(gx.expectations.ExpectColumnValuesToNotBeNull(column=column))
+
+    return batch.validate(suite)
+
+
+def benchmark_validation(n_rows=1_000_000, sample=100_000):
+    """Compare the notebook's Great Expectations suite with
+    `validate_video_data()` on a cleaned synthetic corpus. The Great Expectations
+    path is skipped if it isn't installed.
+
+    Args:
+        n_rows (int, optional): Number of videos in the synthetic corpus.
+        sample (int, optional): Rows to check in the sampled run.
+
+    Returns:
+        dict: Elapsed seconds and success for each implementation.
+    """
+    cleaned_data = clean_video_data(generate_video_corpus(n_rows))
+
+    results, validate_time = _timed(validate_video_data, cleaned_data)
+    sampled, sampled_time = _timed(validate_video_data, cleaned_data, sample=sample)
+    summary = {
+        "rows": len(cleaned_data),
+        "validator_seconds": round(validate_time, 3),
+        "validator_success": results.success,
+        "sampled_validator_seconds": round(sampled_time, 3),
+        "sampled_validator_success": sampled.success,
+    }
+
+    try:
+        gx_results, gx_time = _timed(_gx_validate, cleaned_data)
+    except ImportError:
+        summary["gx_seconds"] = "great_expectations not installed"
+    else:
+        assert gx_results.success == results.success, "validators disagree"
+        summary["gx_seconds"] = round(gx_time, 3)
+        summary["speedup"] = round(gx_time / validate_time, 1)
+
+    return summary
+
+
+BENCHMARKS = {
+    "stats": benchmark_video_stats,
+    "transcripts": benchmark_transcripts,
+    "cleaning": benchmark_cleaning,
+    "validation": benchmark_validation,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+
+    for name, value in BENCHMARKS[args.benchmark]().items():
+        print(f"{name}: {value}")
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# default seconds each endpoint's cached responses stay fresh. Search pages and
+# statistics change as new videos are published and viewed, transcripts rarely do.
+DEFAULT_TTLS = {
+    "search": 6 * 60 * 60,
+    "videos": 60 * 60,
+    "transcript": 30 * 24 * 60 * 60,
+}
+
+# request parameters that do not change the response and must never be written
+# to disk
+IGNORED_PARAMS = {"key"}
+
+
+def _cache_params(params):
+    """Request parameters that identify a cached response."""
+    return {k: v for k, v in params.items() if k not in IGNORED_PARAMS}
+
+
+class CacheMiss(KeyError):
+    """Raised in replay-only mode when a request has no cached response."""
+
+
+class ResponseCache:
+    """On-disk cache of YouTube API responses for the `dataops_utils` ingestors.
+
+    Each response is stored as a JSON file named after a hash of the endpoint and
+    request parameters (excluding the API key). Entries expire after their
+    endpoint's TTL, and once the cache grows beyond `max_bytes` the least
+    recently used entries are evicted.
+
+    Args:
+        cache_dir (str, optional): Directory to store cached responses in.
+        Defaults to ".youtube_cache".
+        ttls (dict, optional): Seconds responses stay fresh, keyed by endpoint
+        ("search", "videos" or "transcript"). Merged with `DEFAULT_TTLS`. A TTL
+        of None never expires.
+        max_bytes (int, optional): Maximum total size of the cache. Defaults to
+        500 MB.
+        replay_only (bool, optional): If True, never go to the network: serve
+        cached responses regardless of age and raise `CacheMiss` for anything
+        not cached. Defaults to False.
+
+    Example:
+        >>> cache = ResponseCache(".youtube_cache")
+        >>> video_ids = ingest_channel_video_ids(API_KEY, CHANNEL_ID, cache=cache)
+    """
+
+    def __init__(
+        self,
+        cache_dir=".youtube_cache",
+        ttls=None,
+        max_bytes=500 * 1024**2,
+        replay_only=False,
+    ):
+        self.cache_dir = cache_dir
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+
+    def _path(self, endpoint, params):
+        """Path of the file caching the response to a given request."""
+        request = {"endpoint": endpoint, "params": _cache_params(params)}
+        digest = hashlib.sha256(
+            json.dumps(request, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return os.path.join(self.cache_dir, f"{endpoint}-{digest}.json")
+
+    def _entries(self):
+        """(path, last access time, size) of every cached response."""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def get(self, endpoint, params):
+        """Return the cached response to a request, or None if it is not cached
+        or has expired (in replay-only mode, raise `CacheMiss` instead)."""
+        path = self._path(endpoint, params)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            entry = None
+
+        ttl = self.ttls.get(endpoint)
+        expired = (
+            entry is not None
+            and ttl is not None
+            and time.time() - entry["created"] > ttl
+        )
+
+        if entry is None or (expired and not self.replay_only):
+            with self._lock:
+                self.misses += 1
+            if self.replay_only:
+                raise CacheMiss(
+                    f"no cached response for {endpoint} {_cache_params(params)}"
+                )
+            return None
+
+        # mark as recently used for LRU eviction
+        os.utime(path)
+        with self._lock:
+            self.hits += 1
+        return entry["payload"]
+
+    def set(self, endpoint, params, payload):
+        """Cache the response to a request, evicting least recently used
+        responses if the cache grows beyond `max_bytes`."""
+        path = self._path(endpoint, params)
+        data = json.dumps({"created": time.time(), "payload": payload})
+
+        with self._lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+
+            # write atomically so concurrent readers never see a partial file
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(data)
+            os.replace(tmp_path, path)
+
+            self._size += os.path.getsize(path) - previous_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def fetch(self, endpoint, params, request):
+        """Return the cached response to a request, calling `request()` and
+        caching its result on a miss."""
+        payload = self.get(endpoint, params)
+        if payload is None:
+            payload = request()
+            self.set(endpoint, params, payload)
+        return payload
+
+    def _evict(self):
+        """Delete least recently used responses until the cache fits in
+        `max_bytes`. Must be called while holding the lock."""
+        for path, _, size in sorted(self._entries(), key=lambda entry: entry[1]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+
+    def clear(self):
+        """Delete every cached response."""
+        with self._lock:
+            for path, _, _ in list(self._entries()):
+                os.remove(path)
+            self._size = 0
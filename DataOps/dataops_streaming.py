@@ -0,0 +1,329 @@
+"""Streaming version of the Youtube data pipeline.
+
+Rather than building a list of every video (and every transcript) before
+writing a single parquet file, each stage here is a generator that passes
+records on as soon as they are enriched. Cleaned records are written out in
+bounded-size Parquet row groups, so peak memory is set by `chunk_size` rather
+than by the size of the channel.
+
+Example:
+    >>> summary = run_streaming_pipeline(
+    ...     API_KEY, CHANNEL_ID, "data/youtube_video_data.parquet", chunk_size=500
+    ... )
+"""
+
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from youtube_transcript_api import YouTubeTranscriptApi
+
+from dataops_utils import (
+    MAX_IDS_PER_REQUEST,
+    YOUTUBE_API_URL,
+    _add_video_stats,
+    _fetch_transcript,
+    _request_video_stats_batch,
+    build_session,
+    clean_video_data,
+    iter_channel_video_ids,
+)
+
+# schema of the cleaned Youtube video data, shared by every row group
+VIDEO_DATA_SCHEMA = pa.schema(
+    [
+        ("channel_id", pa.string()),
+        ("video_id", pa.string()),
+        ("datetime", pa.timestamp("ns", tz="UTC")),
+        ("title", pa.string()),
+        ("views", pa.int64()),
+        ("likes", pa.int64()),
+        ("comments", pa.int64()),
+        ("transcript", pa.string()),
+        ("transcript_length", pa.int64()),
+    ]
+)
+
+
+def _chunked(iterable, size):
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def _ordered_map(func, items, max_workers):
+    """Apply `func` to each item on a thread pool and yield `(item, result)`
+    pairs in input order. Unlike `executor.map`, at most `2 * max_workers` items
+    are read ahead of the consumer, so an unbounded stream is never pulled
+    into memory."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= 2 * max_workers:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+def iter_video_stats(
+    videos,
+    api_key,
+    max_workers=4,
+    session=None,
+    base_url=YOUTUBE_API_URL,
+    cache=None,
+):
+    """Streaming version of `dataops_utils.ingest_video_stats(batched=True)`.
+
+    Args:
+        videos (iterable): Video records, e.g. from `iter_channel_video_ids()`.
+        api_key (str): Your Youtube API key.
+        max_workers (int, optional): Maximum number of 50-video requests in flight.
+        session (requests.Session, optional): Session to send requests with.
+        base_url (str, optional): Base URL of the YouTube Data API.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve statistics from.
+
+    Yields:
+        dict: Each video record enhanced with its views, likes and comments.
+    """
+    if session is None:
+        session = build_session(pool_size=max_workers)
+
+    def request(chunk):
+        video_ids = [video["video_id"] for video in chunk]
+        return _request_video_stats_batch(video_ids, api_key, session, base_url, cache)
+
+    chunks = _chunked(videos, MAX_IDS_PER_REQUEST)
+    for chunk, stats in _ordered_map(request, chunks, max_workers):
+        for video in chunk:
+            _add_video_stats(video, stats.get(video["video_id"], {}))
+            yield video
+
+
+def iter_video_transcripts(
+    videos,
+    transcript_client=YouTubeTranscriptApi,
+    max_workers=8,
+    timeout=None,
+    max_retries=3,
+    backoff=1.0,
+    cache=None,
+):
+    """Streaming version of `dataops_utils.ingest_video_transcript()`. Takes the
+    same arguments, except that `videos` can be any iterable of video records.
+
+    Yields:
+        dict: Each video record enhanced with its transcript.
+    """
+
+    def fetch(video):
+        return _fetch_transcript(
+            video["video_id"], transcript_client, timeout, max_retries, backoff, cache
+        )
+
+    for video, (transcript_text, _, _) in _ordered_map(fetch, videos, max_workers):
+        video["transcript"] = transcript_text
+        yield video
+
+
+def iter_clean_chunks(records, chunk_size=1000, validate=None):
+    """Group a stream of records into cleaned DataFrames of at most `chunk_size`
+    rows.
+
+    Args:
+        records (iterable): Enriched video records.
+        chunk_size (int, optional): Records per chunk. Defaults to 1000.
+        validate (callable, optional): Called with every cleaned chunk before it is
+        passed on; it should raise an exception if the chunk is invalid.
+
+    Yields:
+        pd.DataFrame: Cleaned chunk with the columns of `VIDEO_DATA_SCHEMA`.
+    """
+    columns = VIDEO_DATA_SCHEMA.names
+    seen_ids = set()
+
+    for chunk in _chunked(records, chunk_size):
+        frame = pd.DataFrame(chunk, columns=columns[:-1])
+
+        # drop videos already seen in an earlier chunk as well as within this one
+        frame = frame[~frame["video_id"].isin(seen_ids)]
+        seen_ids.update(frame["video_id"])
+
+        # outliers are filtered once all chunks are written since their
+        # thresholds depend on the whole dataset
+        frame = clean_video_data(frame, filter_outliers=False)[columns]
+        if validate is not None:
+            validate(frame)
+        yield frame
+
+
+def write_parquet_chunks(frames, path, schema=VIDEO_DATA_SCHEMA):
+    """Write a stream of DataFrames to a single parquet file, one row group per
+    DataFrame, without holding more than one of them in memory.
+
+    Args:
+        frames (iterable): DataFrames with the columns of `schema`.
+        path (str): Parquet file to write.
+        schema (pyarrow.Schema, optional): Schema of the file.
+
+    Returns:
+        int: Number of rows written.
+    """
+    n_rows = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for frame in frames:
+            writer.write_table(
+                pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            )
+            n_rows += len(frame)
+    return n_rows
+
+
+def _column_moments(path, columns):
+    """Streaming count, mean and sample standard deviation of numeric parquet
+    columns, combining per-row-group moments (Chan et al.) so only one row
+    group is read at a time."""
+    count = 0
+    mean = np.zeros(len(columns))
+    m2 = np.zeros(len(columns))
+
+    for batch in pq.ParquetFile(path).iter_batches(columns=columns, batch_size=65536):
+        values = np.column_stack(
+            [batch.column(col).to_numpy(zero_copy_only=False) for col in columns]
+        ).astype("float64")
+        if len(values) == 0:
+            continue
+
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        delta = batch_mean - mean
+        total = count + len(values)
+
+        m2 += batch_m2 + delta**2 * count * len(values) / total
+        mean += delta * len(values) / total
+        count = total
+
+    std = np.sqrt(m2 / (count - 1)) if count > 1 else np.full(len(columns), np.nan)
+    return dict(zip(columns, mean)), dict(zip(columns, std))
+
+
+def filter_outliers_parquet(
+    path,
+    output_path,
+    columns=("views", "transcript_length"),
+    n_std=3,
+    batch_size=1000,
+):
+    """Remove observations more than `n_std` standard deviations below the mean
+    of any of `columns`, reading and writing one row group at a time.
+
+    Args:
+        path (str): Parquet file to filter.
+        output_path (str): Parquet file to write the kept rows to.
+        columns (tuple, optional): Numeric columns to filter on.
+        n_std (float, optional): Number of standard deviations below the mean
+        to keep. Defaults to 3.
+        batch_size (int, optional): Rows read (and written) at a time. Defaults
+        to 1000.
+
+    Returns:
+        int: Number of rows kept.
+    """
+    columns = list(columns)
+    mean, std = _column_moments(path, columns)
+
+    parquet_file = pq.ParquetFile(path)
+    n_rows = 0
+    with pq.ParquetWriter(output_path, parquet_file.schema_arrow) as writer:
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            keep = np.ones(batch.num_rows, dtype=bool)
+            for col in columns:
+                if np.isnan(std[col]):
+                    continue
+                values = batch.column(col).to_numpy(zero_copy_only=False)
+                keep &= values >= mean[col] - n_std * std[col]
+
+            writer.write_batch(batch.filter(pa.array(keep)))
+            n_rows += int(keep.sum())
+    return n_rows
+
+
+def run_streaming_pipeline(
+    api_key,
+    channel_id,
+    output_path,
+    chunk_size=1000,
+    stats_workers=4,
+    transcript_workers=8,
+    transcript_client=YouTubeTranscriptApi,
+    validate=None,
+    filter_outliers=True,
+    base_url=YOUTUBE_API_URL,
+    cache=None,
+):
+    """Ingest, clean, validate and store a channel's videos as a stream.
+
+    Args:
+        api_key (str): Your Youtube API key.
+        channel_id (str): Youtube channel ID.
+        output_path (str): Parquet file to write the cleaned data to.
+        chunk_size (int, optional): Records per cleaned chunk / parquet row group.
+        This bounds peak memory. Defaults to 1000.
+        stats_workers (int, optional): Concurrent statistics requests.
+        transcript_workers (int, optional): Concurrent transcript requests.
+        transcript_client (optional): Transcript client, see
+        `dataops_utils.ingest_video_transcript()`.
+        validate (callable, optional): Called with every cleaned chunk; it should
+        raise an exception if the chunk is invalid, e.g.
+        `lambda frame: validate_video_data(frame).raise_for_failures()`.
+        filter_outliers (bool, optional): Remove low outliers in views and
+        transcript length with a second pass over the written file. Defaults
+        to True.
+        base_url (str, optional): Base URL of the YouTube Data API.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve responses from.
+
+    Returns:
+        dict: Number of rows written before and after outlier filtering.
+    """
+    session = build_session(pool_size=stats_workers)
+
+    records = iter_channel_video_ids(
+        api_key, channel_id, session=session, base_url=base_url, cache=cache
+    )
+    records = iter_video_stats(
+        records,
+        api_key,
+        max_workers=stats_workers,
+        session=session,
+        base_url=base_url,
+        cache=cache,
+    )
+    records = iter_video_transcripts(
+        records, transcript_client, max_workers=transcript_workers, cache=cache
+    )
+    frames = iter_clean_chunks(records, chunk_size=chunk_size, validate=validate)
+
+    if not filter_outliers:
+        n_rows = write_parquet_chunks(frames, output_path)
+        return {"rows_cleaned": n_rows, "rows_written": n_rows}
+
+    unfiltered_path = f"{output_path}.unfiltered"
+    n_rows = write_parquet_chunks(frames, unfiltered_path)
+    try:
+        n_kept = filter_outliers_parquet(
+            unfiltered_path, output_path, batch_size=chunk_size
+        )
+    finally:
+        os.remove(unfiltered_path)
+
+    return {"rows_cleaned": n_rows, "rows_written": n_kept}
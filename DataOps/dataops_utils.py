@@ -1,8 +1,58 @@
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import requests
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
-from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api import (
+    InvalidVideoId,
+    NoTranscriptAvailable,
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+    YouTubeTranscriptApi,
+)
+
+from transcript_store import read_transcripts
+
+# base URL for all YouTube Data API requests. Point this at a local stub server
+# (see youtube_api_stub.py) to exercise the ingestors offline.
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3"
+
+# the videos endpoint accepts at most 50 comma-separated IDs per request
+MAX_IDS_PER_REQUEST = 50
+
+# transcript errors that asking again will not fix, so they are never retried
+PERMANENT_TRANSCRIPT_ERRORS = (
+    InvalidVideoId,
+    NoTranscriptAvailable,
+    NoTranscriptFound,
+    TranscriptsDisabled,
+    VideoUnavailable,
+)
+
+BAR_FORMAT = "[{elapsed}<{remaining}] {n_fmt}/{total_fmt} | {l_bar}{bar} {rate_fmt}{postfix}"
+
+
+def _get_json(session, base_url, endpoint, params, cache=None):
+    """Send a GET request to a YouTube Data API endpoint and return the decoded
+    JSON response, serving it from `cache` (a `dataops_cache.ResponseCache`)
+    when one is provided."""
+
+    def request():
+        response = session.get(f"{base_url}/{endpoint}", params=params)
+        response.raise_for_status()
+        return json.loads(response.text)
+
+    if cache is None:
+        return request()
+    return cache.fetch(endpoint, params, request)
 
 
 def ingest_page_video_ids(response: requests.models.Response) -> list:
@@ -19,9 +69,14 @@ def ingest_page_video_ids(response: requests.models.Response) -> list:
         ID (video_id), publish date & time (datetime), and title (title).
     """
 
+    return _parse_page_video_ids(json.loads(response.text))
+
+
+def _parse_page_video_ids(payload):
+    """Extract the basic video records from a decoded search API response."""
     page_video_id_list = []
 
-    for raw_item in json.loads(response.text)["items"]:
+    for raw_item in payload["items"]:
         # only execute for youtube videos
         if raw_item["id"]["kind"] != "youtube#video":
             continue
@@ -37,7 +92,15 @@ def ingest_page_video_ids(response: requests.models.Response) -> list:
     return page_video_id_list
 
 
-def ingest_channel_video_ids(api_key, channel_id, page_token=None):
+def ingest_channel_video_ids(
+    api_key,
+    channel_id,
+    page_token=None,
+    session=None,
+    base_url=YOUTUBE_API_URL,
+    published_after=None,
+    cache=None,
+):
     """Ingest all YouTube video IDs for a given Youtube channel.
 
     Args:
@@ -48,17 +111,55 @@ def ingest_channel_video_ids(api_key, channel_id, page_token=None):
         allows you to pull results from a single page. Setting to the defaults of
         None will start at the first page and then iterate through all available
         pages.
+        session (requests.Session, optional): Session to send requests with. Defaults
+        to None, which creates a new session.
+        base_url (str, optional): Base URL of the YouTube Data API. Defaults to
+        `YOUTUBE_API_URL`.
+        published_after (str or datetime, optional): Only return videos published
+        at or after this time. Since results are ordered newest first, this stops
+        paging once the older, already ingested videos are reached. Defaults to
+        None, which returns the channel's entire history.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve search pages
+        from. Defaults to None (always request from the API).
 
     Returns:
         list: Basic video information for a given channel's API request. This
         information includes the channel ID (channel_id) along with each video's
         ID (video_id), publish date & time (datetime), and title (title).
     """
-    # base URL
-    url = "https://www.googleapis.com/youtube/v3/search"
+    return list(
+        iter_channel_video_ids(
+            api_key,
+            channel_id,
+            page_token=page_token,
+            session=session,
+            base_url=base_url,
+            published_after=published_after,
+            cache=cache,
+        )
+    )
+
+
+def iter_channel_video_ids(
+    api_key,
+    channel_id,
+    page_token=None,
+    session=None,
+    base_url=YOUTUBE_API_URL,
+    published_after=None,
+    cache=None,
+):
+    """Lazily ingest the YouTube video IDs for a given Youtube channel, one search
+    result page at a time. Takes the same arguments as
+    `ingest_channel_video_ids()`.
 
-    # intialize list to store video data
-    channel_video_id_list = []
+    Yields:
+        dict: Basic video information (channel_id, video_id, datetime and title)
+        for each video on the channel, newest first.
+    """
+    # re-use a single connection across all pages
+    if session is None:
+        session = requests.Session()
 
     # extract video data across multiple search result pages
     while page_token != 0:
@@ -71,66 +172,641 @@ def ingest_channel_video_ids(api_key, channel_id, page_token=None):
             "maxResults": 50,
             "pageToken": page_token,
         }
+        if published_after is not None:
+            params["publishedAfter"] = pd.Timestamp(published_after).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+
         # make get request
-        response = requests.get(url, params=params)
+        payload = _get_json(session, base_url, "search", params, cache)
 
-        # append video records to list
-        channel_video_id_list += ingest_page_video_ids(response)
+        # yield this page's video records before requesting the next page
+        yield from _parse_page_video_ids(payload)
+
+        # grab next page token; if there is none this was the last page
+        page_token = payload.get("nextPageToken", 0)
 
-        try:
-            # grab next page token
-            page_token = json.loads(response.text)["nextPageToken"]
-        except:
-            # if no next page token kill while loop
-            page_token = 0
 
-    return channel_video_id_list
+def build_session(pool_size=10):
+    """Create a `requests.Session` whose connection pool can hold `pool_size`
+    open connections so concurrent requests re-use sockets rather than opening
+    a new connection for every call.
+
+    Args:
+        pool_size (int, optional): Maximum number of pooled connections per host.
+        Defaults to 10.
+
+    Returns:
+        requests.Session: Session with a sized connection pool.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def ingest_video_stats(video_id_data, api_key):
+def _add_video_stats(video, stats):
+    """Add the view, like & comment counts to a single video record. Likes and
+    comments can be hidden by the channel owner, in which case the API simply
+    omits those fields so we record them as missing."""
+    video["views"] = stats.get("viewCount")
+    video["likes"] = stats.get("likeCount")
+    video["comments"] = stats.get("commentCount")
+
+
+def _request_video_stats_batch(video_ids, api_key, session, base_url, cache=None):
+    """Request statistics for up to 50 video IDs in a single API call.
+
+    Returns:
+        dict: Statistics for each returned video keyed by video ID.
+    """
+    params = {"id": ",".join(video_ids), "key": api_key, "part": "statistics"}
+    items = _get_json(session, base_url, "videos", params, cache).get("items", [])
+    return {item["id"]: item.get("statistics", {}) for item in items}
+
+
+def ingest_video_stats(
+    video_id_data,
+    api_key,
+    batched=False,
+    max_workers=4,
+    session=None,
+    base_url=YOUTUBE_API_URL,
+    cache=None,
+):
     """Ingest basic statistics (i.e. number of views, likes & comments) for
     Youtube videos.
 
     Args:
         video_id_data (list): List of video ID data from `ingest_channel_video_ids()`
         api_key (_type_): Your Youtube API key.
+        batched (bool, optional): If True, pack video IDs into chunks of 50 (the
+        maximum the API allows per request) and send the chunks concurrently over
+        a pooled session. This reduces a channel with N videos from N requests
+        (and N quota units) to N / 50. Defaults to False, which requests one video
+        at a time.
+        max_workers (int, optional): Maximum number of chunks requested concurrently
+        when `batched=True`. Defaults to 4.
+        session (requests.Session, optional): Session to send requests with. Defaults
+        to None, which creates a pooled session via `build_session()`.
+        base_url (str, optional): Base URL of the YouTube Data API. Defaults to
+        `YOUTUBE_API_URL`.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve statistics
+        from. Defaults to None (always request from the API).
 
     Returns:
         list: Same basic video information as ingest_channel_video_ids() but enhanced
-        with the count of each video's views, likes, and comments.
+        with the count of each video's views, likes, and comments. Counts the API
+        does not return (e.g. hidden likes or a deleted video) are set to None.
     """
-    num_iterations = len(video_id_data)
-    for index, video in tqdm(
-        enumerate(video_id_data),
-        total=num_iterations,
-        bar_format="[{elapsed}<{remaining}] {n_fmt}/{total_fmt} | {l_bar}{bar} {rate_fmt}{postfix}",
-    ):
-        url = f"https://www.googleapis.com/youtube/v3/videos?id={video['video_id']}&key={api_key}&part=statistics"
-        response = requests.get(url)
-        stats = json.loads(response.text)["items"][0]["statistics"]
-
-        video_id_data[index]["views"] = stats["viewCount"]
-        video_id_data[index]["likes"] = stats["likeCount"]
-        video_id_data[index]["comments"] = stats["commentCount"]
+    if session is None:
+        session = build_session(pool_size=max_workers)
+
+    if not batched:
+        for video in tqdm(video_id_data, bar_format=BAR_FORMAT):
+            stats = _request_video_stats_batch(
+                [video["video_id"]], api_key, session, base_url, cache
+            )
+            _add_video_stats(video, stats.get(video["video_id"], {}))
+
+        return video_id_data
+
+    # split the records into chunks of at most 50 videos
+    chunks = [
+        video_id_data[i : i + MAX_IDS_PER_REQUEST]
+        for i in range(0, len(video_id_data), MAX_IDS_PER_REQUEST)
+    ]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _request_video_stats_batch,
+                [video["video_id"] for video in chunk],
+                api_key,
+                session,
+                base_url,
+                cache,
+            ): chunk
+            for chunk in chunks
+        }
+        with tqdm(total=len(video_id_data), bar_format=BAR_FORMAT) as progress:
+            for future in as_completed(futures):
+                chunk = futures[future]
+                stats = future.result()
+                for video in chunk:
+                    _add_video_stats(video, stats.get(video["video_id"], {}))
+                progress.update(len(chunk))
 
     return video_id_data
 
 
-def ingest_video_transcript(video_data):
-    num_iterations = len(video_data)
-    for index, video in tqdm(
-        enumerate(video_data),
-        total=num_iterations,
-        bar_format="[{elapsed}<{remaining}] {n_fmt}/{total_fmt} | {l_bar}{bar} {rate_fmt}{postfix}",
-    ):
+def _call_with_timeout(func, timeout, *args):
+    """Call `func(*args)` and raise TimeoutError if it has not returned within
+    `timeout` seconds. The call runs in a daemon thread, so a hung request is
+    abandoned rather than blocking the pipeline."""
+    if timeout is None:
+        return func(*args)
+
+    outcome = {}
+
+    def target():
         try:
-            transcript = YouTubeTranscriptApi.get_transcript(video["video_id"])
-            text_list = [transcript[i]["text"] for i in range(len(transcript))]
-            transcript_text = " ".join(text_list)
-        # if not available set as n/a
-        except:
-            transcript_text = None
+            outcome["result"] = func(*args)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(timeout)
+
+    if thread.is_alive():
+        raise TimeoutError(f"call did not complete within {timeout} seconds")
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def _fetch_transcript(
+    video_id, transcript_client, timeout, max_retries, backoff, cache=None
+):
+    """Fetch and join a single video's transcript, retrying transient failures
+    with exponential backoff (backoff, 2 * backoff, 4 * backoff, ...).
+
+    Returns:
+        tuple: The transcript text (or None), the outcome ("fetched",
+        "unavailable" or "failed") and the number of retries used.
+    """
+    params = {"video_id": video_id}
+    if cache is not None:
+        cached = cache.get("transcript", params)
+        if cached is not None:
+            return cached["text"], cached["outcome"], 0
+
+    retries = 0
+    while True:
+        try:
+            transcript = _call_with_timeout(
+                transcript_client.get_transcript, timeout, video_id
+            )
+            text, outcome = " ".join(segment["text"] for segment in transcript), "fetched"
+        except PERMANENT_TRANSCRIPT_ERRORS:
+            # transcripts disabled, video removed, etc.
+            text, outcome = None, "unavailable"
+        except Exception:
+            if retries >= max_retries:
+                return None, "failed", retries
+            time.sleep(backoff * 2**retries)
+            retries += 1
+            continue
+
+        # transient failures are never cached so they are retried next run
+        if cache is not None:
+            cache.set("transcript", params, {"text": text, "outcome": outcome})
+        return text, outcome, retries
+
+
+def ingest_video_transcript(
+    video_data,
+    transcript_client=YouTubeTranscriptApi,
+    max_workers=1,
+    timeout=None,
+    max_retries=3,
+    backoff=1.0,
+    return_report=False,
+    cache=None,
+):
+    """Ingest the transcript for each Youtube video.
+
+    Transient failures (rate limiting, dropped connections, timeouts) are retried
+    with exponential backoff. Videos without a transcript (e.g. transcripts
+    disabled or the video was removed) are not retried. In both cases the
+    video's transcript is set to None.
+
+    Args:
+        video_data (list): List of video data from `ingest_video_stats()`.
+        transcript_client (optional): Object exposing a
+        `get_transcript(video_id)` method that returns a list of
+        `{"text": ...}` segments. Defaults to `YouTubeTranscriptApi`; pass a
+        fake to test or benchmark the stage without network access.
+        max_workers (int, optional): Number of transcripts fetched concurrently.
+        Defaults to 1, which fetches one video at a time.
+        timeout (float, optional): Seconds to wait for a single transcript
+        request before treating it as a transient failure. Defaults to None
+        (wait indefinitely).
+        max_retries (int, optional): Maximum retries per video for transient
+        failures. Defaults to 3.
+        backoff (float, optional): Seconds to wait before the first retry; the
+        wait doubles with every subsequent retry. Defaults to 1.0.
+        return_report (bool, optional): If True, also return the report of
+        fetched/unavailable/failed/retried counts. Defaults to False.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve transcripts
+        (and known unavailable transcripts) from. Defaults to None.
 
-        video_data[index]["transcript"] = transcript_text
+    Returns:
+        list: Same video information as ingest_video_stats() but enhanced with the
+        transcript of each video. If `return_report=True`, a tuple of this list
+        and a dictionary of outcome counts.
+    """
+    report = {"fetched": 0, "unavailable": 0, "failed": 0, "retried": 0}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, tqdm(
+        total=len(video_data), bar_format=BAR_FORMAT
+    ) as progress:
+        futures = {
+            executor.submit(
+                _fetch_transcript,
+                video["video_id"],
+                transcript_client,
+                timeout,
+                max_retries,
+                backoff,
+                cache,
+            ): video
+            for video in video_data
+        }
+        for future in as_completed(futures):
+            transcript_text, outcome, retries = future.result()
+            futures[future]["transcript"] = transcript_text
+
+            report[outcome] += 1
+            report["retried"] += retries
+            progress.set_postfix(report, refresh=False)
+            progress.update()
+
+    if return_report:
+        return video_data, report
 
     return video_data
+
+
+def sync_channel_video_data(
+    api_key,
+    channel_id,
+    data_path,
+    refresh_days=7,
+    session=None,
+    base_url=YOUTUBE_API_URL,
+    cache=None,
+    transcript_store=None,
+    **transcript_kwargs,
+):
+    """Incrementally sync a channel's videos with previously stored data.
+
+    Rather than re-ingesting the channel's entire history, only videos
+    published after the newest stored video (the watermark) are requested. New
+    videos are enriched with statistics and transcripts, and the statistics of
+    stored videos published within the last `refresh_days` are refreshed, since
+    views, likes and comments of recent videos are still changing. Older
+    videos are carried over from the stored data as is.
+
+    Args:
+        api_key (str): Your Youtube API key.
+        channel_id (str): Youtube channel ID.
+        data_path (str): Path to the stored Youtube video data parquet file.
+        refresh_days (int, optional): Refresh statistics of stored videos published
+        within this many days. Defaults to 7.
+        session (requests.Session, optional): Session to send requests with.
+        base_url (str, optional): Base URL of the YouTube Data API. Defaults to
+        `YOUTUBE_API_URL`.
+        cache (dataops_cache.ResponseCache, optional): Cache to serve responses
+        from. Defaults to None.
+        transcript_store (str, optional): Directory of the transcript store, if
+        the stored data references its transcripts by `transcript_id` (see
+        transcript_store.py).
+        **transcript_kwargs: Additional arguments passed to
+        `ingest_video_transcript()` (e.g. `max_workers`).
+
+    Returns:
+        pd.DataFrame: The stored data with new videos added and recent videos'
+        statistics refreshed, one row per video, ready to be cleaned and
+        validated like a full ingest.
+    """
+    stored = pd.read_parquet(data_path)
+    if "transcript_id" in stored:
+        if transcript_store is None:
+            raise ValueError(
+                f"{data_path} keeps its transcripts in a transcript store, pass "
+                "transcript_store"
+            )
+        stored = read_transcripts(stored, transcript_store)
+    stored["datetime"] = pd.to_datetime(stored["datetime"], utc=True)
+    watermark = stored["datetime"].max()
+
+    if session is None:
+        session = build_session()
+
+    # the search endpoint includes videos published exactly at the watermark
+    known_ids = set(stored["video_id"])
+    new_videos = [
+        video
+        for video in ingest_channel_video_ids(
+            api_key,
+            channel_id,
+            session=session,
+            base_url=base_url,
+            published_after=watermark,
+            cache=cache,
+        )
+        if video["video_id"] not in known_ids
+    ]
+
+    # only refresh statistics for recently published videos
+    refresh_after = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=refresh_days)
+    recent_videos = stored.loc[
+        stored["datetime"] >= refresh_after,
+        ["channel_id", "video_id", "datetime", "title", "transcript"],
+    ].to_dict(orient="records")
+
+    ingest_video_stats(
+        new_videos + recent_videos,
+        api_key,
+        batched=True,
+        session=session,
+        base_url=base_url,
+        cache=cache,
+    )
+    if new_videos:
+        ingest_video_transcript(new_videos, cache=cache, **transcript_kwargs)
+
+    updates = pd.DataFrame(new_videos + recent_videos, columns=stored.columns)
+    updates["datetime"] = pd.to_datetime(updates["datetime"], utc=True)
+
+    # derived columns are recomputed when the synced data is cleaned
+    synced = pd.concat([stored, updates], ignore_index=True).drop(
+        columns=["transcript_length"], errors="ignore"
+    )
+    synced = synced.drop_duplicates(subset="video_id", keep="last")
+    return synced.sort_values("datetime", ascending=False, ignore_index=True)
+
+
+def normalize_text(text):
+    """Remove non-character string values (i.e. unicode characters) from a
+    column of text.
+
+    Equivalent to applying
+    `unicodedata.normalize("NFKD", x).encode("ascii", "ignore").decode("ascii")`
+    to every value, but most titles and transcripts are already plain ASCII and
+    are returned untouched. Python records whether a string is ASCII when it is
+    created, so finding the few values that need normalizing is a constant-time
+    check per value rather than a pass over every character.
+
+    Args:
+        text (pd.Series): Column of strings (missing values are left as is).
+
+    Returns:
+        pd.Series: Column of ASCII-only strings.
+    """
+    needs_cleaning = np.fromiter(
+        (isinstance(value, str) and not value.isascii() for value in text),
+        dtype=bool,
+        count=len(text),
+    )
+    if not needs_cleaning.any():
+        return text
+
+    cleaned = text.copy()
+    cleaned[needs_cleaning] = (
+        text[needs_cleaning]
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+    )
+    return cleaned
+
+
+def to_utc_timestamps(values):
+    """Convert a column of YouTube API publish times (e.g.
+    "2025-01-01T12:00:00Z") to UTC timestamps, with unparseable values as NaT.
+
+    Values in the API's fixed format are parsed in a single Arrow pass, which is
+    more than an order of magnitude faster than `pd.to_datetime()` on
+    timezone-suffixed strings; anything else falls back to `pd.to_datetime()`.
+
+    Args:
+        values (pd.Series): Column of publish times (strings or timestamps).
+
+    Returns:
+        pd.Series: Column of `datetime64[ns, UTC]` values.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, utc=True)
+
+    is_string = values.map(type) == str
+    parsed = pc.strptime(
+        pa.array(values.where(is_string), type=pa.string(), from_pandas=True),
+        format="%Y-%m-%dT%H:%M:%SZ",
+        unit="ns",
+        error_is_null=True,
+    )
+    timestamps = pd.Series(
+        pd.DatetimeIndex(parsed.to_numpy(zero_copy_only=False)).tz_localize("UTC"),
+        index=values.index,
+        name=values.name,
+    )
+
+    fallback = timestamps.isna() & values.notna()
+    if fallback.any():
+        timestamps.loc[fallback] = pd.to_datetime(
+            values[fallback], errors="coerce", utc=True
+        )
+    return timestamps
+
+
+def clean_video_data(raw_data, filter_outliers=True, n_std=3):
+    """Clean the raw Youtube video data.
+
+    The following steps are applied, using vectorized operations throughout:
+
+    - remove rows with missing data and duplicate videos (by `video_id`)
+    - coerce `views`, `likes` and `comments` to int64 and `datetime` to a UTC
+      timestamp, removing rows where either fails
+    - add `transcript_length`
+    - optionally remove observations where views or transcript length is more
+      than `n_std` standard deviations below the mean. Both thresholds are
+      computed from the same data and applied in a single pass.
+    - remove unicode characters from `title` and `transcript`
+
+    Args:
+        raw_data (pd.DataFrame): Raw video data, e.g. `pd.DataFrame(video_data)`.
+        filter_outliers (bool, optional): Whether to remove low outliers. Turn off
+        when cleaning a chunk of a larger dataset since the thresholds depend on
+        the whole dataset. Defaults to True.
+        n_std (float, optional): Number of standard deviations below the mean to
+        keep. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: Cleaned video data.
+    """
+    data = raw_data.dropna().drop_duplicates(subset="video_id")
+
+    counts = {
+        col: pd.to_numeric(data[col], errors="coerce")
+        for col in ["views", "likes", "comments"]
+    }
+    published = to_utc_timestamps(data["datetime"])
+    transcript_length = data["transcript"].str.len()
+
+    keep = published.notna()
+    for values in counts.values():
+        keep &= values.notna()
+
+    if filter_outliers:
+        # every threshold is computed from the valid rows before any outliers
+        # are removed, so one filter doesn't shift the other's threshold
+        valid = keep.copy()
+        for values in [counts["views"], transcript_length]:
+            threshold = values[valid].mean() - n_std * values[valid].std()
+            # a single observation has no spread to compare against
+            if pd.notna(threshold):
+                keep &= values >= threshold
+
+    cleaned = data.loc[keep].assign(
+        datetime=published[keep],
+        **{col: values[keep].astype("int64") for col, values in counts.items()},
+        transcript_length=transcript_length[keep].astype("int64"),
+    )
+    cleaned["title"] = normalize_text(cleaned["title"])
+    cleaned["transcript"] = normalize_text(cleaned["transcript"])
+
+    return cleaned
+
+
+# declarative schema of the cleaned Youtube video data. Each column lists its
+# type ("string", "int64" or "datetime"), whether missing values are allowed and,
+# optionally, whether values must be unique and the min/max values allowed.
+VIDEO_DATA_VALIDATION_SCHEMA = {
+    "channel_id": {"type": "string", "nullable": False},
+    "video_id": {"type": "string", "nullable": False, "unique": True},
+    "datetime": {
+        "type": "datetime",
+        "nullable": False,
+        # the first video ever uploaded to Youtube
+        "min": pd.Timestamp("2005-04-23", tz="UTC"),
+    },
+    "title": {"type": "string", "nullable": False},
+    "views": {"type": "int64", "nullable": False, "min": 0},
+    "likes": {"type": "int64", "nullable": False, "min": 0},
+    "comments": {"type": "int64", "nullable": False, "min": 0},
+    "transcript": {"type": "string", "nullable": False},
+    "transcript_length": {"type": "int64", "nullable": False, "min": 0},
+}
+
+
+def _has_type(values, expected_type):
+    """Whether a column holds values of a schema type. Checks the column's dtype
+    where it is specific enough and otherwise infers the type of the values in
+    a single C-level pass."""
+    if expected_type == "int64":
+        return values.dtype == "int64"
+    if expected_type == "datetime":
+        return pd.api.types.is_datetime64_any_dtype(values)
+    if expected_type == "string":
+        return pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty")
+    raise ValueError(f"unknown schema type: {expected_type}")
+
+
+class ValidationResult:
+    """Outcome of `validate_video_data()`.
+
+    Attributes:
+        success (bool): Whether every check passed, like the `success` attribute
+        of a Great Expectations validation result.
+        failures (dict): Failed checks per column, e.g.
+        `{"views": ["3 values below 0"]}`. Empty if `success` is True.
+        rows_checked (int): Number of rows the value checks were run on (less than
+        the size of the data when sampling).
+    """
+
+    def __init__(self, failures, rows_checked):
+        self.failures = failures
+        self.rows_checked = rows_checked
+
+    @property
+    def success(self):
+        return not self.failures
+
+    def raise_for_failures(self):
+        """Raise a `ValueError` listing the failed checks, if there are any."""
+        if self.failures:
+            details = "; ".join(
+                f"{column}: {', '.join(messages)}"
+                for column, messages in self.failures.items()
+            )
+            raise ValueError(f"video data failed validation ({details})")
+
+    def __repr__(self):
+        return f"ValidationResult(success={self.success}, failures={self.failures})"
+
+
+def validate_video_data(
+    data, schema=VIDEO_DATA_VALIDATION_SCHEMA, sample=None, seed=9999
+):
+    """Validate video data against a declarative schema in a single vectorized
+    pass over each column.
+
+    This covers the same checks as the notebook's Great Expectations suite
+    (each column exists, has the right type and has no missing values) plus
+    uniqueness and range checks, without building a data context or scanning the
+    data once per expectation.
+
+    Args:
+        data (pd.DataFrame): Video data, e.g. as returned by `clean_video_data()`.
+        schema (dict, optional): Column rules. Defaults to
+        `VIDEO_DATA_VALIDATION_SCHEMA`.
+        sample (int, optional): For very large frames, only check the values of
+        this many randomly sampled rows. Column existence and types are always
+        checked on the full data. Defaults to None (check every row).
+        seed (int, optional): Random seed for sampling.
+
+    Returns:
+        ValidationResult: Whether validation succeeded and the failed checks per
+        column.
+
+    Example:
+        >>> results = validate_video_data(cleaned_data)
+        >>> results.success
+        True
+    """
+    if sample is not None and len(data) > sample:
+        rows = data.sample(n=sample, random_state=seed)
+    else:
+        rows = data
+
+    failures = {}
+    for column, rules in schema.items():
+        if column not in data.columns:
+            failures[column] = ["column is missing"]
+            continue
+
+        messages = []
+        has_type = _has_type(data[column], rules["type"])
+        if not has_type:
+            messages.append(f"expected {rules['type']} values, found {data[column].dtype}")
+
+        values = rows[column]
+        missing = values.isna()
+        if not rules.get("nullable", True) and missing.any():
+            messages.append(f"{missing.sum()} missing values")
+
+        if rules.get("unique"):
+            duplicates = values.duplicated().sum()
+            if duplicates:
+                messages.append(f"{duplicates} duplicate values")
+
+        # values of the wrong type can't be compared against the range
+        if has_type:
+            present = values[~missing]
+            try:
+                if "min" in rules and (below := (present < rules["min"]).sum()):
+                    messages.append(f"{below} values below {rules['min']}")
+                if "max" in rules and (above := (present > rules["max"]).sum()):
+                    messages.append(f"{above} values above {rules['max']}")
+            except TypeError as e:
+                # e.g. timezone-naive datetimes checked against a UTC minimum
+                messages.append(f"values can't be compared with the allowed range: {e}")
+
+        if messages:
+            failures[column] = messages
+
+    return ValidationResult(failures, len(rows))
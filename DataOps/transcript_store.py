@@ -0,0 +1,199 @@
+"""Compressed side-store for Youtube video transcripts.
+
+Transcripts make up nearly all of the bytes in the video data, so storing them
+as a column of `youtube_video_data.parquet` means every consumer that only needs
+views, likes and comments still pays to read and decode them. This module moves
+them into a separate store:
+
+- every distinct transcript, zstd-compressed and written one after the other.
+  Videos with identical transcripts share a single block.
+- an index, in Parquet, of the `video_id`, `transcript_id` (content hash) and
+  byte offset and sizes of each video's block.
+- a footer with the size of the index.
+
+Both live in one file, `transcripts.bin`, so a store is replaced with a single
+atomic rename and readers never pair the blocks of one version with the index
+of another. The main table keeps only the video metadata plus the
+`transcript_id` reference, and readers memory-map the file to pull individual
+transcripts lazily.
+
+Example:
+    >>> metadata = write_transcript_store(cleaned_data, "data/transcripts")
+    >>> metadata.to_parquet("data/youtube_video_data.parquet", index=False)
+    >>> with TranscriptStore("data/transcripts") as transcripts:
+    ...     transcripts.get(metadata["video_id"][0])
+    >>> video_data = read_transcripts(metadata, "data/transcripts")
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+BLOCKS_FILE = "transcripts.bin"
+CODEC = "zstd"
+
+# last bytes of the store: the index size and a marker
+FOOTER = struct.Struct("<Q4s")
+MAGIC = b"TRS1"
+
+
+def _transcript_id(text):
+    """Content hash identifying a transcript, or None for a missing one."""
+    if not isinstance(text, str):
+        return None
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def write_transcript_store(data, store_dir, compression_level=3):
+    """Write the transcripts of the video data to a side-store and return the
+    data without them.
+
+    Args:
+        data (pd.DataFrame): Video data with `video_id` and `transcript` columns,
+        e.g. as returned by `dataops_utils.clean_video_data()`.
+        store_dir (str): Directory to write the store to. An existing store in it
+        is replaced.
+        compression_level (int, optional): zstd compression level. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: `data` with the `transcript` column replaced by a
+        `transcript_id` reference into the store. Videos without a transcript
+        get a null `transcript_id` and aren't stored.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+
+    # write to a temporary file and swap it in at the end so readers of an
+    # existing store never see a half-written one
+    blocks_path = os.path.join(store_dir, BLOCKS_FILE)
+
+    transcript_ids = data["transcript"].map(_transcript_id)
+    present = transcript_ids.notna()
+    unique = present & ~transcript_ids.duplicated()
+
+    codec = pa.Codec(CODEC, compression_level=compression_level)
+    blocks = {}
+    offset = 0
+    with open(f"{blocks_path}.tmp", "wb") as file:
+        for transcript_id, text in zip(
+            transcript_ids[unique], data["transcript"][unique]
+        ):
+            encoded = text.encode("utf-8")
+            compressed = codec.compress(encoded, asbytes=True)
+            file.write(compressed)
+            blocks[transcript_id] = (offset, len(compressed), len(encoded))
+            offset += len(compressed)
+
+        # the index goes after the blocks, followed by its size
+        index = pd.DataFrame(
+            transcript_ids[present].map(blocks).tolist(),
+            columns=["offset", "compressed_size", "size"],
+            dtype="int64",
+        )
+        index.insert(0, "video_id", data["video_id"][present].to_numpy())
+        index.insert(1, "transcript_id", transcript_ids[present].to_numpy())
+        sink = pa.BufferOutputStream()
+        pq.write_table(pa.Table.from_pandas(index, preserve_index=False), sink)
+        index_bytes = sink.getvalue()
+        file.write(index_bytes)
+        file.write(FOOTER.pack(index_bytes.size, MAGIC))
+
+    os.replace(f"{blocks_path}.tmp", blocks_path)
+
+    return data.drop(columns="transcript").assign(transcript_id=transcript_ids)
+
+
+def read_transcripts(data, store_dir):
+    """Add the transcripts back to video data written by
+    `write_transcript_store()`.
+
+    Args:
+        data (pd.DataFrame): Video data with `video_id` and `transcript_id`
+        columns, e.g. read from `youtube_video_data.parquet`.
+        store_dir (str): Directory the store was written to.
+
+    Returns:
+        pd.DataFrame: `data` with the `transcript_id` column replaced by the
+        `transcript`. Videos without a stored transcript get a missing one.
+    """
+    with TranscriptStore(store_dir) as transcripts:
+        text = [transcripts.get(video_id) for video_id in data["video_id"]]
+    return data.drop(columns="transcript_id").assign(
+        transcript=pd.Series(text, index=data.index, dtype="object")
+    )
+
+
+class TranscriptStore:
+    """Read transcripts from a store written by `write_transcript_store()`.
+
+    Only the small index is loaded when the store is opened. The file is
+    memory-mapped, so each `get()` reads and decompresses just the bytes of the
+    requested transcript.
+
+    Args:
+        store_dir (str): Directory the store was written to.
+
+    Example:
+        >>> with TranscriptStore("data/transcripts") as transcripts:
+        ...     text = transcripts.get("wzrIKGcOlsU")
+    """
+
+    def __init__(self, store_dir):
+        self._codec = pa.Codec(CODEC)
+        self._file = open(os.path.join(store_dir, BLOCKS_FILE), "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = pa.py_buffer(self._mmap)
+
+        index_size, magic = FOOTER.unpack(self._mmap[-FOOTER.size :])
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{store_dir} doesn't hold a transcript store")
+        index_start = len(self._mmap) - FOOTER.size - index_size
+        index = pq.read_table(
+            pa.BufferReader(self._buffer.slice(index_start, index_size)),
+            columns=["video_id", "offset", "compressed_size", "size"],
+        ).to_pandas()
+        self._rows = dict(zip(index["video_id"], range(len(index))))
+        self._offsets = index["offset"].to_numpy()
+        self._compressed_sizes = index["compressed_size"].to_numpy()
+        self._sizes = index["size"].to_numpy()
+
+    def get(self, video_id, default=None):
+        """Return the transcript of a video, or `default` if it isn't stored."""
+        row = self._rows.get(video_id)
+        if row is None:
+            return default
+
+        compressed = self._buffer.slice(
+            self._offsets[row], self._compressed_sizes[row]
+        )
+        return self._codec.decompress(
+            compressed, decompressed_size=self._sizes[row], asbytes=True
+        ).decode("utf-8")
+
+    def __getitem__(self, video_id):
+        if video_id not in self._rows:
+            raise KeyError(video_id)
+        return self.get(video_id)
+
+    def __contains__(self, video_id):
+        return video_id in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def close(self):
+        """Release the memory map and file."""
+        self._buffer = None
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,195 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def generate_channel_videos(n_videos=5000, channel_id="UC_STUB_CHANNEL"):
+    """Generate a synthetic YouTube channel for the stub server to serve.
+
+    Every 10th video hides its like count and every 25th video has comments
+    turned off so the ingestors' handling of missing statistics is exercised.
+
+    Args:
+        n_videos (int, optional): Number of videos on the channel. Defaults to 5000.
+        channel_id (str, optional): ID of the synthetic channel.
+
+    Returns:
+        list: One dictionary per video, newest first, with the fields the stub
+        server needs to build search and statistics responses.
+    """
+    newest = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    videos = []
+    for i in range(n_videos):
+        statistics = {"viewCount": str(1000 + 37 * i)}
+        if i % 10:
+            statistics["likeCount"] = str(50 + i)
+        if i % 25:
+            statistics["commentCount"] = str(i % 97)
+
+        videos.append(
+            {
+                "channel_id": channel_id,
+                "video_id": f"vid{i:07d}",
+                "datetime": (newest - timedelta(hours=6 * i)).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+                "title": f"Stub video {i}",
+                "statistics": statistics,
+            }
+        )
+    return videos
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Serve the subset of the YouTube Data API used by `dataops_utils`."""
+
+    def do_GET(self):
+        # simulate the network round trip to the real API
+        time.sleep(self.server.latency)
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+
+        if endpoint == "search":
+            payload = self._search(query)
+        elif endpoint == "videos":
+            payload = self._videos(query)
+        else:
+            self.send_error(404)
+            return
+
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _search(self, query):
+        page_size = int(query.get("maxResults", ["50"])[0])
+        start = int(query.get("pageToken", ["0"])[0] or 0)
+        videos = self.server.videos
+        if "publishedAfter" in query:
+            # timestamps share one format, so they sort chronologically as text
+            published_after = query["publishedAfter"][0]
+            videos = [video for video in videos if video["datetime"] >= published_after]
+        page = videos[start : start + page_size]
+
+        payload = {
+            "items": [
+                {
+                    "id": {"kind": "youtube#video", "videoId": video["video_id"]},
+                    "snippet": {
+                        "channelId": video["channel_id"],
+                        "publishedAt": video["datetime"],
+                        "title": video["title"],
+                    },
+                }
+                for video in page
+            ]
+        }
+        if start + page_size < len(videos):
+            payload["nextPageToken"] = str(start + page_size)
+        return payload
+
+    def _videos(self, query):
+        video_ids = ",".join(query.get("id", [])).split(",")
+        items = [
+            {"id": video_id, "statistics": self.server.statistics[video_id]}
+            for video_id in video_ids
+            if video_id in self.server.statistics
+        ]
+        return {"items": items}
+
+    def log_message(self, format, *args):
+        # keep benchmark output readable
+        pass
+
+
+class FakeTranscriptClient:
+    """Offline stand-in for `YouTubeTranscriptApi` that can be injected into
+    `dataops_utils.ingest_video_transcript()`.
+
+    Args:
+        latency (float, optional): Seconds each transcript request takes.
+        failure_rate (float, optional): Probability that a request fails with a
+        transient error (and succeeds when retried).
+        words (int, optional): Number of words in each transcript.
+        seed (int, optional): Seed for the random failures. Whether a request
+        fails depends only on the seed, the video and how many times it has been
+        requested, so sequential and concurrent runs see the same failures.
+    """
+
+    def __init__(self, latency=0.05, failure_rate=0.1, words=2000, seed=9999):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.words = words
+        self.seed = seed
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def get_transcript(self, video_id):
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(video_id, 0)
+            self._attempts[video_id] = attempt + 1
+        fail = (
+            random.Random(f"{self.seed}-{video_id}-{attempt}").random()
+            < self.failure_rate
+        )
+
+        time.sleep(self.latency)
+        if fail:
+            raise ConnectionError(f"simulated transient failure for {video_id}")
+
+        # one segment per 10 words, like the short caption lines YouTube returns
+        return [
+            {"text": " ".join([f"{video_id}-word"] * 10), "start": i, "duration": 1.0}
+            for i in range(self.words // 10)
+        ]
+
+
+def start_stub_server(videos=None, latency=0.05, host="127.0.0.1", port=0):
+    """Start a local stand-in for the YouTube Data API in a background thread.
+
+    Args:
+        videos (list, optional): Videos to serve, as returned by
+        `generate_channel_videos()`. Defaults to None, which generates 5,000.
+        latency (float, optional): Seconds each request sleeps before responding
+        to mimic the round trip to Google's servers. Defaults to 0.05.
+        host (str, optional): Interface to bind to. Defaults to "127.0.0.1".
+        port (int, optional): Port to bind to. Defaults to 0 (any free port).
+
+    Returns:
+        tuple: The running server (call `.shutdown()` when finished) and the
+        base URL to pass as `base_url` to the `dataops_utils` ingestors.
+    """
+    if videos is None:
+        videos = generate_channel_videos()
+
+    server = ThreadingHTTPServer((host, port), _StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.videos = videos
+    server.statistics = {video["video_id"]: video["statistics"] for video in videos}
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://{host}:{server.server_address[1]}/youtube/v3"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    server, base_url = start_stub_server()
+    print(f"Serving stub YouTube Data API at {base_url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
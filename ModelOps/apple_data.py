@@ -1,8 +1,166 @@
-from datetime import datetime, timedelta
+import itertools
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
 import numpy as np
 import pandas as pd
 
+# rows generated per chunk by the chunked / parallel generators. Each chunk draws
+# from its own random stream, so the data generated for a given seed depends on
+# the chunk size but not on how many processes generate it.
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+DEFAULT_FEATURE_DRIFT_FACTORS = {
+    "average_temperature": 1.0,
+    "rainfall": 1.0,
+    "price_per_kg": 1.0,
+    "promo": 1.0,
+}
+
+DEFAULT_CONCEPT_DRIFT_FACTORS = {
+    "price_sensitivity": 1.0,  # No change initially
+    "promo_effect": 1.0,
+    "weekend_effect": 1.0,
+    "feature_importance": False,
+}
+
+
+def _date_parts(dates):
+    """Year, month and weekend flag of a datetime64 array, computed with
+    datetime64 arithmetic rather than a Python loop over datetime objects."""
+    years = dates.astype("datetime64[Y]").astype("int64") + 1970
+    months = dates.astype("datetime64[M]").astype("int64") % 12 + 1
+    # 1970-01-01 was a Thursday, i.e. weekday 3 with Monday as 0
+    weekdays = (dates.astype("datetime64[D]").astype("int64") + 3) % 7
+    return years, months, (weekdays >= 5).astype("int64")
+
+
+def _linspace_slice(start, stop, num, lo, hi):
+    """`np.linspace(start, stop, num)[lo:hi]` without building the full array."""
+    if num == 1:
+        return np.full(hi - lo, float(start))
+    values = np.arange(lo, hi) * ((stop - start) / (num - 1)) + start
+    if hi == num:
+        values[-1] = stop
+    return values
+
+
+def _apple_sales_frame(
+    draws,
+    dates,
+    start_year,
+    row_offset,
+    n_rows_total,
+    base_demand,
+    feature_drift_factors,
+    concept_drift_factors,
+    date_parts=None,
+):
+    """Build (a chunk of) the apple sales data from its random draws.
+
+    Args:
+        draws (dict): Random draws for each row: `average_temperature`,
+        `rainfall`, `holiday`, `price_per_kg`, `promo` (0/1 before peak months
+        are applied) and `noise`.
+        dates (np.ndarray): datetime64 date of each row.
+        start_year (int): Year of the first row of the full dataset.
+        row_offset (int): Position of the first row in the full dataset.
+        n_rows_total (int): Number of rows in the full dataset.
+        base_demand (int): Base demand for apples.
+        feature_drift_factors (dict): See
+        `generate_apple_sales_data_with_promo_adjustment()`.
+        concept_drift_factors (dict): See
+        `generate_apple_sales_data_with_promo_adjustment()`.
+        date_parts (tuple, optional): `_date_parts(dates)`, if already computed.
+
+    Returns:
+        pd.DataFrame: The data, with `previous_days_demand` computed within the
+        chunk only (its first row repeats the chunk's first demand).
+    """
+    n_rows = len(dates)
+    years, months, weekend = date_parts or _date_parts(dates)
+
+    # Introduce inflation over time (years)
+    inflation_multiplier = 1 + (years - start_year) * 0.03
+
+    # Incorporate seasonality due to apple harvests
+    harvest_effect = np.sin(2 * np.pi * (months - 3) / 12) + np.sin(
+        2 * np.pi * (months - 9) / 12
+    )
+
+    # Modify the price_per_kg based on harvest effect
+    price_per_kg = (
+        draws["price_per_kg"] * feature_drift_factors.get("price_per_kg", 1.0)
+        - harvest_effect * 0.5
+    )
+
+    # Adjust promo periods to coincide with periods lagging peak harvest by 1 month
+    peak_months = [4, 10]  # months following the peak availability
+    promo = np.where(np.isin(months, peak_months), 1, draws["promo"])
+
+    # Introduce **concept drift** by gradually changing feature importance over time
+    if concept_drift_factors.get("feature_importance"):
+        concept_shift = _linspace_slice(
+            1, 1.0 - 0.4, n_rows_total, row_offset, row_offset + n_rows
+        )
+    else:
+        concept_shift = 1
+
+    # Generate target variable based on features
+    base_price_effect = (
+        -price_per_kg
+        * 50
+        * concept_drift_factors.get("price_sensitivity", 1.0)
+        * concept_shift
+    )
+    seasonality_effect = harvest_effect * 50
+    promo_effect = (
+        promo * 200 * concept_drift_factors.get("promo_effect", 1.0) * concept_shift
+    )
+    weekend_effect = (
+        weekend
+        * 300
+        * concept_drift_factors.get("weekend_effect", 1.0)
+        * concept_shift
+    )
+
+    demand = (
+        base_demand
+        + base_price_effect
+        + seasonality_effect
+        + promo_effect
+        + weekend_effect
+        + draws["noise"]  # adding random noise
+    ) * inflation_multiplier
+
+    # convert to integer
+    demand = np.round(demand).astype(int)
+
+    # Add previous day's demand, filling the first row like `.bfill()` would (a
+    # single row has nothing to fill from)
+    previous_days_demand = np.full(n_rows, np.nan)
+    previous_days_demand[1:] = demand[:-1]
+    if n_rows > 1:
+        previous_days_demand[0] = demand[0]
+
+    return pd.DataFrame(
+        {
+            "date": dates,
+            "average_temperature": draws["average_temperature"]
+            * feature_drift_factors.get("average_temperature", 1.0),
+            "rainfall": draws["rainfall"] * feature_drift_factors.get("rainfall", 1.0),
+            "weekend": weekend,
+            "holiday": draws["holiday"],
+            "price_per_kg": price_per_kg,
+            "promo": promo,
+            "demand": demand,
+            "previous_days_demand": previous_days_demand,
+        }
+    )
+
 
 def generate_apple_sales_data_with_promo_adjustment(
     base_demand: int = 1000,
@@ -42,6 +200,12 @@ def generate_apple_sales_data_with_promo_adjustment(
     Example:
         >>> df = generate_apple_sales_data_with_seasonality(base_demand=1200, n_rows=6000)
         >>> df.head()
+
+    Note:
+        This draws from the global `np.random` state (seeded with 9999) so it keeps
+        producing the same data the course's models were trained on. For large
+        datasets use `generate_apple_sales_data()`, `iter_apple_sales_data()` or
+        `write_apple_sales_parquet()` instead.
     """
 
     # Set seed for reproducibility
@@ -49,61 +213,24 @@ def generate_apple_sales_data_with_promo_adjustment(
 
     # Set default drift factors if none are provided
     if feature_drift_factors is None:
-        feature_drift_factors = {
-            "average_temperature": 1.0,
-            "rainfall": 1.0,
-            "price_per_kg": 1.0,
-            "promo": 1.0,
-        }
+        feature_drift_factors = DEFAULT_FEATURE_DRIFT_FACTORS
 
     # Set default concept drift factors if none are provided
     if concept_drift_factors is None:
-        concept_drift_factors = {
-            "price_sensitivity": 1.0,  # No change initially
-            "promo_effect": 1.0,
-            "weekend_effect": 1.0,
-            "feature_importance": False,
-        }
-
-    # Create date range
-    dates = [datetime.now() - timedelta(days=i) for i in range(n_rows)]
-    dates.reverse()
-
-    # Generate features
-    df = pd.DataFrame(
-        {
-            "date": dates,
-            "average_temperature": np.random.uniform(10, 35, n_rows)
-            * feature_drift_factors.get("average_temperature", 1.0),
-            "rainfall": np.random.exponential(5, n_rows)
-            * feature_drift_factors.get("rainfall", 1.0),
-            "weekend": [(date.weekday() >= 5) * 1 for date in dates],
-            "holiday": np.random.choice([0, 1], n_rows, p=[0.97, 0.03]),
-            "price_per_kg": np.random.uniform(0.5, 3, n_rows)
-            * feature_drift_factors.get("price_per_kg", 1.0),
-            "month": [date.month for date in dates],
-        }
-    )
-
-    # Introduce inflation over time (years)
-    df["inflation_multiplier"] = (
-        1 + (df["date"].dt.year - df["date"].dt.year.min()) * 0.03
-    )
-
-    # Incorporate seasonality due to apple harvests
-    df["harvest_effect"] = np.sin(2 * np.pi * (df["month"] - 3) / 12) + np.sin(
-        2 * np.pi * (df["month"] - 9) / 12
-    )
+        concept_drift_factors = DEFAULT_CONCEPT_DRIFT_FACTORS
 
-    # Modify the price_per_kg based on harvest effect
-    df["price_per_kg"] = df["price_per_kg"] - df["harvest_effect"] * 0.5
+    # Create date range, ending now
+    end = np.datetime64(datetime.now(), "ns")
+    dates = end - np.arange(n_rows)[::-1].astype("timedelta64[D]")
 
-    # Adjust promo periods to coincide with periods lagging peak harvest by 1 month
-    peak_months = [4, 10]  # months following the peak availability
-    df["promo"] = np.where(
-        df["month"].isin(peak_months),
-        1,
-        np.random.choice(
+    # Generate features, drawing in the same order as always so the same data is
+    # produced for the same arguments
+    draws = {
+        "average_temperature": np.random.uniform(10, 35, n_rows),
+        "rainfall": np.random.exponential(5, n_rows),
+        "holiday": np.random.choice([0, 1], n_rows, p=[0.97, 0.03]),
+        "price_per_kg": np.random.uniform(0.5, 3, n_rows),
+        "promo": np.random.choice(
             [0, 1],
             n_rows,
             p=[
@@ -111,54 +238,369 @@ def generate_apple_sales_data_with_promo_adjustment(
                 0.15 * feature_drift_factors.get("promo", 1.0),
             ],
         ),
+    }
+    draws["noise"] = np.random.normal(0, 50, n_rows)
+
+    years, _, _ = _date_parts(dates[:1])
+    return _apple_sales_frame(
+        draws,
+        dates,
+        start_year=years[0] if n_rows else 0,
+        row_offset=0,
+        n_rows_total=n_rows,
+        base_demand=base_demand,
+        feature_drift_factors=feature_drift_factors,
+        concept_drift_factors=concept_drift_factors,
     )
 
-    # Introduce **concept drift** by gradually changing feature importance over time
-    if concept_drift_factors.get("feature_importance"):
-        concept_shift = np.linspace(1, 1.0 - 0.4, n_rows)
-    else:
-        concept_shift = 1
 
-    # Generate target variable based on features
-    base_price_effect = (
-        -df["price_per_kg"]
-        * 50
-        * concept_drift_factors.get("price_sensitivity", 1.0)
-        * concept_shift
+def _draw_chunk(rng, n_rows):
+    """Random draws for one chunk of `_generate_chunk()`. Promotions are drawn as
+    uniform values so any promo drift factor can be applied afterwards with
+    `_promo_flags()`."""
+    return {
+        "average_temperature": rng.uniform(10, 35, n_rows),
+        "rainfall": rng.exponential(5, n_rows),
+        "holiday": (rng.random(n_rows) < 0.03).astype("int64"),
+        "price_per_kg": rng.uniform(0.5, 3, n_rows),
+        "promo_uniform": rng.random(n_rows),
+        "noise": rng.normal(0, 50, n_rows),
+    }
+
+
+def _promo_flags(promo_uniform, feature_drift_factors):
+    """Promotion flags (before peak months are applied) from uniform draws."""
+    return (promo_uniform < 0.15 * feature_drift_factors.get("promo", 1.0)).astype(
+        "int64"
     )
-    seasonality_effect = df["harvest_effect"] * 50
-    promo_effect = (
-        df["promo"]
-        * 200
-        * concept_drift_factors.get("promo_effect", 1.0)
-        * concept_shift
+
+
+def _generate_chunk(task):
+    """Generate one chunk of `iter_apple_sales_data()`. Takes a single tuple so it
+    can be mapped over a process pool."""
+    (
+        chunk_number,
+        row_offset,
+        n_rows,
+        n_rows_total,
+        start_date,
+        seed,
+        base_demand,
+        feature_drift_factors,
+        concept_drift_factors,
+    ) = task
+
+    # every chunk has its own independent stream, so chunks can be generated in
+    # any order (or process) and still produce the same data
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_number,)))
+    draws = _draw_chunk(rng, n_rows)
+    draws["promo"] = _promo_flags(draws.pop("promo_uniform"), feature_drift_factors)
+
+    dates = start_date + np.arange(row_offset, row_offset + n_rows).astype(
+        "timedelta64[D]"
     )
-    weekend_effect = (
-        df["weekend"]
-        * 300
-        * concept_drift_factors.get("weekend_effect", 1.0)
-        * concept_shift
+    start_year, _, _ = _date_parts(np.array([start_date]))
+    return _apple_sales_frame(
+        draws,
+        dates,
+        start_year=start_year[0],
+        row_offset=row_offset,
+        n_rows_total=n_rows_total,
+        base_demand=base_demand,
+        feature_drift_factors=feature_drift_factors,
+        concept_drift_factors=concept_drift_factors,
     )
 
-    df["demand"] = (
-        base_demand
-        + base_price_effect
-        + seasonality_effect
-        + promo_effect
-        + weekend_effect
-        + np.random.normal(0, 50, n_rows)  # adding random noise
-    ) * df["inflation_multiplier"]
 
-    # convert to integer
-    df["demand"] = df["demand"].round().astype(int)
+def iter_apple_sales_data(
+    n_rows: int = 5000,
+    base_demand: int = 1000,
+    feature_drift_factors: dict = None,
+    concept_drift_factors: dict = None,
+    seed: int = 9999,
+    end_date=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    processes: int = 1,
+):
+    """Generate the apple sales data in chunks of at most `chunk_size` rows, so
+    datasets of tens of millions of rows can be generated in bounded memory.
 
-    # Add previous day's demand
-    df["previous_days_demand"] = df["demand"].shift(1)
-    df["previous_days_demand"] = df[
-        "previous_days_demand"
-    ].bfill()  # fill the first row
+    The data has the same columns and relationships as
+    `generate_apple_sales_data_with_promo_adjustment()`, but is drawn from
+    `np.random.Generator` streams (one per chunk) rather than the global random
+    state. For the same seed, end date and chunk size the output is identical
+    whatever the number of processes.
+
+    Args:
+        n_rows (int, optional): Number of rows (days) of data to generate.
+        base_demand (int, optional): Base demand for apples. Defaults to 1000.
+        feature_drift_factors (dict, optional): See
+        `generate_apple_sales_data_with_promo_adjustment()`.
+        concept_drift_factors (dict, optional): See
+        `generate_apple_sales_data_with_promo_adjustment()`.
+        seed (int, optional): Random seed. Defaults to 9999.
+        end_date (optional): Date of the last row. Defaults to today (midnight).
+        Dates are `datetime64[s]` since long datasets go back further than
+        nanosecond timestamps can.
+        chunk_size (int, optional): Maximum rows per chunk. Defaults to 1,000,000.
+        processes (int, optional): Number of processes generating chunks in
+        parallel. Defaults to 1.
 
-    # Drop temporary columns
-    df.drop(columns=["inflation_multiplier", "harvest_effect", "month"], inplace=True)
+    Yields:
+        pd.DataFrame: Consecutive chunks of the data, in order.
+
+    Example:
+        >>> for chunk in iter_apple_sales_data(n_rows=50_000_000, processes=8):
+        ...     ...
+    """
+    if feature_drift_factors is None:
+        feature_drift_factors = DEFAULT_FEATURE_DRIFT_FACTORS
+    if concept_drift_factors is None:
+        concept_drift_factors = DEFAULT_CONCEPT_DRIFT_FACTORS
+
+    # fix the dates up front so every chunk (and process) agrees on them
+    if end_date is None:
+        end_date = pd.Timestamp.now().normalize()
+    # with one row per day, tens of millions of rows span far more than the ~584
+    # years nanosecond timestamps can represent, so dates have second resolution
+    start_date = pd.Timestamp(end_date).to_datetime64().astype(
+        "datetime64[s]"
+    ) - np.timedelta64(n_rows - 1, "D")
+
+    tasks = (
+        (
+            chunk_number,
+            row_offset,
+            min(chunk_size, n_rows - row_offset),
+            n_rows,
+            start_date,
+            seed,
+            base_demand,
+            feature_drift_factors,
+            concept_drift_factors,
+        )
+        for chunk_number, row_offset in enumerate(range(0, n_rows, chunk_size))
+    )
+
+    # each chunk's previous_days_demand starts with the previous chunk's last demand
+    last_demand = None
+    for chunk in _map_chunks(tasks, processes):
+        if last_demand is not None:
+            chunk.loc[0, "previous_days_demand"] = last_demand
+        last_demand = chunk["demand"].iloc[-1]
+        yield chunk
+
+
+def _map_chunks(tasks, processes):
+    """Generate chunks in order, in this process or on a pool of `processes`.
+    At most `2 * processes` chunks are generated ahead of the consumer so memory
+    stays bounded."""
+    if processes <= 1:
+        for task in tasks:
+            yield _generate_chunk(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(_generate_chunk, task))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_apple_sales_data(n_rows: int = 5000, **kwargs):
+    """Generate the apple sales data as a single DataFrame. Takes the same
+    arguments as `iter_apple_sales_data()`.
+
+    Returns:
+        pd.DataFrame: DataFrame with features and target variable for apple sales
+        prediction.
+    """
+    return pd.concat(list(iter_apple_sales_data(n_rows, **kwargs)), ignore_index=True)
+
+
+def write_apple_sales_parquet(path: str, n_rows: int = 5000, **kwargs):
+    """Stream the apple sales data to a parquet file, one row group per chunk, so
+    the full dataset is never held in memory. Takes the same arguments as
+    `iter_apple_sales_data()`.
+
+    Args:
+        path (str): Parquet file to write.
+        n_rows (int, optional): Number of rows (days) of data to generate.
+
+    Returns:
+        int: Number of rows written.
+
+    Example:
+        >>> write_apple_sales_parquet("load_test_data.parquet", 50_000_000, processes=8)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    n_written = 0
+    writer = None
+    try:
+        for chunk in iter_apple_sales_data(n_rows, **kwargs):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            n_written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_written
+
+
+def drift_scenarios(feature_drift_grid: dict = None, concept_drift_grid: dict = None):
+    """Every combination of a grid of drift factors.
+
+    Args:
+        feature_drift_grid (dict, optional): Values to try for each feature drift
+        factor, e.g. `{"average_temperature": [1.0, 1.1, 1.2], "promo": [1.0, 1.5]}`.
+        Factors not in the grid stay at their defaults.
+        concept_drift_grid (dict, optional): Values to try for each concept drift
+        factor, e.g. `{"price_sensitivity": [1.0, 1.05], "feature_importance": [False, True]}`.
+
+    Returns:
+        list: `(feature_drift_factors, concept_drift_factors)` pairs, one per
+        combination, ready to pass to `write_drift_sweep()`.
+    """
+    feature_drift_grid = feature_drift_grid or {}
+    concept_drift_grid = concept_drift_grid or {}
+
+    grid = [(True, name, values) for name, values in feature_drift_grid.items()]
+    grid += [(False, name, values) for name, values in concept_drift_grid.items()]
+
+    scenarios = []
+    for combination in itertools.product(*[values for _, _, values in grid]):
+        feature_drift_factors = dict(DEFAULT_FEATURE_DRIFT_FACTORS)
+        concept_drift_factors = dict(DEFAULT_CONCEPT_DRIFT_FACTORS)
+        for (is_feature, name, _), value in zip(grid, combination):
+            factors = feature_drift_factors if is_feature else concept_drift_factors
+            factors[name] = value
+        scenarios.append((feature_drift_factors, concept_drift_factors))
+    return scenarios
+
+
+def write_drift_sweep(
+    output_dir: str,
+    scenarios: list,
+    n_rows: int = 5000,
+    base_demand: int = 1000,
+    seed: int = 9999,
+    end_date=None,
+):
+    """Generate one drifted apple sales dataset per scenario and write them to a
+    parquet dataset partitioned by scenario.
+
+    The random draws (weather, prices, holidays, promotions and noise) and the
+    date features are generated once and shared by every scenario; each
+    scenario only re-applies its drift factors to them, so a sweep of hundreds
+    of scenarios costs little more than one generation plus the writes. Sharing
+    the draws also means scenarios differ only by their drift, not by noise.
+
+    For the default factors, a scenario's data is the same as
+    `generate_apple_sales_data()` with the same `n_rows`, `seed` and `end_date`
+    (as long as `n_rows` fits in one chunk).
+
+    Args:
+        output_dir (str): Directory to write the dataset to. Each scenario is
+        written to `output_dir/scenario=<n>/data.parquet` with its drift factors
+        stored as JSON in the file's `drift_factors` metadata, and a manifest of
+        every scenario's factors is written to `output_dir/_scenarios.parquet`.
+        scenarios (list): `(feature_drift_factors, concept_drift_factors)` pairs,
+        e.g. from `drift_scenarios()`. Either may be None for the defaults.
+        n_rows (int, optional): Number of rows (days) in each dataset.
+        base_demand (int, optional): Base demand for apples. Defaults to 1000.
+        seed (int, optional): Random seed. Defaults to 9999.
+        end_date (optional): Date of the last row. Defaults to today (midnight).
+
+    Returns:
+        pd.DataFrame: The manifest: one row per scenario with its number and
+        drift factors.
+
+    Example:
+        >>> scenarios = drift_scenarios(
+        ...     {"average_temperature": [1.0, 1.1, 1.2], "promo": [1.0, 1.25, 1.5]},
+        ...     {"price_sensitivity": [1.0, 1.05], "feature_importance": [False, True]},
+        ... )
+        >>> manifest = write_drift_sweep("drift_sweep", scenarios)
+        >>> pd.read_parquet("drift_sweep", filters=[("scenario", "=", 3)])
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if end_date is None:
+        end_date = pd.Timestamp.now().normalize()
+    start_date = pd.Timestamp(end_date).to_datetime64().astype(
+        "datetime64[s]"
+    ) - np.timedelta64(n_rows - 1, "D")
+
+    # the same stream as the first chunk of iter_apple_sales_data()
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(0,)))
+    base_draws = _draw_chunk(rng, n_rows)
+    promo_uniform = base_draws.pop("promo_uniform")
+
+    dates = start_date + np.arange(n_rows).astype("timedelta64[D]")
+    date_parts = _date_parts(dates)
+    start_year = date_parts[0][0] if n_rows else 0
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = []
+    for scenario, (feature_drift_factors, concept_drift_factors) in enumerate(
+        scenarios
+    ):
+        feature_drift_factors = {
+            **DEFAULT_FEATURE_DRIFT_FACTORS,
+            **(feature_drift_factors or {}),
+        }
+        concept_drift_factors = {
+            **DEFAULT_CONCEPT_DRIFT_FACTORS,
+            **(concept_drift_factors or {}),
+        }
+
+        draws = {
+            **base_draws,
+            "promo": _promo_flags(promo_uniform, feature_drift_factors),
+        }
+        data = _apple_sales_frame(
+            draws,
+            dates,
+            start_year=start_year,
+            row_offset=0,
+            n_rows_total=n_rows,
+            base_demand=base_demand,
+            feature_drift_factors=feature_drift_factors,
+            concept_drift_factors=concept_drift_factors,
+            date_parts=date_parts,
+        )
+
+        factors = {
+            "feature_drift_factors": feature_drift_factors,
+            "concept_drift_factors": concept_drift_factors,
+        }
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, b"drift_factors": json.dumps(factors)}
+        )
+
+        partition_dir = os.path.join(output_dir, f"scenario={scenario}")
+        os.makedirs(partition_dir, exist_ok=True)
+        pq.write_table(table, os.path.join(partition_dir, "data.parquet"))
+
+        manifest.append(
+            {
+                "scenario": scenario,
+                **{f"feature_{k}": v for k, v in feature_drift_factors.items()},
+                **{f"concept_{k}": v for k, v in concept_drift_factors.items()},
+            }
+        )
 
-    return df
+    # a leading underscore keeps the manifest out of the partitioned dataset
+    manifest = pd.DataFrame(manifest)
+    manifest.to_parquet(os.path.join(output_dir, "_scenarios.parquet"), index=False)
+    return manifest
@@ -18,8 +18,8 @@ def clean_prediction_logs(prediction_logs):
                       and predictions.
     """
     # Create a dataframe for single requests & batch requests
-    singles_df = prediction_logs[prediction_logs["request_type"] == "single"]
-    batch_df = prediction_logs[prediction_logs["request_type"] == "batch"]
+    singles_df = prediction_logs[prediction_logs["request_type"] == "single"].copy()
+    batch_df = prediction_logs[prediction_logs["request_type"] == "batch"].copy()
 
     # Create JSON structure for nested input_data & predictions columns
     batch_df["input_data"] = batch_df["input_data"].apply(json.loads)
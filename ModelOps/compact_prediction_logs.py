@@ -0,0 +1,274 @@
+"""Incrementally compact prediction logs into a date-partitioned feature table.
+
+Run from the ModelOps folder after making some predictions, e.g.
+
+    python compact_prediction_logs.py --log-dir prediction_logs
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from prediction_log_sink import SEGMENT_SUFFIX, log_schema
+
+# Features of the apple demand model, as logged by fastapi_with_monitoring_app.py
+FEATURE_DTYPES = {
+    "average_temperature": "float64",
+    "rainfall": "float64",
+    "weekend": "int64",
+    "holiday": "int64",
+    "price_per_kg": "float64",
+    "promo": "int64",
+    "previous_days_demand": "float64",
+}
+
+# Hive-style partition column of the feature table (prediction_day=YYYY-MM-DD)
+PARTITION_COLUMN = "prediction_day"
+
+# Kept in the table directory; pyarrow ignores files starting with "_"
+CHECKPOINT_FILE = "_checkpoint.json"
+
+
+def _table_schema(feature_dtypes):
+    return log_schema(feature_dtypes).append(pa.field(PARTITION_COLUMN, pa.string()))
+
+
+def flatten_csv_logs(logs, first_row=0):
+    """Flatten logs in the original CSV format (one row per request with the
+    inputs and predictions as JSON strings) into one row per prediction.
+
+    All of the JSON cells of a column are parsed with a single `json.loads` call
+    and singles and batches are flattened together.
+
+    Args:
+        logs (pd.DataFrame): Rows of `prediction_logs.csv`, with a `timestamp`
+        (or `prediction_date`), `request_type`, `input_data`, `predictions` and
+        `status` column.
+        first_row (int, optional): Position of the first row in the log file,
+        used to give each request an ID.
+
+    Returns:
+        pd.DataFrame: One row per prediction with the same columns as the
+        prediction log segments (see `prediction_log_sink.log_schema()`).
+    """
+    inputs = json.loads("[" + ",".join(logs["input_data"].fillna("[]")) + "]")
+    predictions = json.loads("[" + ",".join(logs["predictions"].fillna("null")) + "]")
+    counts = [len(rows) for rows in inputs]
+
+    # failed requests have no predictions, so their rows get nulls
+    flat_predictions = list(
+        itertools.chain.from_iterable(
+            preds if isinstance(preds, list) and len(preds) == n else [None] * n
+            for preds, n in zip(predictions, counts)
+        )
+    )
+
+    status = logs["status"].astype(str)
+    is_error = status.str.startswith("error")
+    requests = pd.DataFrame(
+        {
+            "prediction_date": pd.to_datetime(
+                logs["timestamp"] if "timestamp" in logs else logs["prediction_date"],
+                format="ISO8601",
+            ),
+            "request_id": [f"csv-{first_row + i}" for i in range(len(logs))],
+            "request_type": logs["request_type"].to_numpy(),
+            "status": is_error.map({True: "error", False: "success"}).to_numpy(),
+            "error": status.str.removeprefix("error: ").where(is_error).to_numpy(),
+        }
+    )
+
+    flat = requests.loc[requests.index.repeat(counts)].reset_index(drop=True)
+    features = pd.DataFrame.from_records(
+        list(itertools.chain.from_iterable(inputs)), index=flat.index
+    )
+    flat = pd.concat([flat, features], axis=1)
+    flat["predictions"] = pd.Series(flat_predictions, index=flat.index, dtype="float64")
+    return flat
+
+
+def _to_table(data, schema):
+    """Cast flattened logs to the feature table's schema."""
+    data = data.copy()
+    for field in schema:
+        if field.name not in data:
+            data[field.name] = None
+    data[PARTITION_COLUMN] = pd.to_datetime(data["prediction_date"]).dt.strftime(
+        "%Y-%m-%d"
+    )
+    # integer features are nullable, e.g. in requests with a missing column
+    for field in schema:
+        if pa.types.is_integer(field.type):
+            data[field.name] = data[field.name].astype("Int64")
+    return pa.Table.from_pandas(data[schema.names], schema=schema, preserve_index=False)
+
+
+def _read_checkpoint(path):
+    if not os.path.exists(path):
+        return {"run": 0, "segments": [], "csv_offset": 0, "csv_rows": 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def _read_new_csv_rows(csv_path, offset):
+    """Read the complete lines appended to a CSV log since `offset`.
+
+    Returns:
+        tuple: The new rows and the offset just after them.
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        offset = max(offset, f.tell())
+        f.seek(offset)
+        new = f.read()
+
+    # a request may be mid-write, so leave any partial last line for next time
+    end = new.rfind(b"\n") + 1
+    if end == 0:
+        return pd.DataFrame(), offset
+    rows = pd.read_csv(io.BytesIO(header + new[:end]))
+    return rows, offset + end
+
+
+def compact_prediction_logs(
+    log_dir="prediction_logs",
+    table_dir="prediction_features",
+    csv_path=None,
+    feature_dtypes=FEATURE_DTYPES,
+):
+    """Append prediction logs that haven't been compacted yet to a Parquet table
+    partitioned by prediction day.
+
+    A checkpoint in the table directory records which log segments (and how much
+    of a CSV log) have been compacted, so each run only reads new logs and its
+    cost grows with new traffic rather than total log history. Each run writes
+    its own files into the partitions it touches. If a run fails before updating
+    the checkpoint, the next run rewrites the same files, so rows aren't
+    duplicated.
+
+    Args:
+        log_dir (str, optional): Directory of Parquet log segments written by
+        `PredictionLogSink`.
+        table_dir (str, optional): Directory of the partitioned feature table.
+        csv_path (str, optional): Log in the original CSV format (e.g.
+        "prediction_logs.csv") to compact as well. Only lines appended since
+        the last run are read.
+        feature_dtypes (dict, optional): Dtype of each logged feature.
+
+    Returns:
+        int: Number of rows appended to the table.
+    """
+    os.makedirs(table_dir, exist_ok=True)
+    checkpoint_path = os.path.join(table_dir, CHECKPOINT_FILE)
+    checkpoint = _read_checkpoint(checkpoint_path)
+    schema = _table_schema(feature_dtypes)
+    tables = []
+
+    # Log segments that are finished but not compacted yet
+    finished = set()
+    if os.path.isdir(log_dir):
+        finished = {
+            name for name in os.listdir(log_dir) if name.endswith(SEGMENT_SUFFIX)
+        }
+    new_segments = sorted(finished - set(checkpoint["segments"]))
+    for name in new_segments:
+        segment = pq.read_table(os.path.join(log_dir, name)).to_pandas()
+        tables.append(_to_table(segment, schema))
+
+    # Lines appended to the CSV log since the last run
+    csv_offset, csv_rows = checkpoint["csv_offset"], checkpoint["csv_rows"]
+    if csv_path is not None and os.path.exists(csv_path):
+        rows, csv_offset = _read_new_csv_rows(csv_path, csv_offset)
+        if len(rows):
+            tables.append(_to_table(flatten_csv_logs(rows, csv_rows), schema))
+            csv_rows += len(rows)
+
+    table = pa.concat_tables(tables) if tables else schema.empty_table()
+    if table.num_rows:
+        pq.write_to_dataset(
+            table,
+            table_dir,
+            partition_cols=[PARTITION_COLUMN],
+            basename_template=f"part-{checkpoint['run'] + 1:06d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+
+    _write_checkpoint(
+        checkpoint_path,
+        {
+            "run": checkpoint["run"] + 1,
+            # segments deleted from the log directory can be forgotten
+            "segments": sorted(finished & set(checkpoint["segments"] + new_segments)),
+            "csv_offset": csv_offset,
+            "csv_rows": csv_rows,
+        },
+    )
+    return table.num_rows
+
+
+def read_prediction_features(
+    table_dir="prediction_features", start=None, end=None, feature_dtypes=FEATURE_DTYPES
+):
+    """Read the compacted feature table, optionally only between two days.
+
+    Only the partitions in the date range are read.
+
+    Args:
+        table_dir (str, optional): Directory of the partitioned feature table.
+        start (str, optional): First prediction day to read ("YYYY-MM-DD").
+        end (str, optional): Last prediction day to read ("YYYY-MM-DD").
+        feature_dtypes (dict, optional): Dtype of each logged feature, used for
+        the columns of an empty table.
+
+    Returns:
+        pd.DataFrame: One row per logged prediction, with all of the table's
+        columns even if nothing has been logged yet.
+    """
+    if not os.path.isdir(table_dir):
+        # nothing has been compacted yet
+        return _table_schema(feature_dtypes).empty_table().to_pandas()
+
+    filters = []
+    if start is not None:
+        filters.append((PARTITION_COLUMN, ">=", str(start)))
+    if end is not None:
+        filters.append((PARTITION_COLUMN, "<=", str(end)))
+
+    # read the partition values as strings, not inferred dates
+    partitioning = ds.partitioning(
+        pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"
+    )
+    features = pd.read_parquet(
+        table_dir, filters=filters or None, partitioning=partitioning
+    )
+    if features.empty:
+        # without any data files only the partition column is found
+        return _table_schema(feature_dtypes).empty_table().to_pandas()
+    return features
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--log-dir", default="prediction_logs")
+    parser.add_argument("--table-dir", default="prediction_features")
+    parser.add_argument(
+        "--csv", help="also compact a CSV log, e.g. prediction_logs.csv"
+    )
+    args = parser.parse_args()
+
+    n_rows = compact_prediction_logs(args.log_dir, args.table_dir, args.csv)
+    print(f"Appended {n_rows} rows to {args.table_dir}")
@@ -1,23 +1,121 @@
+import asyncio
 import datetime
 import io
-import json
-import os
+import threading
+import traceback
+from contextlib import asynccontextmanager
 from typing import List
 
-import mlflow.pyfunc
 import pandas as pd
 from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-# Initialize FastAPI app
-app = FastAPI()
-
-# Set experiment name
-mlflow.set_experiment("Forecasting Apple Demand")
+from inference_executor import executor_from_env
+from model_loader import model_loader_from_env
+from model_watcher import model_watcher_from_env
+from online_drift import drift_monitor_from_env
+from prediction_log_sink import log_sink_from_env
+from reference_profile import load_reference_profile
 
-# Load the trained model from MLflow
+# The trained model to serve from MLflow
 MODEL_URI = "models:/apple_demand@champion"  # Replace with your model name and alias
-model = mlflow.pyfunc.load_model(MODEL_URI)
+
+# The model is loaded in the background once the server is up (see lifespan()),
+# so the app imports quickly and /ready reports when it can take predictions.
+# Set MODEL_CACHE_DIR to keep a local copy of the resolved model, so restarts
+# load it without going through the registry (see model_loader.py).
+loader = model_loader_from_env(MODEL_URI)
+model = None
+
+# Track drift of live traffic against the model's training data (see
+# online_drift.py and reference_profile.py). The reference profile is built
+# from training_data/ the first time the model is served. The monitor lives in
+# the worker process, so under serve_supervisor.py each worker only sees the
+# requests it served (fastapi_streamlit_with_monitoring.py runs one worker).
+drift_monitor = None
+
+# /predict_batch parses files and predicts on a bounded worker pool rather than
+# the event loop. Requests beyond its workers and queue get a 429 with
+# Retry-After, and calls that take too long a 504 (configure with BATCH_*
+# variables, see inference_executor.py).
+batch_executor = None
+
+# When the alias moves to a new version, a background thread loads and warms it
+# up, then swaps it in (set MODEL_WATCH_INTERVAL, see model_watcher.py)
+watcher = None
+
+# Why the loaded model couldn't be served at startup, if it couldn't (e.g. its
+# warm-up failed), reported by /ready
+serve_error = None
+
+
+def serve(new_loader):
+    """Start serving a loaded model, replacing the one being served (if any),
+    and monitor drift against the reference profile of its training data."""
+    global loader, model, drift_monitor, batch_executor
+    new_batch_executor = executor_from_env(
+        "BATCH",
+        new_loader.model,
+        new_loader.path,
+        max_workers=1,
+        max_queue=4,
+        timeout=300.0,
+    )
+    new_drift_monitor = None
+    try:
+        reference_profile = load_reference_profile(
+            new_loader.run_id, model=new_loader.model
+        )
+        new_drift_monitor = drift_monitor_from_env(reference_profile)
+    except FileNotFoundError:
+        print("No training data found for the model, drift monitoring is disabled.")
+
+    old_batch_executor = batch_executor
+    batch_executor = new_batch_executor
+    loader = new_loader
+    drift_monitor = new_drift_monitor
+    # set last, as the app is ready to predict once the model is set
+    model = new_loader.model
+
+    # give requests that picked up the old executor a moment to hand it their work
+    if old_batch_executor is not None:
+        threading.Timer(1.0, old_batch_executor.close).start()
+
+
+def load_model():
+    """Load the model, start serving it and watch for new versions."""
+    global watcher, serve_error
+    try:
+        loader.load()
+        serve(loader)
+        serve_error = None
+        print(loader.summary())
+    except Exception as e:
+        # the watcher tries again at its next check
+        traceback.print_exc()
+        if loader.model is not None:
+            serve_error = str(e)
+
+    watcher = model_watcher_from_env(
+        MODEL_URI,
+        serve,
+        version=loader.version if model is not None else None,
+        warmup_data=WARMUP_ROWS,
+    )
+    if watcher is not None:
+        watcher.start()
+
+
+def require_model():
+    """Reject requests with a 503 until the model is loaded."""
+    if model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is not loaded yet",
+            headers={"Retry-After": "1"},
+        )
 
 
 # Define the expected input schema for a single prediction
@@ -32,35 +130,65 @@ class InputData(BaseModel):
     previous_days_demand: float
 
 
-# Define log file path
-LOG_FILE_PATH = "prediction_logs.csv"
+# A typical request, which new versions of the model are warmed up on before
+# they take requests
+WARMUP_ROWS = pd.DataFrame(
+    [
+        InputData(
+            demand_date=datetime.date(2024, 6, 1),
+            average_temperature=22.0,
+            rainfall=5.0,
+            weekend=0,
+            holiday=0,
+            price_per_kg=1.8,
+            promo=0,
+            previous_days_demand=1100.0,
+        ).dict()
+    ]
+    * 8
+)
 
-# Ensure log file exists with headers
-if not os.path.exists(LOG_FILE_PATH):
-    pd.DataFrame(
-        columns=["prediction_date", "request_type", "input_data", "predictions", "status"]
-    ).to_csv(LOG_FILE_PATH, index=False)
 
+# Features logged with every prediction
+LOG_FEATURES = {
+    "average_temperature": "float64",
+    "rainfall": "float64",
+    "weekend": "int64",
+    "holiday": "int64",
+    "price_per_kg": "float64",
+    "promo": "int64",
+    "previous_days_demand": "float64",
+}
 
-def log_request(request_type, input_data, predictions, status):
-    """Logs the request details to a CSV file."""
-    log_entry = pd.DataFrame(
-        [
-            {
-                "prediction_date": datetime.datetime.now().isoformat(),
-                "request_type": request_type,
-                "input_data": json.dumps(input_data),
-                "predictions": json.dumps(predictions),
-                "status": status,
-            }
-        ]
-    )
-    log_entry.to_csv(LOG_FILE_PATH, mode="a", header=False, index=False)
+
+# Predictions are logged by a background thread to Parquet files in
+# PREDICTION_LOG_DIR (defaults to "prediction_logs"), one row per prediction.
+# Each worker process writes its own segment files (see prediction_log_sink.py).
+log_sink = log_sink_from_env(LOG_FEATURES)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Start the log writer in the worker process and load the model without
+    # holding up startup. The log writer is flushed on shutdown.
+    log_sink.start()
+    loading = asyncio.create_task(run_in_threadpool(load_model))
+    yield
+    loading.cancel()
+    if watcher is not None:
+        watcher.stop()
+    log_sink.close()
+
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
 
 
 @app.post("/predict")
 def predict_single(input_data: List[InputData]):
     """Endpoint for real-time predictions with a single input."""
+    require_model()
+    df = None
     try:
         # Convert input to DataFrame
         df = pd.DataFrame([data.dict() for data in input_data])
@@ -68,24 +196,26 @@ def predict_single(input_data: List[InputData]):
         # Make predictions
         predictions = model.predict(df)
 
-        # Log the request
-        log_request(
-            "single", df.to_dict(orient="records"), predictions.tolist(), "success"
-        )
+        # Log the request and update the drift statistics
+        log_sink.log("single", df, predictions)
+        if drift_monitor is not None:
+            drift_monitor.update(df, predictions)
 
         return {"predictions": predictions.tolist()}
     except Exception as e:
-        log_request("single", df.to_dict(orient="records"), None, f"error: {str(e)}")
+        log_sink.log("single", df, status="error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/predict_batch")
 async def predict_batch(file: UploadFile = File(...)):
     """Endpoint for batch predictions using a CSV file."""
+    require_model()
+    df = None
     try:
-        # Read the uploaded CSV file
+        # Read the uploaded CSV file off the event loop
         contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
+        df = await batch_executor.run(pd.read_csv, io.BytesIO(contents))
 
         # Validate required columns
         required_features = [
@@ -103,15 +233,47 @@ async def predict_batch(file: UploadFile = File(...)):
                 status_code=400, detail=f"Missing columns: {missing_cols}"
             )
 
-        # Make batch predictions
-        predictions = model.predict(df)
+        # Make batch predictions off the event loop
+        predictions = await batch_executor.predict(df)
 
-        # Log the request
-        log_request(
-            "batch", df.to_dict(orient="records"), predictions.tolist(), "success"
-        )
+        # Log the request and update the drift statistics
+        log_sink.log("batch", df, predictions)
+        if drift_monitor is not None:
+            drift_monitor.update(df, predictions)
 
         return {"predictions": predictions.tolist()}
+    except HTTPException as e:
+        # e.g. missing columns, or a 429 or 504 from the executor
+        log_sink.log("batch", df, status="error", error=str(e.detail))
+        raise
     except Exception as e:
-        log_request("batch", df.to_dict(orient="records"), None, f"error: {str(e)}")
+        log_sink.log("batch", df, status="error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/drift")
+def drift():
+    """Drift statistics of recent requests against the training data: PSI,
+    mean and standard deviation of each feature and of the predictions."""
+    if drift_monitor is None:
+        raise HTTPException(status_code=503, detail="Drift monitoring is disabled")
+    return drift_monitor.snapshot()
+
+
+@app.get("/ready")
+def ready():
+    """Readiness check: 200 once the model is served, 503 until then. Includes the
+    model version and how long each step of loading it took.
+
+    The model can be loaded before it is served (e.g. by serve_supervisor.py),
+    so readiness is whether predictions are being taken, not whether the model
+    is loaded.
+    """
+    status = loader.status()
+    status["ready"] = model is not None
+    status["serve_error"] = serve_error if model is None else None
+    if watcher is not None:
+        status["watcher"] = watcher.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
@@ -0,0 +1,224 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fastapi import HTTPException
+
+
+class ExecutorBusy(HTTPException):
+    """429 response for a request that arrives while the executor is full."""
+
+    def __init__(self, retry_after):
+        super().__init__(
+            status_code=429,
+            detail="Server is busy, please retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class InferenceTimeout(HTTPException):
+    """504 response for work that doesn't finish within the executor's timeout."""
+
+    def __init__(self, timeout):
+        super().__init__(
+            status_code=504, detail=f"Prediction did not finish within {timeout}s"
+        )
+
+
+# model loaded in each worker of a process pool
+_worker_model = None
+
+
+def _load_worker_model(model_uri, compiled_path=None):
+    global _worker_model
+    if compiled_path is not None:
+        from compiled_models import CompiledModel
+
+        _worker_model = CompiledModel.load(compiled_path)
+        return
+
+    import mlflow.pyfunc
+
+    _worker_model = mlflow.pyfunc.load_model(model_uri)
+
+
+def _predict_in_worker(df):
+    return _worker_model.predict(df)
+
+
+class InferenceExecutor:
+    """Run CPU-bound work (parsing, `model.predict`) off the event loop on a
+    bounded thread or process pool, with admission control and timeouts.
+
+    At most `max_workers` calls run at once and up to `max_queue` more wait for a
+    worker. Anything beyond that is rejected straight away with a 429 and a
+    `Retry-After` header instead of piling up, and calls that take longer than
+    `timeout` seconds get a 504.
+
+    Args:
+        model (mlflow.pyfunc.PyFuncModel): Model to predict with in a thread pool,
+        or None for a thread pool only used through `run()`.
+        model_uri (str, optional): URI each worker of a process pool loads the
+        model from. Required if `kind` is "process".
+        compiled_path (str, optional): Directory of a compiled copy of the model
+        (see compiled_models.py) that process pool workers load instead of
+        `model_uri`.
+        kind (str, optional): "thread" or "process". Processes sidestep the GIL
+        for models that hold it, at the cost of pickling each DataFrame and one
+        model copy per worker. Defaults to "thread".
+        max_workers (int, optional): Calls run concurrently. Defaults to 4.
+        max_queue (int, optional): Calls allowed to wait for a worker. Defaults
+        to 32.
+        timeout (float, optional): Seconds a caller waits for its result,
+        including time spent queued. Defaults to 30.
+        retry_after (int, optional): Seconds clients are told to wait before
+        retrying a rejected request. Defaults to 1.
+
+    Example:
+        >>> executor = InferenceExecutor(model, max_workers=2, max_queue=8)
+        >>> predictions = await executor.predict(df)
+    """
+
+    def __init__(
+        self,
+        model,
+        model_uri=None,
+        kind="thread",
+        max_workers=4,
+        max_queue=32,
+        timeout=30.0,
+        retry_after=1,
+        compiled_path=None,
+    ):
+        if kind == "process":
+            if model_uri is None:
+                raise ValueError("a process pool needs model_uri to load the model")
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_load_worker_model,
+                initargs=(model_uri, compiled_path),
+            )
+            self.predict_fn = _predict_in_worker
+        elif kind == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=max_workers)
+            self.predict_fn = model.predict if model is not None else None
+        else:
+            raise ValueError(f"kind must be 'thread' or 'process', not {kind!r}")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.admitted = 0
+        self.rejected = 0
+
+    def reserve(self):
+        """Claim a slot for work run outside the pool (e.g. a streaming
+        response), raising `ExecutorBusy` if there is none. Must be called from
+        the event loop.
+
+        Returns:
+            callable: Releases the slot. Safe to call from any thread.
+        """
+        if self.admitted >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorBusy(self.retry_after)
+        self.admitted += 1
+
+        loop = asyncio.get_running_loop()
+        return lambda: loop.call_soon_threadsafe(self._release)
+
+    def _release(self):
+        self.admitted -= 1
+
+    async def run(self, func, *args):
+        """Run `func(*args)` on the pool and return its result.
+
+        Raises:
+            ExecutorBusy: If the pool and its queue are full.
+            InferenceTimeout: If the result isn't ready within `timeout` seconds.
+        """
+        release = self.reserve()
+        future = self._pool.submit(func, *args)
+        # the slot is only freed once the work has actually stopped, so timed out
+        # calls still count against the queue while a worker is busy with them
+        future.add_done_callback(lambda _: release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            # drop it if it hasn't started yet
+            future.cancel()
+            raise InferenceTimeout(self.timeout)
+
+    async def predict(self, df):
+        """Predict on a DataFrame with the model."""
+        return await self.run(self.predict_fn, df)
+
+    def submit(self, func, *args):
+        """Submit `func(*args)` to the pool without admission control or a
+        timeout, for callers that apply their own (see micro_batching.py). On a
+        process pool, `func` must be picklable and predict with `predict_fn`.
+
+        Returns:
+            concurrent.futures.Future: The result.
+        """
+        return self._pool.submit(func, *args)
+
+    def warm_up(self, df):
+        """Predict on `df` once per worker, e.g. before the executor takes
+        traffic. Process pool workers start and load the model on their first
+        call, so this keeps that out of the first requests. Blocks, so call it
+        from a worker thread.
+
+        Raises:
+            Exception: Whatever the model raises on `df`.
+        """
+        futures = [
+            self._pool.submit(self.predict_fn, df) for _ in range(self.max_workers)
+        ]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Stop accepting work. Calls already running or queued still finish."""
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        """Calls currently admitted (running or queued) and rejected so far."""
+        return {"admitted": self.admitted, "rejected": self.rejected}
+
+
+def executor_from_env(prefix, model, model_uri=None, **defaults):
+    """Create an `InferenceExecutor` configured through environment variables:
+
+    - `{prefix}_EXECUTOR`: "thread" or "process".
+    - `{prefix}_WORKERS`: maximum concurrent calls.
+    - `{prefix}_QUEUE_SIZE`: maximum calls waiting for a worker.
+    - `{prefix}_TIMEOUT`: seconds before a call times out.
+    - `{prefix}_RETRY_AFTER`: seconds sent in `Retry-After` when rejecting.
+
+    Args:
+        prefix (str): Environment variable prefix, e.g. "PREDICT".
+        model (mlflow.pyfunc.PyFuncModel): Model to predict with.
+        model_uri (str, optional): URI of the model, for process pools.
+        **defaults: Defaults for any `InferenceExecutor` argument not set in the
+        environment.
+
+    Returns:
+        InferenceExecutor: The executor.
+    """
+    settings = {
+        "kind": ("EXECUTOR", str),
+        "max_workers": ("WORKERS", int),
+        "max_queue": ("QUEUE_SIZE", int),
+        "timeout": ("TIMEOUT", float),
+        "retry_after": ("RETRY_AFTER", int),
+    }
+    kwargs = dict(defaults)
+    for arg, (name, convert) in settings.items():
+        value = os.getenv(f"{prefix}_{name}")
+        if value is not None:
+            kwargs[arg] = convert(value)
+    return InferenceExecutor(model, model_uri=model_uri, **kwargs)
@@ -0,0 +1,454 @@
+"""Load test the FastAPI app and write a JSON report of its performance.
+
+Example:
+    python load_test.py --concurrency 1 8 --batch-sizes 100 1000 --output report.json
+    python load_test.py --output new.json --baseline report.json
+"""
+
+import argparse
+import io
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+
+from apple_data import generate_apple_sales_data_with_promo_adjustment
+
+# Server settings recorded in the report, so runs with different settings
+# aren't mistaken for a change in the code
+SETTING_PREFIXES = (
+    "BATCH_",
+    "COMPILED_",
+    "MICRO_BATCH",
+    "MODEL_",
+    "PREDICT_",
+    "PREDICTION_",
+    "SERVE_",
+)
+
+
+def make_payloads(n_rows=5000):
+    """Generate apple sales rows to send, without the demand target.
+
+    The generator is seeded, so every run sends the same feature values.
+
+    Returns:
+        pd.DataFrame: The rows, with dates as strings.
+    """
+    df = generate_apple_sales_data_with_promo_adjustment(n_rows=n_rows)
+    df = df.drop(columns=["demand"])
+    df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+    return df
+
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of a process and its descendants, read from
+    /proc (Linux only). Pages shared by forked workers are counted once per
+    worker, so this overstates their total.
+
+    Returns:
+        int: The RSS, or None if it can't be read.
+    """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces, the fields after it don't
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        pids.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            if current == pid:
+                return None
+    return total
+
+
+class MemorySampler:
+    """Track the peak RSS of a process tree by sampling it in a thread."""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = process_tree_rss(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def reset(self):
+        """Start a new peak, e.g. for the next scenario."""
+        peak, self.peak = self.peak, None
+        return peak
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_server(app, port, workers):
+    """Start the app with serve_supervisor.py and wait until it is ready.
+
+    Returns:
+        tuple: The server process and the seconds it took to become ready.
+    """
+    url = f"http://127.0.0.1:{port}"
+    try:
+        requests.get(url, timeout=1)
+    except requests.RequestException:
+        pass
+    else:
+        raise RuntimeError(f"Port {port} is already in use")
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "serve_supervisor.py",
+            app,
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"The server exited with code {process.returncode}")
+            try:
+                if requests.get(f"{url}/ready", timeout=1).status_code == 200:
+                    return process, time.perf_counter() - start
+            except requests.RequestException:
+                # e.g. connections aren't accepted while the model loads
+                pass
+            if time.perf_counter() - start > 300:
+                raise RuntimeError("The server wasn't ready after 300s")
+            time.sleep(0.2)
+    except BaseException:
+        stop_server(process)
+        raise
+
+
+def stop_server(process):
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def predict_request(url, payloads, batch_size):
+    """A function sending the i-th /predict request, one row per request."""
+    rows = payloads.to_dict(orient="records")
+
+    def send(session, i):
+        return session.post(f"{url}/predict", json=[rows[i % len(rows)]])
+
+    return send
+
+
+def batch_request(url, payloads, batch_size):
+    """A function sending the i-th /predict_batch request, a CSV of
+    `batch_size` rows."""
+    files = []
+    for start in range(0, len(payloads), batch_size):
+        rows = payloads.iloc[start : start + batch_size]
+        if len(rows) < batch_size:
+            rows = payloads.iloc[:batch_size]
+        buffer = io.StringIO()
+        rows.to_csv(buffer, index=False)
+        files.append(buffer.getvalue().encode())
+
+    def send(session, i):
+        file = ("batch.csv", files[i % len(files)], "text/csv")
+        return session.post(f"{url}/predict_batch", files={"file": file})
+
+    return send
+
+
+ENDPOINTS = {"/predict": predict_request, "/predict_batch": batch_request}
+
+
+def run_scenario(send, concurrency, duration, warmup=1.0):
+    """Send requests from `concurrency` threads, each sending its next request
+    as soon as the previous one returns, for `warmup` + `duration` seconds.
+    Requests started during the warm-up aren't counted.
+
+    Returns:
+        dict: Request and error counts, throughput and latency percentiles.
+    """
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    counter = iter(range(sys.maxsize))
+    measure_from = time.perf_counter() + warmup
+    end = measure_from + duration
+
+    def worker(n):
+        with requests.Session() as session:
+            while True:
+                start = time.perf_counter()
+                if start >= end:
+                    return
+                try:
+                    ok = send(session, next(counter)).status_code == 200
+                except requests.RequestException:
+                    ok = False
+                if start < measure_from:
+                    continue
+                latencies[n].append(time.perf_counter() - start)
+                errors[n] += not ok
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # requests still running at `end` finish after it
+    elapsed = max(time.perf_counter(), end) - measure_from
+
+    latencies = np.concatenate([np.asarray(l, dtype="float64") for l in latencies])
+    n_requests = len(latencies)
+    n_errors = sum(errors)
+    result = {
+        "requests": n_requests,
+        "errors": n_errors,
+        "error_rate": n_errors / n_requests if n_requests else 0.0,
+        "throughput_rps": n_requests / elapsed,
+    }
+    if n_requests:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        result["latency_ms"] = {
+            "mean": float(latencies.mean() * 1000),
+            "p50": float(p50),
+            "p95": float(p95),
+            "p99": float(p99),
+            "max": float(latencies.max() * 1000),
+        }
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load_test(
+    app="fastapi_app:app",
+    url=None,
+    port=8765,
+    workers=1,
+    concurrency=(1, 8),
+    batch_sizes=(100, 1000),
+    endpoints=("/predict", "/predict_batch"),
+    duration=10.0,
+    warmup=1.0,
+):
+    """Load test the app on each endpoint, concurrency and (for /predict_batch)
+    batch size.
+
+    Args:
+        app (str, optional): The app to start, as "module:attribute".
+        url (str, optional): URL of a running server to test instead of
+        starting one. Its memory use isn't measured.
+        port (int, optional): Port to start the app on.
+        workers (int, optional): Worker processes to start the app with.
+        concurrency (tuple, optional): Numbers of concurrent clients.
+        batch_sizes (tuple, optional): Rows per /predict_batch request.
+        endpoints (tuple, optional): Endpoints to test.
+        duration (float, optional): Seconds each scenario is measured for.
+        warmup (float, optional): Seconds of requests before each scenario
+        that aren't measured.
+
+    Returns:
+        dict: The report.
+    """
+    payloads = make_payloads(max(5000, max(batch_sizes)))
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "app": app if url is None else None,
+            "url": url,
+            "workers": workers if url is None else None,
+            "duration": duration,
+            "warmup": warmup,
+            "cpus": os.cpu_count(),
+            "settings": {
+                name: value
+                for name, value in sorted(os.environ.items())
+                if name.startswith(SETTING_PREFIXES)
+            },
+        },
+        "scenarios": [],
+    }
+
+    process = sampler = None
+    if url is None:
+        process, startup = start_server(app, port, workers)
+        report["startup_seconds"] = startup
+        url = f"http://127.0.0.1:{port}"
+        sampler = MemorySampler(process.pid)
+        sampler.start()
+        idle_rss = process_tree_rss(process.pid)
+        if idle_rss is not None:
+            report["idle_rss_mb"] = idle_rss / 2**20
+
+    try:
+        for endpoint in endpoints:
+            sizes = batch_sizes if endpoint == "/predict_batch" else (1,)
+            for batch_size in sizes:
+                send = ENDPOINTS[endpoint](url, payloads, batch_size)
+                for clients in concurrency:
+                    if sampler is not None:
+                        sampler.reset()
+                    result = run_scenario(send, clients, duration, warmup)
+                    result = {
+                        "endpoint": endpoint,
+                        "concurrency": clients,
+                        "batch_size": batch_size,
+                        **result,
+                        "rows_per_second": result["throughput_rps"] * batch_size,
+                    }
+                    if sampler is not None and sampler.peak is not None:
+                        result["peak_rss_mb"] = sampler.peak / 2**20
+                    report["scenarios"].append(result)
+                    print(format_result(result))
+    finally:
+        if process is not None:
+            sampler.stop()
+            stop_server(process)
+
+    peaks = [s["peak_rss_mb"] for s in report["scenarios"] if "peak_rss_mb" in s]
+    if peaks:
+        report["peak_rss_mb"] = max(peaks)
+    return report
+
+
+def format_result(result, baseline=None):
+    """One line summarizing a scenario, with changes from `baseline` if given."""
+    latency = result.get("latency_ms", {})
+    line = (
+        f"{result['endpoint']} x{result['batch_size']} rows, "
+        f"{result['concurrency']} clients: {result['throughput_rps']:.1f} req/s, "
+        f"p50 {latency.get('p50', float('nan')):.1f}ms, "
+        f"p95 {latency.get('p95', float('nan')):.1f}ms, "
+        f"p99 {latency.get('p99', float('nan')):.1f}ms, "
+        f"{result['error_rate']:.1%} errors"
+    )
+    if "peak_rss_mb" in result:
+        line += f", peak RSS {result['peak_rss_mb']:.0f}MB"
+    if baseline is not None:
+        old_latency = baseline.get("latency_ms", {})
+        changes = [
+            ("req/s", result["throughput_rps"], baseline["throughput_rps"]),
+            ("p50", latency.get("p50"), old_latency.get("p50")),
+            ("p99", latency.get("p99"), old_latency.get("p99")),
+        ]
+        line += " | vs baseline: " + ", ".join(
+            f"{name} {(new / old - 1):+.1%}"
+            for name, new, old in changes
+            if new is not None and old
+        )
+    return line
+
+
+def compare_reports(report, baseline):
+    """Print each scenario of `report` with its change from the same scenario
+    (endpoint, batch size and concurrency) in `baseline`."""
+    key = lambda s: (s["endpoint"], s["batch_size"], s["concurrency"])
+    old = {key(s): s for s in baseline["scenarios"]}
+    print(f"Compared to {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for scenario in report["scenarios"]:
+        print(format_result(scenario, old.get(key(scenario))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--app", default="fastapi_app:app", help="App to start")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument(
+        "--endpoints",
+        nargs="+",
+        choices=list(ENDPOINTS),
+        default=list(ENDPOINTS),
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="Seconds per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=1.0, help="Unmeasured seconds per scenario"
+    )
+    parser.add_argument("--output", help="JSON file to write the report to")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        app=args.app,
+        url=args.url,
+        port=args.port,
+        workers=args.workers,
+        concurrency=tuple(args.concurrency),
+        batch_sizes=tuple(args.batch_sizes),
+        endpoints=tuple(args.endpoints),
+        duration=args.duration,
+        warmup=args.warmup,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote the report to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_reports(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import itertools
+import json
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from payload_formats import CSV, media_type
+
+NDJSON = "application/x-ndjson"
+PARQUET = "application/vnd.apache.parquet"
+
+# rows parsed and scored at a time when streaming, which bounds peak memory
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "50000"))
+
+
+def streaming_format(accept):
+    """The streamed response format requested by an Accept header (NDJSON or
+    CSV), or None if the caller wants a single response body."""
+    for part in (accept or "").split(","):
+        requested = media_type(part)
+        if requested in (NDJSON, CSV):
+            return requested
+    return None
+
+
+def is_parquet(content_type, filename):
+    """Whether an uploaded file is Parquet, judging by its content type or name."""
+    return media_type(content_type) == PARQUET or (filename or "").lower().endswith(
+        ".parquet"
+    )
+
+
+def detach_upload(file):
+    """Open a new handle on an uploaded file's contents.
+
+    FastAPI closes uploads as soon as the endpoint returns, which is before a
+    streaming response has been sent. The returned handle shares the upload's
+    temporary file on disk (small uploads are rolled over to disk first) and
+    stays open until it is closed itself.
+
+    Args:
+        file (UploadFile): The uploaded file.
+
+    Returns:
+        file-like: Binary handle positioned at the start of the upload.
+    """
+    handle = os.fdopen(os.dup(file.file.fileno()), "rb")
+    handle.seek(0)
+    return handle
+
+
+def iter_upload_chunks(file, chunk_size=BATCH_CHUNK_SIZE, parquet=False):
+    """Parse an uploaded CSV or Parquet file in DataFrames of at most `chunk_size`
+    rows. The upload is read from its temporary file as it is parsed, so it is
+    never held in memory as a whole.
+
+    Args:
+        file (file-like): Binary handle on the upload, e.g. from
+        `detach_upload()`. It is closed once parsing finishes.
+        chunk_size (int, optional): Rows per chunk.
+        parquet (bool, optional): Whether the file is Parquet rather than CSV.
+
+    Yields:
+        pd.DataFrame: Consecutive chunks of the file.
+    """
+    with file:
+        if parquet:
+            for batch in pq.ParquetFile(file).iter_batches(batch_size=chunk_size):
+                yield batch.to_pandas()
+        else:
+            with pd.read_csv(file, chunksize=chunk_size) as reader:
+                yield from reader
+
+
+def check_first_chunk(chunks, required_columns):
+    """Read the first chunk and check it has every required column before any
+    predictions are streamed back.
+
+    Args:
+        chunks (iterator): Chunks from `iter_upload_chunks()`.
+        required_columns (list): Columns every chunk must have.
+
+    Returns:
+        tuple: Missing columns (empty if there are none) and an iterator over
+        all of the chunks, including the first.
+    """
+    first = next(chunks, None)
+    if first is None:
+        return set(), iter(())
+    missing = set(required_columns) - set(first.columns)
+    return missing, itertools.chain([first], chunks)
+
+
+def stream_predictions(chunks, predict_fn, format):
+    """Score each chunk as it is parsed and yield the encoded predictions.
+
+    Args:
+        chunks (iterator): DataFrames to predict on.
+        predict_fn (callable): Returns one prediction per row of a DataFrame.
+        format (str): `NDJSON` (one `{"prediction": ...}` object per line) or
+        `CSV` (a `prediction` column).
+
+    Yields:
+        bytes: Encoded predictions, one chunk at a time.
+    """
+    if format == CSV:
+        yield b"prediction\n"
+
+    try:
+        for chunk in chunks:
+            predictions = pd.Series(predict_fn(chunk), name="prediction")
+            if format == CSV:
+                yield predictions.to_csv(index=False, header=False).encode("utf-8")
+            else:
+                lines = "".join(
+                    json.dumps({"prediction": value}) + "\n"
+                    for value in predictions.tolist()
+                )
+                yield lines.encode("utf-8")
+    except Exception as e:
+        # the status code has already been sent, so report the error in-band
+        if format == NDJSON:
+            yield (json.dumps({"error": str(e)}) + "\n").encode("utf-8")
+        else:
+            raise
+
+
+def release_after(stream, release):
+    """Yield from `stream`, then call `release` once it is exhausted, fails or is
+    closed early (e.g. because the client disconnected)."""
+    try:
+        yield from stream
+    finally:
+        release()
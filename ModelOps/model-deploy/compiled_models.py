@@ -0,0 +1,439 @@
+"""Compile a registered model into plain NumPy arrays for low-latency serving.
+
+Example:
+    python compiled_models.py models:/apple_demand/5 compiled_models/apple_demand-5
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+META_FILE = "compiled.json"
+
+# Tree ensembles are evaluated this many rows at a time, which keeps the
+# (rows x trees) arrays of each step in the CPU cache
+CHUNK_ROWS = 256
+
+
+def _compile_linear(model):
+    """Coefficients and intercept of a linear model (e.g. Ridge)."""
+    return "linear", {
+        "coef": np.asarray(model.coef_, dtype="float64").ravel(),
+        "intercept": np.atleast_1d(np.asarray(model.intercept_, dtype="float64")),
+    }
+
+
+def _flatten_trees(trees):
+    """Concatenate trees into node arrays. `children` holds the left and right
+    child of each node next to each other, as indices into the concatenated
+    arrays. Leaves are their own children, so evaluation can step every tree the
+    same number of times.
+
+    Args:
+        trees (list): Per tree, a dict of `feature`, `threshold`, `left`,
+        `right`, `missing_left` and `value` arrays with local child indices
+        (-1 at leaves). Rows go left if their feature is <= the threshold.
+    """
+    arrays = {name: [] for name in trees[0]}
+    roots = []
+    depth = 0
+    offset = 0
+    for tree in trees:
+        n_nodes = len(tree["feature"])
+        nodes = np.arange(n_nodes)
+        leaf = tree["left"] < 0
+        for name in ("left", "right"):
+            tree[name] = np.where(leaf, nodes, tree[name]) + offset
+        tree["feature"] = np.where(leaf, 0, tree["feature"])
+        for name, values in tree.items():
+            arrays[name].append(values)
+        roots.append(offset)
+        depth = max(depth, _tree_depth(tree["left"] - offset, tree["right"] - offset))
+        offset += n_nodes
+
+    dtypes = {
+        "feature": "int32",
+        "threshold": "float64",
+        "left": "int32",
+        "right": "int32",
+        "missing_left": "bool",
+        "value": "float64",
+    }
+    flat = {
+        name: np.concatenate(values).astype(dtypes[name])
+        for name, values in arrays.items()
+    }
+    flat["children"] = np.stack([flat.pop("left"), flat.pop("right")], axis=1).ravel()
+    flat["roots"] = np.asarray(roots, dtype="int32")
+    return flat, depth
+
+
+def _tree_depth(left, right):
+    """Number of splits on the longest path from the root to a leaf."""
+    depth = np.zeros(len(left), dtype="int64")
+    # children always come after their parent in both sklearn and XGBoost trees
+    for node in range(len(left)):
+        if left[node] != node:
+            depth[left[node]] = depth[right[node]] = depth[node] + 1
+    return int(depth.max())
+
+
+def _compile_forest(model):
+    """Node arrays of a scikit-learn random forest (or a single decision tree)."""
+    estimators = getattr(model, "estimators_", [model])
+    trees = []
+    for estimator in estimators:
+        tree = estimator.tree_
+        trees.append(
+            {
+                "feature": tree.feature.copy(),
+                "threshold": tree.threshold.copy(),
+                "left": tree.children_left.copy(),
+                "right": tree.children_right.copy(),
+                "missing_left": np.asarray(
+                    getattr(tree, "missing_go_to_left", np.zeros(tree.node_count))
+                ).astype(bool),
+                "value": tree.value[:, 0, 0].copy(),
+            }
+        )
+    arrays, depth = _flatten_trees(trees)
+    return "forest", {**arrays, "depth": np.asarray([depth])}
+
+
+def _compile_xgboost(model, feature_names):
+    """Node arrays of an XGBoost regressor with an identity link."""
+    booster = model.get_booster()
+    config = json.loads(booster.save_config())
+    objective = config["learner"]["objective"]["name"]
+    if objective not in ("reg:squarederror", "reg:absoluteerror"):
+        raise ValueError(f"Can't compile XGBoost objective {objective!r}")
+    base_score = float(config["learner"]["learner_model_param"]["base_score"])
+
+    nodes = booster.trees_to_dataframe()
+    names = list(booster.feature_names or feature_names)
+    trees = []
+    for _, tree in nodes.groupby("Tree", sort=True):
+        tree = tree.sort_values("Node")
+        index = {node_id: i for i, node_id in enumerate(tree["ID"])}
+        leaf = (tree["Feature"] == "Leaf").to_numpy()
+        split = tree["Split"].to_numpy(dtype="float32")
+        feature = tree["Feature"].map({name: i for i, name in enumerate(names)})
+        trees.append(
+            {
+                "feature": np.where(leaf, 0, feature.fillna(0)),
+                # XGBoost goes left if x < split, on float32 values, which is
+                # x <= the next float32 down
+                "threshold": np.nextafter(split, np.float32(-np.inf)),
+                "left": np.where(leaf, -1, tree["Yes"].map(index.get).fillna(-1)),
+                "right": np.where(leaf, -1, tree["No"].map(index.get).fillna(-1)),
+                "missing_left": (tree["Missing"] == tree["Yes"]).to_numpy(),
+                "value": np.where(leaf, tree["Gain"], 0.0),
+            }
+        )
+    for tree in trees:
+        for name in ("left", "right"):
+            tree[name] = np.asarray(tree[name], dtype="int64")
+    arrays, depth = _flatten_trees(trees)
+    return "boosted", {
+        **arrays,
+        "depth": np.asarray([depth]),
+        "base_score": np.asarray([base_score]),
+    }
+
+
+def compile_model(model, feature_names=None):
+    """Compile a fitted model into arrays.
+
+    Supports linear models with `coef_` and `intercept_` (e.g. Ridge), scikit-learn
+    random forests and decision trees, and XGBoost regressors.
+
+    Args:
+        model: The fitted model, e.g. from `mlflow.sklearn.load_model()`.
+        feature_names (list, optional): Feature columns, in the order the model
+        expects them. Defaults to the names the model was fitted with.
+
+    Returns:
+        CompiledModel: The compiled model.
+    """
+    if feature_names is None and getattr(model, "feature_names_in_", None) is not None:
+        feature_names = list(model.feature_names_in_)
+
+    if hasattr(model, "get_booster"):
+        kind, arrays = _compile_xgboost(model, feature_names)
+    elif hasattr(model, "estimators_") or hasattr(model, "tree_"):
+        kind, arrays = _compile_forest(model)
+    elif hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        kind, arrays = _compile_linear(model)
+    else:
+        raise ValueError(f"Can't compile a {type(model).__name__}")
+
+    return CompiledModel(
+        kind, arrays, feature_names, {"model_class": type(model).__name__}
+    )
+
+
+class CompiledModel:
+    """A model compiled to NumPy arrays, with a vectorized `predict()`.
+
+    Linear models are a matrix-vector product. Tree ensembles are evaluated for
+    all rows and trees at once: every step moves each (row, tree) pair from its
+    current node to a child, for as many steps as the deepest tree, and the
+    leaf values are then averaged (random forests) or summed (boosting).
+
+    Saved models are a directory of `.npy` files, which `load()` memory-maps, so
+    worker processes share the arrays through the page cache.
+
+    Args:
+        kind (str): "linear", "forest" or "boosted".
+        arrays (dict): The model's arrays.
+        feature_names (list): Feature columns in the model's order, or None to
+        use a DataFrame's columns as they are.
+        info (dict, optional): Extra details saved with the model, e.g. its
+        URI and version.
+    """
+
+    def __init__(self, kind, arrays, feature_names=None, info=None):
+        self.kind = kind
+        self.arrays = arrays
+        self.feature_names = feature_names
+        self.info = info or {}
+        # directory the model was loaded from, if any
+        self.path = None
+
+    def _features(self, data):
+        """Feature matrix of a DataFrame (or array) in the model's column order."""
+        if isinstance(data, pd.DataFrame) and self.feature_names is not None:
+            data = data[self.feature_names]
+        dtype = "float64" if self.kind == "linear" else "float32"
+        return np.asarray(data, dtype=dtype)
+
+    def predict(self, data):
+        """Predict on a DataFrame or 2D array of features.
+
+        Returns:
+            np.ndarray: One prediction per row.
+        """
+        X = self._features(data)
+        a = self.arrays
+        if self.kind == "linear":
+            return X @ a["coef"] + a["intercept"][0]
+        if not len(X):
+            return np.empty(0)
+
+        return np.concatenate(
+            [
+                self._predict_trees(X[start : start + CHUNK_ROWS])
+                for start in range(0, len(X), CHUNK_ROWS)
+            ]
+        )
+
+    def _predict_trees(self, X):
+        a = self.arrays
+        n_rows, n_features = X.shape
+        values = X.ravel()
+        offsets = (np.arange(n_rows, dtype="int32") * n_features)[:, None]
+        has_missing = np.isnan(values).any()
+
+        # the node each (row, tree) pair is at, starting from the roots
+        node = np.broadcast_to(a["roots"], (n_rows, len(a["roots"])))
+        for _ in range(int(a["depth"][0])):
+            x = values[offsets + a["feature"][node]]
+            go_right = x > a["threshold"][node]
+            if has_missing:
+                go_right |= np.isnan(x) & ~a["missing_left"][node]
+            node = a["children"][2 * node + go_right]
+
+        leaves = a["value"][node]
+        if self.kind == "forest":
+            return leaves.mean(axis=1)
+        return leaves.sum(axis=1) + a["base_score"][0]
+
+    def save(self, path):
+        """Save the arrays and metadata to a directory, replacing it if it
+        exists."""
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, values in self.arrays.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+        with open(os.path.join(tmp_path, META_FILE), "w") as f:
+            json.dump(
+                {
+                    "kind": self.kind,
+                    "feature_names": self.feature_names,
+                    "arrays": list(self.arrays),
+                    **self.info,
+                },
+                f,
+                indent=2,
+            )
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a saved model, memory-mapping its arrays unless `mmap` is False."""
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        # plain arrays over the mapped memory, as np.memmap slows down indexing
+        arrays = {
+            name: np.asarray(
+                np.load(
+                    os.path.join(path, f"{name}.npy"), mmap_mode="r" if mmap else None
+                )
+            )
+            for name in meta.pop("arrays")
+        }
+        model = cls(meta.pop("kind"), arrays, meta.pop("feature_names"), meta)
+        model.path = path
+        return model
+
+
+def load_raw_model(model_uri):
+    """Load the fitted model behind a registered MLflow model, through its
+    scikit-learn or XGBoost flavor."""
+    import mlflow
+    from mlflow.models import get_model_info
+
+    flavors = get_model_info(model_uri).flavors
+    if "xgboost" in flavors:
+        import mlflow.xgboost
+
+        return mlflow.xgboost.load_model(model_uri)
+    if "sklearn" in flavors:
+        import mlflow.sklearn
+
+        return mlflow.sklearn.load_model(model_uri)
+    raise ValueError(f"{model_uri} has no scikit-learn or XGBoost flavor")
+
+
+def export_model(model_uri, path, feature_names=None):
+    """Compile a registered model and save it to `path`.
+
+    Returns:
+        CompiledModel: The compiled model.
+    """
+    compiled = compile_model(load_raw_model(model_uri), feature_names)
+    compiled.info["model_uri"] = model_uri
+    compiled.save(path)
+    return compiled
+
+
+def check_parity(compiled, pyfunc_model, data, rtol=None):
+    """Compare the compiled model's predictions with the pyfunc model's.
+
+    Args:
+        rtol (float, optional): Relative tolerance. Defaults to 1e-9, or 1e-5
+        for XGBoost models, which add up their trees in float32.
+
+    Returns:
+        float: The largest absolute difference.
+
+    Raises:
+        AssertionError: If the predictions differ by more than `rtol`.
+    """
+    if rtol is None:
+        rtol = 1e-5 if compiled.kind == "boosted" else 1e-9
+    expected = np.asarray(pyfunc_model.predict(data), dtype="float64")
+    actual = compiled.predict(data)
+    np.testing.assert_allclose(actual, expected, rtol=rtol)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def compiled_model_from_env(loader, check_data):
+    """Compiled version of a loaded model, if enabled through environment
+    variables:
+
+    - `COMPILED_MODEL_DIR`: directory of compiled models. A version is compiled
+      into `{name}-{version}` there the first time it is served, and
+      memory-mapped from it afterwards. Disabled if unset.
+
+    The compiled model is checked against the loaded one on `check_data`. If it
+    can't be compiled (e.g. an unsupported model type) or doesn't match, None is
+    returned and the loaded model should be used.
+
+    Args:
+        loader (ModelLoader): Loader of the model, after `load()`.
+        check_data (pd.DataFrame): Rows to check parity on.
+
+    Returns:
+        CompiledModel: The compiled model, or None.
+    """
+    model_dir = os.getenv("COMPILED_MODEL_DIR")
+    if not model_dir:
+        return None
+
+    from model_loader import _parse_model_uri
+
+    name, _, _ = _parse_model_uri(loader.model_uri)
+    path = os.path.join(model_dir, f"{name}-{loader.version}")
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(model_dir, exist_ok=True)
+            export_model(loader.path, path)
+        compiled = CompiledModel.load(path)
+        check_parity(compiled, loader.model, check_data)
+    except Exception as e:
+        print(f"Not compiling version {loader.version}, serving it with MLflow: {e}")
+        return None
+    return compiled
+
+
+def benchmark(predict, data, repeat=50):
+    """Median seconds per `predict(data)` call."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(data)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("model_uri", help="Registered model to compile")
+    parser.add_argument("path", help="Directory to save the compiled model to")
+    parser.add_argument(
+        "--data",
+        help="CSV of feature rows to check parity and benchmark on "
+        "(defaults to the model run's training data)",
+    )
+    args = parser.parse_args()
+
+    import mlflow.pyfunc
+    from mlflow.models import get_model_info
+
+    compiled = export_model(args.model_uri, args.path)
+    print(f"Saved a {compiled.kind} model to {args.path}")
+
+    data_path = args.data or os.path.join(
+        "training_data", f"{get_model_info(args.model_uri).run_id}-training_data.csv"
+    )
+    data = pd.read_csv(data_path)
+    if compiled.feature_names is not None:
+        data = data[compiled.feature_names]
+    else:
+        data = data.drop(columns=["date", "demand"], errors="ignore")
+
+    # pyfunc enforces the signature's column types
+    pyfunc_model = mlflow.pyfunc.load_model(args.model_uri)
+    compiled = CompiledModel.load(args.path)
+    max_diff = check_parity(compiled, pyfunc_model, data)
+    print(f"Parity on {len(data)} rows: max abs difference {max_diff:.3g}")
+
+    batch = data.sample(10000, replace=True, random_state=0).reset_index(drop=True)
+    for name, rows in (("1 row", data.head(1)), ("10k rows", batch)):
+        pyfunc_s = benchmark(pyfunc_model.predict, rows)
+        compiled_s = benchmark(compiled.predict, rows)
+        print(
+            f"{name}: pyfunc {pyfunc_s * 1000:.2f}ms, compiled "
+            f"{compiled_s * 1000:.2f}ms ({pyfunc_s / compiled_s:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
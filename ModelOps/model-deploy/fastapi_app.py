@@ -1,28 +1,193 @@
+import asyncio
 import io
 import os
+import threading
+import traceback
+from contextlib import asynccontextmanager
 from typing import List
 
-import mlflow.pyfunc
 import pandas as pd
-from fastapi import FastAPI, File, HTTPException, UploadFile
-from pydantic import BaseModel
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
-# Initialize FastAPI app
-app = FastAPI()
+from batch_streaming import (
+    BATCH_CHUNK_SIZE,
+    check_first_chunk,
+    detach_upload,
+    is_parquet,
+    iter_upload_chunks,
+    release_after,
+    stream_predictions,
+    streaming_format,
+)
+from compiled_models import compiled_model_from_env
+from inference_executor import executor_from_env
+from micro_batching import micro_batcher_from_env
+from model_loader import model_loader_from_env
+from model_manager import ModelNotFound, model_manager_from_env
+from model_watcher import model_watcher_from_env
+from payload_formats import (
+    CSV,
+    PayloadError,
+    UnsupportedFormat,
+    encode_predictions,
+    is_json_rows,
+    media_type,
+    read_frame,
+)
+from prediction_cache import prediction_cache_from_env
 
 # Retrieve MLflow tracking URI from environment variable
 mlflow_tracking_uri = os.getenv(
     "MLFLOW_TRACKING_URI", "file:///app/mlflow_registry/mlruns"
 )
-mlflow.set_tracking_uri(mlflow_tracking_uri)
 
-# Set MLflow experiment name
-mlflow_experiment = os.getenv("MLFLOW_EXPERIMENT_NAME", "Forecasting Apple Demand")
-mlflow.set_experiment(mlflow_experiment)
-
-# Load the trained model from MLflow
+# The trained model to serve from MLflow
 MODEL_URI = "models:/apple_demand@champion"  # Replace with your model name and alias
-model = mlflow.pyfunc.load_model(MODEL_URI)
+
+# The model is loaded in the background once the server is up (see lifespan()),
+# so the app imports quickly and /ready reports when it can take predictions.
+# Set MODEL_CACHE_DIR to keep a local copy of the resolved model, so restarts
+# load it without going through the registry (see model_loader.py).
+loader = model_loader_from_env(MODEL_URI, tracking_uri=mlflow_tracking_uri)
+model = None
+
+# Optionally coalesce concurrent /predict requests into a single model.predict
+# call on the predict executor, subject to its queue limit and timeout (enable
+# with MICRO_BATCHING=1, see micro_batching.py)
+batcher = None
+
+# Parsing and predicting run on bounded worker pools rather than the event loop.
+# Requests beyond a pool's workers and queue get a 429 with Retry-After, and
+# calls that take too long a 504 (configure with PREDICT_* and BATCH_*
+# variables, see inference_executor.py). Batches get their own, smaller pool so
+# large files don't hold up /predict.
+predict_executor = None
+batch_executor = None
+
+# Other versions of the model, e.g. a challenger, are served from
+# /predict/{alias_or_version} out of a bounded LRU cache of loaded models
+# (configure with MODEL_CACHE_* variables, see model_manager.py). Loading and
+# predicting run on their own bounded pool, with the same 429 and 504 rules as
+# /predict (configure with VERSION_* variables).
+version_executor = executor_from_env(
+    "VERSION", None, max_workers=2, max_queue=16, timeout=60.0
+)
+manager = model_manager_from_env("apple_demand", tracking_uri=mlflow_tracking_uri)
+
+# When the alias moves to a new version, a background thread loads and warms it
+# up, then swaps it in (set MODEL_WATCH_INTERVAL, see model_watcher.py)
+watcher = None
+
+# Why the loaded model couldn't be served at startup, if it couldn't (e.g. its
+# warm-up failed), reported by /ready
+serve_error = None
+
+
+def serve(new_loader):
+    """Start serving a loaded model, replacing the one being served (if any).
+
+    The new model's batcher and executors are set up and warmed up first, so it
+    only takes requests once it is ready. Requests already running finish on
+    the old model, whose batcher and executors are then shut down.
+    """
+    global loader, model, batcher, predict_executor, batch_executor
+    new_model = new_loader.model
+    # /predict can use a compiled copy of the model, which is much faster on
+    # small requests (set COMPILED_MODEL_DIR, see compiled_models.py). Batches
+    # are faster with the MLflow model.
+    compiled = compiled_model_from_env(new_loader, WARMUP_ROWS)
+    fast_model = compiled if compiled is not None else new_model
+    new_predict_executor = executor_from_env(
+        "PREDICT",
+        fast_model,
+        new_loader.path,
+        # process pool workers load the compiled copy too
+        compiled_path=compiled.path if compiled is not None else None,
+    )
+    new_batch_executor = executor_from_env(
+        "BATCH", new_model, new_loader.path, max_workers=1, max_queue=4, timeout=300.0
+    )
+    try:
+        new_predict_executor.warm_up(WARMUP_ROWS)
+        new_batch_executor.warm_up(WARMUP_ROWS)
+    except Exception:
+        new_predict_executor.close()
+        new_batch_executor.close()
+        raise
+
+    old = [batcher, predict_executor, batch_executor]
+    batcher = micro_batcher_from_env(new_predict_executor)
+    predict_executor = new_predict_executor
+    batch_executor = new_batch_executor
+    loader = new_loader
+    # set last, as the app is ready to predict once the model is set
+    model = new_model
+    if prediction_cache is not None:
+        prediction_cache.clear()
+
+    # give requests that picked up the old ones a moment to hand them their work
+    threading.Timer(1.0, close_all, old).start()
+
+
+def close_all(*retired):
+    """Close a replaced batcher and executors."""
+    for item in retired:
+        if item is not None:
+            item.close()
+
+
+def load_model():
+    """Load the model, start serving it and watch for new versions."""
+    global watcher, serve_error
+    try:
+        loader.load()
+        serve(loader)
+        serve_error = None
+        print(loader.summary())
+    except Exception as e:
+        # the watcher tries again at its next check
+        traceback.print_exc()
+        if loader.model is not None:
+            serve_error = str(e)
+
+    watcher = model_watcher_from_env(
+        MODEL_URI,
+        serve,
+        version=loader.version if model is not None else None,
+        warmup_data=WARMUP_ROWS,
+        tracking_uri=mlflow_tracking_uri,
+    )
+    if watcher is not None:
+        watcher.start()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the model without holding up startup
+    loading = asyncio.create_task(run_in_threadpool(load_model))
+    yield
+    loading.cancel()
+    if watcher is not None:
+        watcher.stop()
+    manager.close()
+
+
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
+
+
+def require_model():
+    """Reject requests with a 503 until the model is loaded."""
+    if model is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is not loaded yet",
+            headers={"Retry-After": "1"},
+        )
 
 
 # Define the expected input schema for a single prediction
@@ -36,48 +201,280 @@ class InputData(BaseModel):
     previous_days_demand: float
 
 
-@app.post("/predict")
-def predict_single(input_data: List[InputData]):
-    """Endpoint for real-time predictions with a single input."""
+# A typical request, which new versions of the model are warmed up on before
+# they take requests
+WARMUP_ROWS = pd.DataFrame(
+    [
+        InputData(
+            average_temperature=22.0,
+            rainfall=5.0,
+            weekend=0,
+            holiday=0,
+            price_per_kg=1.8,
+            promo=0,
+            previous_days_demand=1100.0,
+        ).dict()
+    ]
+    * 8
+)
+
+
+# Validates the original row-oriented JSON payloads
+INPUT_ROWS = TypeAdapter(List[InputData])
+
+# Model features and their dtypes, used to read columnar payloads (columnar
+# JSON, Arrow IPC streams and raw float64 values, see payload_formats.py)
+FEATURE_DTYPES = {
+    "average_temperature": "float64",
+    "rainfall": "float64",
+    "weekend": "int64",
+    "holiday": "int64",
+    "price_per_kg": "float64",
+    "promo": "int64",
+    "previous_days_demand": "float64",
+}
+
+# Optionally cache the predictions of repeated feature vectors (enable with
+# PREDICTION_CACHE_SIZE, see prediction_cache.py)
+prediction_cache = prediction_cache_from_env(FEATURE_DTYPES)
+
+
+def payload_error(e):
+    """HTTP error for a payload that can't be read."""
+    status_code = 415 if isinstance(e, UnsupportedFormat) else 400
+    return HTTPException(status_code=status_code, detail=str(e))
+
+
+def read_batch_upload(contents, content_type, filename, required_features):
+    """Parse a whole uploaded batch file into a DataFrame and check its columns.
+
+    Runs on the batch executor's pool, so it only takes picklable arguments.
+    """
+    if is_parquet(content_type, filename):
+        # Read the uploaded Parquet file
+        df = pd.read_parquet(io.BytesIO(contents))
+    elif media_type(content_type) in (CSV, "", "application/octet-stream"):
+        # Read the uploaded CSV file
+        df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
+    else:
+        df = read_frame(contents, content_type, FEATURE_DTYPES)
+        # columnar payloads only need the model's features
+        required_features = list(FEATURE_DTYPES)
+
+    missing_cols = set(required_features) - set(df.columns)
+    if missing_cols:
+        raise PayloadError(f"Missing columns: {missing_cols}")
+    return df
+
+
+async def read_predict_request(request):
+    """Read a /predict request body into a DataFrame, according to its
+    Content-Type."""
+    body = await request.body()
+    content_type = request.headers.get("content-type")
 
     # Convert input to DataFrame
-    df = pd.DataFrame([data.dict() for data in input_data])
+    try:
+        if is_json_rows(body, content_type):
+            input_data = INPUT_ROWS.validate_json(body)
+            return pd.DataFrame([data.dict() for data in input_data])
+        return read_frame(body, content_type, FEATURE_DTYPES)
+    except ValidationError as e:
+        # report errors against the request body, like FastAPI does
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()]
+        )
+    except PayloadError as e:
+        raise payload_error(e)
+
+
+async def predict_rows(df):
+    """Predict with the served model, through the micro-batcher if enabled."""
+    if batcher is not None:
+        return await batcher.predict(df)
+    return await predict_executor.predict(df)
+
+
+@app.post("/predict")
+async def predict_single(request: Request):
+    """Endpoint for real-time predictions.
+
+    Accepts a JSON list of `InputData` rows, or columnar JSON, an Arrow IPC stream
+    or raw float64 values according to the Content-Type header. Predictions are
+    returned as JSON unless the Accept header asks for Arrow or raw float64.
+    """
+    require_model()
+    df = await read_predict_request(request)
 
     try:
-        # Make predictions
-        predictions = model.predict(df)
+        # Make predictions, reusing cached ones for repeated rows
+        if prediction_cache is not None:
+            predictions = await prediction_cache.predict(
+                loader.version, df, predict_rows
+            )
+        else:
+            predictions = await predict_rows(df)
 
-        return {"predictions": predictions.tolist()}
+        content, response_type = encode_predictions(
+            predictions, request.headers.get("accept")
+        )
+        return Response(content=content, media_type=response_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/predict/{alias_or_version}")
+async def predict_version(alias_or_version: str, request: Request):
+    """Endpoint for real-time predictions from a given version or alias of the
+    model, e.g. /predict/4 or /predict/challenger.
+
+    Takes the same payloads as /predict. The version is loaded on its first
+    request and then kept in the model cache (see /models).
+    """
+    df = await read_predict_request(request)
+
+    try:
+        version = await run_in_threadpool(manager.resolve, alias_or_version)
+
+        async def predict(df):
+            # includes loading the version on its first request
+            return await version_executor.run(
+                lambda: manager.get(version).predict(df)
+            )
+
+        if prediction_cache is not None:
+            predictions = await prediction_cache.predict(version, df, predict)
+        else:
+            predictions = await predict(df)
+        content, response_type = encode_predictions(
+            predictions, request.headers.get("accept")
+        )
+        return Response(content=content, media_type=response_type)
+    except ModelNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/predict_batch")
-async def predict_batch(file: UploadFile = File(...)):
-    """Endpoint for batch predictions using a CSV file."""
+async def predict_batch(request: Request, file: UploadFile = File(...)):
+    """Endpoint for batch predictions using a CSV file.
+
+    The file can also be Parquet, columnar JSON, an Arrow IPC stream or raw
+    float64 values, declared by its content type. Predictions are returned as JSON
+    unless the Accept header asks for Arrow or raw float64.
+
+    With `Accept: application/x-ndjson` or `Accept: text/csv`, a CSV or Parquet
+    file is instead parsed and scored `BATCH_CHUNK_SIZE` rows at a time and the
+    predictions are streamed back as they are produced, so memory use doesn't
+    grow with the size of the file.
+    """
+    require_model()
+
+    # Validate required columns
+    required_features = [
+        "average_temperature",
+        "rainfall",
+        "weekend",
+        "holiday",
+        "price_per_kg",
+        "promo",
+        "previous_days_demand",
+    ]
+
     try:
-        # Read the uploaded CSV file
-        contents = await file.read()
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
+        stream_format = streaming_format(request.headers.get("accept"))
+        if stream_format is not None:
+            # A stream holds a batch slot until it finishes (it isn't subject
+            # to the timeout, and is always scored in a thread)
+            release = batch_executor.reserve()
+            try:
+                # Check the columns of the first chunk before streaming any
+                # predictions
+                chunks = iter_upload_chunks(
+                    detach_upload(file),
+                    BATCH_CHUNK_SIZE,
+                    parquet=is_parquet(file.content_type, file.filename),
+                )
+                missing_cols, chunks = await run_in_threadpool(
+                    check_first_chunk, chunks, required_features
+                )
+                if missing_cols:
+                    raise HTTPException(
+                        status_code=400, detail=f"Missing columns: {missing_cols}"
+                    )
+            except BaseException:
+                release()
+                raise
+            return StreamingResponse(
+                release_after(
+                    stream_predictions(chunks, model.predict, stream_format), release
+                ),
+                media_type=stream_format,
+            )
 
-        # Validate required columns
-        required_features = [
-            "average_temperature",
-            "rainfall",
-            "weekend",
-            "holiday",
-            "price_per_kg",
-            "promo",
-            "previous_days_demand",
-        ]
-        if not all(feature in df.columns for feature in required_features):
-            missing_cols = set(required_features) - set(df.columns)
-            raise HTTPException(
-                status_code=400, detail=f"Missing columns: {missing_cols}"
+        # Parse the file and make batch predictions off the event loop
+        contents = await file.read()
+        try:
+            df = await batch_executor.run(
+                read_batch_upload,
+                contents,
+                file.content_type,
+                file.filename,
+                required_features,
+            )
+        except PayloadError as e:
+            raise payload_error(e)
+        if prediction_cache is not None:
+            predictions = await prediction_cache.predict(
+                loader.version, df, batch_executor.predict
             )
+        else:
+            predictions = await batch_executor.predict(df)
 
-        # Make batch predictions
-        predictions = model.predict(df)
-        return {"predictions": predictions.tolist()}
+        content, response_type = encode_predictions(
+            predictions, request.headers.get("accept")
+        )
+        return Response(content=content, media_type=response_type)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/prediction_cache")
+def prediction_cache_stats():
+    """Hit rate and size of the prediction cache."""
+    if prediction_cache is None:
+        raise HTTPException(status_code=503, detail="Prediction cache is disabled")
+    return prediction_cache.stats()
+
+
+@app.get("/models")
+def models():
+    """Model versions loaded for /predict/{alias_or_version}, with the cache's
+    hit, miss and eviction counts."""
+    return manager.stats()
+
+
+@app.get("/ready")
+def ready():
+    """Readiness check: 200 once the model is served, 503 until then. Includes the
+    model version and how long each step of loading it took.
+
+    The model can be loaded before it is served (e.g. by serve_supervisor.py),
+    so readiness is whether predictions are being taken, not whether the model
+    is loaded.
+    """
+    status = loader.status()
+    status["ready"] = model is not None
+    status["serve_error"] = serve_error if model is None else None
+    if watcher is not None:
+        status["watcher"] = watcher.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
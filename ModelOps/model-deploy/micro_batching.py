@@ -0,0 +1,219 @@
+import asyncio
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from inference_executor import InferenceTimeout
+
+# queued by close() to stop the batcher's background task
+_STOP = object()
+
+
+def predict_frames(predict_fn, frames):
+    """Predict on the combined frames and split the predictions per request.
+    If the combined call fails, each request is predicted on its own so that
+    one bad request doesn't fail the others.
+
+    Returns:
+        list: Per frame, its predictions or the exception predicting raised.
+    """
+    try:
+        predictions = np.asarray(predict_fn(pd.concat(frames, ignore_index=True)))
+        return np.split(predictions, np.cumsum([len(df) for df in frames])[:-1])
+    except Exception as e:
+        if len(frames) == 1:
+            return [e]
+
+    results = []
+    for df in frames:
+        try:
+            results.append(np.asarray(predict_fn(df)))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class MicroBatcher:
+    """Coalesce concurrent prediction requests into a single model call.
+
+    Each request's rows are queued and a background task combines everything
+    waiting into one DataFrame, predicts on it on the executor's pool and
+    scatters the predictions back to each caller. While one batch is being
+    predicted, new requests queue up and form the next batch, so batches grow
+    with load.
+
+    Waiting is adaptive: a request that arrives when the previous batch held a
+    single request (i.e. low traffic) is dispatched straight away, so latency at
+    low QPS is unchanged. Only once requests are actually being coalesced does
+    the batcher wait up to `max_wait_ms` for more to arrive.
+
+    Requests go through the executor's admission control: each one holds a
+    slot until its batch has been predicted, so once the executor's workers and
+    queue are full further requests get a 429, and callers whose predictions
+    take longer than the executor's timeout get a 504.
+
+    Args:
+        executor (InferenceExecutor): Executor to predict on with its
+        `predict_fn` (see inference_executor.py).
+        max_batch_size (int, optional): Maximum rows per `predict_fn` call. A
+        single request larger than this is predicted on its own. Defaults to 256.
+        max_wait_ms (float, optional): Maximum milliseconds to wait for more
+        requests once batching kicks in. Defaults to 5.
+
+    Example:
+        >>> batcher = MicroBatcher(predict_executor, max_batch_size=256, max_wait_ms=5)
+        >>> predictions = await batcher.predict(df)
+    """
+
+    def __init__(self, executor, max_batch_size=256, max_wait_ms=5.0):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.requests = 0
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self._carry = deque()
+        self._coalescing = False
+
+    async def predict(self, df):
+        """Queue the rows of one request and wait for their predictions.
+
+        Args:
+            df (pd.DataFrame): Rows to predict on.
+
+        Returns:
+            np.ndarray: One prediction per row of `df`.
+
+        Raises:
+            ExecutorBusy: If the executor is full.
+            InferenceTimeout: If the predictions aren't ready within the
+            executor's timeout.
+        """
+        # the queue and worker belong to the server's event loop, so they are
+        # created on first use rather than at import time
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+            self._loop = asyncio.get_running_loop()
+
+        release = self.executor.reserve()
+        future = asyncio.get_running_loop().create_future()
+        # the slot is only freed once the request's batch has been predicted
+        future.add_done_callback(lambda _: release())
+        await self._queue.put((df, future))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.executor.timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout(self.executor.timeout)
+
+    def _next_request(self):
+        """The next queued request without waiting, or None if there isn't one."""
+        if self._carry:
+            return self._carry.popleft()
+        try:
+            return self._queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def _fill(self, batch, n_rows):
+        """Add queued requests to the batch until it is full or the queue is
+        empty. Returns the number of rows in the batch."""
+        while n_rows < self.max_batch_size:
+            request = self._next_request()
+            if request is None:
+                break
+            if request is _STOP:
+                self._carry.appendleft(request)
+                break
+            if n_rows + len(request[0]) > self.max_batch_size:
+                # leave it for the next batch
+                self._carry.appendleft(request)
+                break
+            batch.append(request)
+            n_rows += len(request[0])
+        return n_rows
+
+    async def _collect(self):
+        """Wait for the next batch of requests."""
+        first = self._carry.popleft() if self._carry else await self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        n_rows = self._fill(batch, len(first[0]))
+
+        if self._coalescing and n_rows < self.max_batch_size:
+            await asyncio.sleep(self.max_wait)
+            self._fill(batch, n_rows)
+
+        self._coalescing = len(batch) > 1
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if batch is None:
+                return
+            frames = [df for df, _ in batch]
+            try:
+                results = await asyncio.wrap_future(
+                    self.executor.submit(
+                        predict_frames, self.executor.predict_fn, frames
+                    )
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+
+            self.batches += 1
+            self.requests += len(batch)
+            for (_, future), result in zip(batch, results):
+                # the caller may have gone away (e.g. client disconnected)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def close(self):
+        """Stop the background task once the requests already queued have been
+        predicted. Safe to call from any thread."""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, _STOP)
+
+    def stats(self):
+        """Number of batches and requests predicted so far."""
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_requests_per_batch": (
+                self.requests / self.batches if self.batches else 0.0
+            ),
+        }
+
+
+def micro_batcher_from_env(executor):
+    """Create a `MicroBatcher` if it is enabled through environment variables.
+
+    - `MICRO_BATCHING`: set to "1" or "true" to enable micro-batching.
+    - `MICRO_BATCH_MAX_SIZE`: maximum rows per batch (defaults to 256).
+    - `MICRO_BATCH_MAX_WAIT_MS`: maximum milliseconds to wait for a batch to
+      fill (defaults to 5).
+
+    Args:
+        executor (InferenceExecutor): Executor to predict on.
+
+    Returns:
+        MicroBatcher: The batcher, or None if micro-batching is disabled.
+    """
+    if os.getenv("MICRO_BATCHING", "").lower() not in ("1", "true"):
+        return None
+
+    return MicroBatcher(
+        executor,
+        max_batch_size=int(os.getenv("MICRO_BATCH_MAX_SIZE", "256")),
+        max_wait_ms=float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5")),
+    )
@@ -0,0 +1,248 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Updates of resolved.json read, change and rewrite the whole index, so they
+# take turns: threads through this lock and processes (e.g. workers sharing a
+# cache directory) through a lock file, where the platform supports it.
+_cache_index_lock = threading.Lock()
+
+
+def _parse_model_uri(model_uri):
+    """Split `models:/name@alias` or `models:/name/version` into its parts.
+
+    Returns:
+        tuple: Model name, alias and version (one of which is None).
+    """
+    if not model_uri.startswith("models:/"):
+        raise ValueError(f"Expected a models:/ URI, got {model_uri!r}")
+    path = model_uri[len("models:/") :]
+    if "@" in path:
+        name, alias = path.split("@", 1)
+        return name, alias, None
+    name, version = path.rsplit("/", 1)
+    return name, None, version
+
+
+class ModelLoader:
+    """Load a registered MLflow model, recording how long each step takes.
+
+    With a `cache_dir`, the model the URI resolved to is downloaded there and the
+    resolution (name, version, run ID and local path) is saved in
+    `resolved.json`. Later loads, e.g. after a container or worker restart, load
+    straight from the local copy without contacting the registry at all, so
+    they are fast and work even if the registry is slow or down. Delete the
+    cache directory (or the URI's entry in `resolved.json`) to pick up a new
+    version of the model, or let a `ModelWatcher` update it (see
+    model_watcher.py).
+
+    Args:
+        model_uri (str): Registered model URI, e.g. "models:/apple_demand@champion".
+        cache_dir (str, optional): Directory of the resolved-model cache. No
+        caching if None.
+        tracking_uri (str, optional): MLflow tracking URI to set before loading.
+
+    Example:
+        >>> loader = ModelLoader("models:/apple_demand@champion", "model_cache")
+        >>> model = loader.load()
+        >>> loader.timings
+        {'import_mlflow': 1.31, 'resolve': 0.001, 'load_model': 0.42}
+    """
+
+    def __init__(self, model_uri, cache_dir=None, tracking_uri=None):
+        self.model_uri = model_uri
+        self.cache_dir = cache_dir
+        self.tracking_uri = tracking_uri
+        self.model = None
+        self.version = None
+        self.run_id = None
+        self.path = None
+        self.from_cache = False
+        self.timings = {}
+        self.error = None
+
+    @property
+    def ready(self):
+        """Whether the model has been loaded."""
+        return self.model is not None
+
+    def _cache_index_path(self):
+        return os.path.join(self.cache_dir, "resolved.json")
+
+    def _read_cache_index(self):
+        try:
+            with open(self._cache_index_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _resolve(self, mlflow):
+        """Find the model version the URI points to, from the cache if possible.
+
+        Returns:
+            dict: The version, run ID and the path or URI to load the model from.
+        """
+        if self.cache_dir is not None:
+            cached = self._read_cache_index().get(self.model_uri)
+            if cached is not None and os.path.isdir(cached["path"]):
+                self.from_cache = True
+                return cached
+
+        name, alias, version = _parse_model_uri(self.model_uri)
+        client = mlflow.MlflowClient()
+        if alias is not None:
+            model_version = client.get_model_version_by_alias(name, alias)
+        else:
+            model_version = client.get_model_version(name, version)
+        resolved = {
+            "name": name,
+            "version": model_version.version,
+            "run_id": model_version.run_id,
+            "path": f"models:/{name}/{model_version.version}",
+        }
+        if self.cache_dir is None:
+            return resolved
+
+        # Download the version and remember where it is for next time
+        local_path = os.path.join(self.cache_dir, name, str(model_version.version))
+        if not os.path.isdir(local_path):
+            # download next to it first, so a partial download is never used
+            tmp_path = f"{local_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            os.makedirs(tmp_path, exist_ok=True)
+            try:
+                mlflow.artifacts.download_artifacts(
+                    artifact_uri=resolved["path"], dst_path=tmp_path
+                )
+            except Exception:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise
+            os.replace(tmp_path, local_path)
+        resolved["path"] = local_path
+        self._write_cache_entry(self.model_uri, resolved)
+        return resolved
+
+    def _write_cache_entry(self, model_uri, resolved):
+        index_path = self._cache_index_path()
+        with _cache_index_lock, open(f"{index_path}.lock", "a") as lock_file:
+            if fcntl is not None:
+                # released when the lock file is closed
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            index = self._read_cache_index()
+            index[model_uri] = resolved
+            tmp_index = f"{index_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            with open(tmp_index, "w") as f:
+                json.dump(index, f, indent=2)
+            os.replace(tmp_index, index_path)
+
+    def cache_as(self, model_uri):
+        """Record in the cache that `model_uri` resolves to the loaded model, e.g.
+        to point an alias at a version that was loaded by number. Does nothing
+        without a cache directory."""
+        if self.cache_dir is None or self.path is None:
+            return
+        name, _, _ = _parse_model_uri(model_uri)
+        self._write_cache_entry(
+            model_uri,
+            {
+                "name": name,
+                "version": self.version,
+                "run_id": self.run_id,
+                "path": self.path,
+            },
+        )
+
+    def load(self):
+        """Import MLflow, resolve the model URI and load the model.
+
+        MLflow takes a second or more to import, so it is only imported here
+        rather than when the app is imported. If the model is already loaded
+        (e.g. by a pre-fork supervisor, see serve_supervisor.py), it is returned
+        as is.
+
+        Returns:
+            mlflow.pyfunc.PyFuncModel: The model.
+        """
+        if self.model is not None:
+            return self.model
+
+        start = time.perf_counter()
+        try:
+            import mlflow
+            import mlflow.pyfunc
+
+            if self.tracking_uri is not None:
+                mlflow.set_tracking_uri(self.tracking_uri)
+            self.timings["import_mlflow"] = time.perf_counter() - start
+
+            step = time.perf_counter()
+            resolved = self._resolve(mlflow)
+            self.version, self.run_id = resolved["version"], resolved["run_id"]
+            self.path = resolved["path"]
+            self.timings["resolve"] = time.perf_counter() - step
+
+            step = time.perf_counter()
+            # a cached model's dependencies were already checked against the
+            # environment (with any mismatches logged) when it was first loaded,
+            # and checking them takes most of a second
+            model = mlflow.pyfunc.load_model(
+                resolved["path"], suppress_warnings=self.from_cache
+            )
+            self.timings["load_model"] = time.perf_counter() - step
+        except Exception as e:
+            self.error = str(e)
+            raise
+        finally:
+            self.timings["total"] = time.perf_counter() - start
+
+        self.model = model
+        return model
+
+    def summary(self):
+        """One-line startup-time breakdown, e.g. for logging at boot."""
+        steps = ", ".join(
+            f"{step} {seconds:.2f}s"
+            for step, seconds in self.timings.items()
+            if step != "total"
+        )
+        source = "local cache" if self.from_cache else "registry"
+        return (
+            f"Loaded {self.model_uri} (version {self.version}, from {source}) in "
+            f"{self.timings.get('total', 0):.2f}s: {steps}"
+        )
+
+    def status(self):
+        """Readiness details for a /ready endpoint."""
+        return {
+            "ready": self.ready,
+            "model_uri": self.model_uri,
+            "version": self.version,
+            "run_id": self.run_id,
+            "from_cache": self.from_cache,
+            "timings": {step: round(s, 4) for step, s in self.timings.items()},
+            "error": self.error,
+        }
+
+
+def model_loader_from_env(model_uri, tracking_uri=None):
+    """Create a `ModelLoader` configured through environment variables:
+
+    - `MODEL_CACHE_DIR`: directory of the resolved-model cache. Set it for fast
+      starts that skip the registry after the first load (no caching if unset).
+
+    Args:
+        model_uri (str): Registered model URI.
+        tracking_uri (str, optional): MLflow tracking URI to set before loading.
+
+    Returns:
+        ModelLoader: The loader (the model isn't loaded yet).
+    """
+    return ModelLoader(
+        model_uri, cache_dir=os.getenv("MODEL_CACHE_DIR"), tracking_uri=tracking_uri
+    )
@@ -1,11 +1,16 @@
-import json
+import sys
 
 import mlflow
-import pandas as pd
-from clean_prediction_logs import clean_prediction_logs
+from compact_prediction_logs import compact_prediction_logs, read_prediction_features
 from evidently import ColumnMapping
-from evidently.metric_preset import DataDriftPreset, RegressionPreset, TargetDriftPreset
+from evidently.metric_preset import RegressionPreset
 from evidently.report import Report
+from mlflow import MlflowClient
+from reference_profile import (
+    compare_to_profile,
+    load_reference_predictions,
+    load_reference_profile,
+)
 
 ###################################
 # MLFlow Experiment Configuration #
@@ -16,30 +21,38 @@ mlflow.set_experiment("Forecasting Apple Demand")
 # Define model location
 MODEL_URI = "models:/apple_demand@champion"
 
-# Load the trained ML model
-model = mlflow.pyfunc.load_model(MODEL_URI)
-
-# Retrieve the run ID of the logged model
-model_run_id = model.metadata.run_id
+# Look up the run ID of the champion model without loading the model itself
+model_version = MlflowClient().get_model_version_by_alias("apple_demand", "champion")
+model_run_id = model_version.run_id
 
-print("Model successfully loaded.")
+print(f"Monitoring model version {model_version.version} (run {model_run_id}).")
 
 ################
 # Prepare Data #
 ################
-# Load data model was trained on
-training_data_path = f"training_data/{model_run_id}-training_data.csv"
-training_data = pd.read_csv(training_data_path)
-training_data['predictions'] = model.predict(training_data)
+# Load the compact reference profile of the data the model was trained on:
+# histograms and summary stats of each feature and of the model's predictions.
+# It is built from training_data/{run_id}-training_data.csv the first time this
+# runs for a model and saved next to it, along with the reference predictions.
+reference_profile = load_reference_profile(model_run_id, model_uri=MODEL_URI)
+reference_predictions = load_reference_predictions(model_run_id)
 
-print("Training data successfully loaded.")
+print("Reference profile successfully loaded.")
 
-# Load recent data with predictions and clean
-log_file_path = "prediction_logs.csv"
-df = pd.read_csv(log_file_path)
-cleaned_logs = clean_prediction_logs(df)
-# Retain columns in cleaned_logs that are features in training_data
-cols = training_data.drop(columns="demand").columns.to_list()
+# Append any new prediction logs (Parquet segments and the CSV log) to the
+# compacted, date-partitioned feature table, then load recent data with
+# predictions from it
+compact_prediction_logs(
+    log_dir="prediction_logs",
+    table_dir="prediction_features",
+    csv_path="prediction_logs.csv",
+)
+cleaned_logs = read_prediction_features("prediction_features")
+cleaned_logs = cleaned_logs[cleaned_logs["status"] == "success"]
+if cleaned_logs.empty:
+    sys.exit("No successful predictions have been logged yet, nothing to monitor.")
+# Retain columns in cleaned_logs that were profiled in the training data
+cols = [col for col in reference_profile["columns"] if col in cleaned_logs]
 cleaned_logs = cleaned_logs[cols]
 
 print("Prediction logs successfully loaded and cleaned.")
@@ -47,28 +60,22 @@ print("Prediction logs successfully loaded and cleaned.")
 ##########################
 # Generate Drift Reports #
 ##########################
+# Compare the features and predictions to the reference profile
+drift_summary = compare_to_profile(reference_profile, cleaned_logs)
+drift_summary.to_csv("drift_summary.csv", index=False)
+print(drift_summary.to_string(index=False))
+
+print("Feature drift summary generated successfully.")
+
 # Define column mapping
 column_mapping = ColumnMapping()
 column_mapping.target = "demand"
 column_mapping.prediction = "predictions"
-column_mapping.datetime = "date"
-
-# Generate Data Drift Report for feature columns only
-feature_columns = training_data.drop(columns=["demand", "predictions"]).columns.to_list()
-data_drift_report = Report(metrics=[DataDriftPreset(drift_share=0.3)])
-data_drift_report.run(
-    reference_data=training_data[feature_columns],
-    current_data=cleaned_logs[feature_columns],
-    column_mapping=ColumnMapping()
-)
-data_drift_report.save_html("data_drift_report.html")
-
-print("Feature drift report generated successfully.")
 
-# Generate Model Performance Report
+# Generate Model Performance Report against the cached reference predictions
 performance_report = Report(metrics=[RegressionPreset()])
 performance_report.run(
-    reference_data=training_data,
+    reference_data=reference_predictions,
     current_data=cleaned_logs,
     column_mapping=column_mapping,
 )
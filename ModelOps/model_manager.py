@@ -0,0 +1,266 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from model_loader import ModelLoader
+
+
+class ModelNotFound(LookupError):
+    """Raised when an alias or version isn't registered for the model."""
+
+
+def _directory_size(path):
+    """Total size in bytes of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+class ModelManager:
+    """Serve several versions of a registered model from one process.
+
+    Loaded models are kept in a least-recently-used cache bounded by the number
+    of models and, optionally, by their total size. A model's size is estimated
+    from its artifacts on disk, which for pickled models such as scikit-learn's
+    is close to what they take up in memory. When either bound is exceeded the
+    least recently used models are evicted.
+
+    Concurrent requests for a model that isn't loaded yet trigger a single load
+    that they all wait on. Aliases (e.g. "champion") are resolved to versions
+    through the registry and the resolution is reused for `alias_ttl` seconds.
+
+    Args:
+        model_name (str): Registered model name, e.g. "apple_demand".
+        max_models (int, optional): Maximum models kept loaded. Defaults to 3.
+        max_memory_mb (float, optional): Maximum estimated size of the loaded
+        models. No limit if None.
+        cache_dir (str, optional): Directory models are downloaded to (see
+        `ModelLoader`). Defaults to a temporary directory, created when the
+        first model is loaded and removed by `close()`.
+        tracking_uri (str, optional): MLflow tracking URI.
+        alias_ttl (float, optional): Seconds an alias resolution is reused.
+        Defaults to 30.
+
+    Example:
+        >>> manager = ModelManager("apple_demand", max_models=3)
+        >>> manager.get("champion").predict(df)
+        >>> manager.get("4").predict(df)
+    """
+
+    def __init__(
+        self,
+        model_name,
+        max_models=3,
+        max_memory_mb=None,
+        cache_dir=None,
+        tracking_uri=None,
+        alias_ttl=30.0,
+    ):
+        self.model_name = model_name
+        self.max_models = max_models
+        self.max_memory = max_memory_mb * 2**20 if max_memory_mb else None
+        self.cache_dir = cache_dir
+        self._temporary_cache_dir = False
+        self.tracking_uri = tracking_uri
+        self.alias_ttl = alias_ttl
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_failures = 0
+        self._models = OrderedDict()  # version -> (model, size in bytes)
+        self._loading = {}  # version -> Future of the load in progress
+        self._aliases = {}  # alias -> (version, time resolved)
+        self._lock = threading.Lock()
+
+    def resolve(self, alias_or_version):
+        """The version a version number or alias refers to.
+
+        Raises:
+            ModelNotFound: If the alias or version isn't registered.
+        """
+        if str(alias_or_version).isdigit():
+            return str(alias_or_version)
+
+        alias = alias_or_version
+        cached = self._aliases.get(alias)
+        if cached is not None and time.monotonic() - cached[1] < self.alias_ttl:
+            return cached[0]
+
+        import mlflow
+
+        if self.tracking_uri is not None:
+            mlflow.set_tracking_uri(self.tracking_uri)
+        try:
+            model_version = mlflow.MlflowClient().get_model_version_by_alias(
+                self.model_name, alias
+            )
+        except mlflow.exceptions.MlflowException as e:
+            # the file store reports unknown aliases as invalid parameters
+            if e.error_code not in ("RESOURCE_DOES_NOT_EXIST", "INVALID_PARAMETER_VALUE"):
+                raise
+            message = f"No alias {alias!r} for model {self.model_name}"
+            raise ModelNotFound(message) from e
+        version = str(model_version.version)
+        self._aliases[alias] = (version, time.monotonic())
+        return version
+
+    def get(self, alias_or_version):
+        """Get a loaded model, loading it first if it isn't cached.
+
+        Blocks while the model loads, so call it from a worker thread rather than
+        the event loop.
+
+        Args:
+            alias_or_version (str): An alias (e.g. "champion") or version number.
+
+        Returns:
+            mlflow.pyfunc.PyFuncModel: The model.
+
+        Raises:
+            ModelNotFound: If the alias or version isn't registered.
+        """
+        version = self.resolve(alias_or_version)
+        with self._lock:
+            if version in self._models:
+                self.hits += 1
+                self._models.move_to_end(version)
+                return self._models[version][0]
+
+            self.misses += 1
+            loading = self._loading.get(version)
+            if loading is not None:
+                waiting = True
+            else:
+                # this request loads the model, concurrent ones wait for it
+                waiting = False
+                loading = self._loading[version] = Future()
+
+        if waiting:
+            return loading.result()
+
+        try:
+            model, size = self._load(version)
+        except Exception as e:
+            with self._lock:
+                self.load_failures += 1
+                del self._loading[version]
+            loading.set_exception(e)
+            raise
+
+        with self._lock:
+            self.loads += 1
+            self._models[version] = (model, size)
+            del self._loading[version]
+            self._evict(keep=version)
+        loading.set_result(model)
+        return model
+
+    def _cache_directory(self):
+        """The directory models are downloaded to, creating a temporary one the
+        first time if none was given."""
+        with self._lock:
+            if self.cache_dir is None:
+                self.cache_dir = tempfile.mkdtemp(prefix="model_cache_")
+                self._temporary_cache_dir = True
+            return self.cache_dir
+
+    def _load(self, version):
+        import mlflow
+
+        loader = ModelLoader(
+            f"models:/{self.model_name}/{version}",
+            cache_dir=self._cache_directory(),
+            tracking_uri=self.tracking_uri,
+        )
+        try:
+            model = loader.load()
+        except mlflow.exceptions.MlflowException as e:
+            if e.error_code != "RESOURCE_DOES_NOT_EXIST":
+                raise
+            message = f"No version {version} of model {self.model_name}"
+            raise ModelNotFound(message) from e
+        return model, _directory_size(loader.path)
+
+    def _memory_used(self):
+        return sum(size for _, size in self._models.values())
+
+    def _evict(self, keep):
+        """Evict least recently used models until the cache is within its bounds.
+        Must be called with the lock held."""
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models
+            or (self.max_memory is not None and self._memory_used() > self.max_memory)
+        ):
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            del self._models[oldest]
+            self.evictions += 1
+
+    def close(self):
+        """Unload the models and remove the temporary download directory, if one
+        was created. Call it when the app shuts down."""
+        with self._lock:
+            self._models.clear()
+            self._aliases.clear()
+            if self._temporary_cache_dir:
+                shutil.rmtree(self.cache_dir, ignore_errors=True)
+                self.cache_dir = None
+                self._temporary_cache_dir = False
+
+    def stats(self):
+        """Cache counters and the loaded versions, most recently used last."""
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "loaded_versions": list(self._models),
+                "loading_versions": list(self._loading),
+                "aliases": {
+                    alias: version for alias, (version, _) in self._aliases.items()
+                },
+                "memory_mb": round(self._memory_used() / 2**20, 2),
+                "max_models": self.max_models,
+                "max_memory_mb": (
+                    round(self.max_memory / 2**20, 2) if self.max_memory else None
+                ),
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_failures": self.load_failures,
+            }
+
+
+def model_manager_from_env(model_name, tracking_uri=None):
+    """Create a `ModelManager` configured through environment variables:
+
+    - `MODEL_CACHE_MAX_MODELS`: maximum models kept loaded (defaults to 3).
+    - `MODEL_CACHE_MAX_MEMORY_MB`: maximum estimated size of the loaded models
+      (no limit if unset).
+    - `MODEL_CACHE_DIR`: directory models are downloaded to (a temporary
+      directory, created on the first load, if unset).
+    - `MODEL_ALIAS_TTL`: seconds an alias resolution is reused (defaults to 30).
+
+    Args:
+        model_name (str): Registered model name.
+        tracking_uri (str, optional): MLflow tracking URI.
+
+    Returns:
+        ModelManager: The manager (no models are loaded yet).
+    """
+    max_memory_mb = os.getenv("MODEL_CACHE_MAX_MEMORY_MB")
+    return ModelManager(
+        model_name,
+        max_models=int(os.getenv("MODEL_CACHE_MAX_MODELS", "3")),
+        max_memory_mb=float(max_memory_mb) if max_memory_mb else None,
+        cache_dir=os.getenv("MODEL_CACHE_DIR"),
+        tracking_uri=tracking_uri,
+        alias_ttl=float(os.getenv("MODEL_ALIAS_TTL", "30")),
+    )
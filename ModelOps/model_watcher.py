@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from model_loader import ModelLoader, _parse_model_uri
+
+
+def warm_up(model, df, n_calls=3):
+    """Predict on `df` a few times, checking the predictions look valid.
+
+    The first calls to a freshly loaded model are slower (lazy imports, schema
+    checks, caches), so making them here keeps that off the request path. It
+    also catches a model that can't predict on the app's payloads, e.g. one
+    trained on different features.
+
+    Raises:
+        ValueError: If a call doesn't return one finite prediction per row.
+    """
+    for _ in range(n_calls):
+        predictions = np.asarray(model.predict(df), dtype="float64")
+        if predictions.shape != (len(df),) or not np.isfinite(predictions).all():
+            raise ValueError(
+                f"Warm-up returned {predictions.shape} predictions for {len(df)} "
+                "rows, or non-finite predictions"
+            )
+
+
+class ModelWatcher:
+    """Hot swap the served model when its registry alias moves to a new version.
+
+    A background thread polls the registry every `interval` seconds. When the
+    alias points at a version other than the one being served, that version is
+    loaded and warmed up on `warmup_data` in the thread, off the request path,
+    and then handed to `on_swap`, which starts serving it. If loading, warming
+    up or `on_swap` fails, the current model keeps serving (the new version
+    is rolled back) and the version isn't retried until the alias moves again.
+
+    Args:
+        model_uri (str): Registered model URI with an alias, e.g.
+        "models:/apple_demand@champion".
+        on_swap (callable): Called with the `ModelLoader` of the new version
+        once it is loaded and warmed up. Should raise to reject the version.
+        version (str, optional): Version currently served.
+        warmup_data (pd.DataFrame, optional): Rows to warm the new model up on.
+        No warm-up if None.
+        cache_dir (str, optional): Resolved-model cache directory (see
+        `ModelLoader`), updated to the new version once it is served.
+        tracking_uri (str, optional): MLflow tracking URI.
+        interval (float, optional): Seconds between registry checks. Defaults
+        to 30.
+
+    Example:
+        >>> watcher = ModelWatcher("models:/apple_demand@champion", serve, "5")
+        >>> watcher.start()
+    """
+
+    def __init__(
+        self,
+        model_uri,
+        on_swap,
+        version=None,
+        warmup_data=None,
+        cache_dir=None,
+        tracking_uri=None,
+        interval=30.0,
+    ):
+        self.model_name, self.alias, _ = _parse_model_uri(model_uri)
+        if self.alias is None:
+            raise ValueError(f"Only alias URIs can be watched, got {model_uri!r}")
+        self.model_uri = model_uri
+        self.on_swap = on_swap
+        self.version = str(version) if version is not None else None
+        self.warmup_data = warmup_data
+        self.cache_dir = cache_dir
+        self.tracking_uri = tracking_uri
+        self.interval = interval
+        self.swaps = 0
+        self.rollbacks = 0
+        self.rejected_version = None
+        self.last_check = None
+        self.last_swap = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start watching in a background thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="model-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching. The thread exits after any swap in progress."""
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # e.g. the registry is unreachable, try again next time
+                self.error = str(e)
+
+    def _aliased_version(self):
+        import mlflow
+
+        if self.tracking_uri is not None:
+            mlflow.set_tracking_uri(self.tracking_uri)
+        model_version = mlflow.MlflowClient().get_model_version_by_alias(
+            self.model_name, self.alias
+        )
+        return str(model_version.version)
+
+    def check(self):
+        """Check the alias once and swap to the version it points at if it moved.
+
+        Returns:
+            bool: Whether a new version was swapped in.
+        """
+        version = self._aliased_version()
+        self.last_check = time.time()
+        if version in (self.version, self.rejected_version):
+            return False
+
+        print(f"{self.model_uri} moved to version {version}, loading it")
+        try:
+            loader = ModelLoader(
+                f"models:/{self.model_name}/{version}",
+                cache_dir=self.cache_dir,
+                tracking_uri=self.tracking_uri,
+            )
+            model = loader.load()
+            if self.warmup_data is not None:
+                warm_up(model, self.warmup_data)
+            self.on_swap(loader)
+        except Exception as e:
+            traceback.print_exc()
+            print(f"Keeping version {self.version}, version {version} failed: {e}")
+            self.rollbacks += 1
+            self.rejected_version = version
+            self.error = str(e)
+            return False
+
+        # restarts load the new version from the cache, if there is one
+        loader.cache_as(self.model_uri)
+        self.version = version
+        self.swaps += 1
+        self.last_swap = time.time()
+        self.error = None
+        print(loader.summary())
+        return True
+
+    def status(self):
+        """Watcher details for a /ready endpoint."""
+        return {
+            "model_uri": self.model_uri,
+            "version": self.version,
+            "interval": self.interval,
+            "swaps": self.swaps,
+            "rollbacks": self.rollbacks,
+            "rejected_version": self.rejected_version,
+            "last_check": self.last_check,
+            "last_swap": self.last_swap,
+            "error": self.error,
+        }
+
+
+def model_watcher_from_env(
+    model_uri, on_swap, version=None, warmup_data=None, tracking_uri=None
+):
+    """Create a `ModelWatcher` configured through environment variables:
+
+    - `MODEL_WATCH_INTERVAL`: seconds between registry checks (defaults to 30).
+      Set it to 0 to disable hot swapping.
+    - `MODEL_CACHE_DIR`: resolved-model cache directory (see `ModelLoader`).
+
+    Args:
+        model_uri (str): Registered model URI with an alias.
+        on_swap (callable): Starts serving a new version (see `ModelWatcher`).
+        version (str, optional): Version currently served.
+        warmup_data (pd.DataFrame, optional): Rows to warm new versions up on.
+        tracking_uri (str, optional): MLflow tracking URI.
+
+    Returns:
+        ModelWatcher: The watcher (not started), or None if it is disabled.
+    """
+    interval = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))
+    if interval <= 0:
+        return None
+
+    return ModelWatcher(
+        model_uri,
+        on_swap,
+        version=version,
+        warmup_data=warmup_data,
+        cache_dir=os.getenv("MODEL_CACHE_DIR"),
+        tracking_uri=tracking_uri,
+        interval=interval,
+    )
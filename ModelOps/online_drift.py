@@ -0,0 +1,189 @@
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from reference_profile import PSI_THRESHOLD, bin_counts, population_stability_index
+
+
+class OnlineDriftMonitor:
+    """Windowed drift statistics of live traffic against a reference profile.
+
+    Each request's rows are counted into the reference profile's histogram bins
+    (and running sums for means and standard deviations) of the current time
+    bucket. The window is the last `window_buckets` buckets of `bucket_seconds`
+    each, with running totals that buckets are added to and subtracted from as
+    they enter and leave the window. Updates cost a binary search over a
+    column's bins per value, and `snapshot()` only touches the window totals,
+    so neither depends on how much traffic the window holds.
+
+    Args:
+        profile (dict): Reference profile (see `reference_profile.py`).
+        columns (list, optional): Input columns to monitor. Defaults to every
+        profiled column except the target and predictions.
+        bucket_seconds (float, optional): Length of a time bucket. Defaults
+        to 60.
+        window_buckets (int, optional): Buckets in the window. Defaults to 15,
+        i.e. a 15 minute window.
+        psi_threshold (float, optional): PSI at or above which a column is
+        flagged as drifted.
+
+    Example:
+        >>> monitor = OnlineDriftMonitor(load_reference_profile(run_id))
+        >>> monitor.update(df, predictions)
+        >>> monitor.snapshot()["columns"]["rainfall"]["psi"]
+    """
+
+    def __init__(
+        self,
+        profile,
+        columns=None,
+        bucket_seconds=60.0,
+        window_buckets=15,
+        psi_threshold=PSI_THRESHOLD,
+    ):
+        if columns is None:
+            columns = [
+                name
+                for name in profile["columns"]
+                if name not in ("demand", "predictions")
+            ]
+        self.profile = profile
+        self.columns = [
+            name for name in columns if "bins" in profile["columns"].get(name, {})
+        ]
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.psi_threshold = psi_threshold
+        self._tracked = list(self.columns)
+        if "bins" in profile["columns"].get("predictions", {}):
+            self._tracked.append("predictions")
+        self._buckets = deque()
+        self._totals = self._empty_bucket()
+        self._lock = threading.Lock()
+
+    def _empty_bucket(self):
+        """Histogram counts and [count, sum, sum of squares] per tracked column."""
+        return {
+            name: (
+                np.zeros(len(self.profile["columns"][name]["counts"]), dtype="int64"),
+                np.zeros(3),
+            )
+            for name in self._tracked
+        }
+
+    def _expire(self, now):
+        """Drop buckets that have left the window from the running totals."""
+        oldest = now - self.bucket_seconds * self.window_buckets
+        while self._buckets and self._buckets[0][0] <= oldest:
+            _, bucket = self._buckets.popleft()
+            for name, (counts, moments) in bucket.items():
+                self._totals[name][0][:] -= counts
+                self._totals[name][1][:] -= moments
+
+    def update(self, df, predictions=None):
+        """Add a request's rows (and predictions) to the current bucket.
+
+        Args:
+            df (pd.DataFrame): The request's input rows. Missing columns and
+            values are skipped.
+            predictions (array-like, optional): The model's predictions.
+        """
+        values = {
+            name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype="float64")
+            for name in self.columns
+            if name in df
+        }
+        if predictions is not None and "predictions" in self._tracked:
+            values["predictions"] = np.asarray(predictions, dtype="float64")
+
+        # bin outside the lock so concurrent requests don't wait on each other
+        updates = {}
+        for name, column in values.items():
+            present = column[~np.isnan(column)]
+            counts = bin_counts(present, self.profile["columns"][name]["bins"])
+            moments = np.array(
+                [len(present), present.sum(), np.square(present).sum()]
+            )
+            updates[name] = (counts, moments)
+
+        now = time.monotonic()
+        start = now - now % self.bucket_seconds
+        with self._lock:
+            self._expire(now)
+            if not self._buckets or self._buckets[-1][0] != start:
+                self._buckets.append((start, self._empty_bucket()))
+            bucket = self._buckets[-1][1]
+            for name, (counts, moments) in updates.items():
+                bucket[name][0][:] += counts
+                bucket[name][1][:] += moments
+                self._totals[name][0][:] += counts
+                self._totals[name][1][:] += moments
+
+    def snapshot(self):
+        """Drift statistics of the current window.
+
+        Returns:
+            dict: Window length and row count, plus for each monitored column
+            and the predictions: the current and reference mean and standard
+            deviation, the PSI against the reference histogram and whether it
+            crossed the drift threshold.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            totals = {
+                name: (counts.copy(), moments.copy())
+                for name, (counts, moments) in self._totals.items()
+            }
+
+        stats = {}
+        for name, (counts, (n, total, total_sq)) in totals.items():
+            reference = self.profile["columns"][name]
+            mean = total / n if n else None
+            std = None
+            if n > 1:
+                std = float(np.sqrt(max(total_sq - n * mean**2, 0.0) / (n - 1)))
+            psi = population_stability_index(reference["counts"], counts)
+            stats[name] = {
+                "count": int(n),
+                "mean": mean,
+                "std": std,
+                "reference_mean": reference["mean"],
+                "reference_std": reference["std"],
+                "psi": None if np.isnan(psi) else psi,
+                "drifted": bool(psi >= self.psi_threshold),
+            }
+
+        return {
+            "run_id": self.profile["run_id"],
+            "window_seconds": self.bucket_seconds * self.window_buckets,
+            "rows": max((s["count"] for s in stats.values()), default=0),
+            "drifted_columns": [
+                name for name in self.columns if stats[name]["drifted"]
+            ],
+            "columns": stats,
+        }
+
+
+def drift_monitor_from_env(profile):
+    """Create an `OnlineDriftMonitor` configured through environment variables:
+
+    - `DRIFT_BUCKET_SECONDS`: length of a time bucket (defaults to 60).
+    - `DRIFT_WINDOW_BUCKETS`: buckets in the window (defaults to 15).
+    - `DRIFT_PSI_THRESHOLD`: PSI flagged as drift (defaults to 0.2).
+
+    Args:
+        profile (dict): Reference profile of the served model.
+
+    Returns:
+        OnlineDriftMonitor: The monitor.
+    """
+    return OnlineDriftMonitor(
+        profile,
+        bucket_seconds=float(os.getenv("DRIFT_BUCKET_SECONDS", "60")),
+        window_buckets=int(os.getenv("DRIFT_WINDOW_BUCKETS", "15")),
+        psi_threshold=float(os.getenv("DRIFT_PSI_THRESHOLD", str(PSI_THRESHOLD))),
+    )
@@ -0,0 +1,142 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Supported request and response formats, negotiated through the Content-Type
+# and Accept headers:
+# - JSON: a list of row objects (the original format) or a columnar object
+#   mapping each column name to a list of values. Responses are
+#   `{"predictions": [...]}`.
+# - Arrow IPC stream: a record batch stream with one column per feature.
+#   Responses hold a single `predictions` column.
+# - Raw float64: a little-endian float64 array of the feature values, row by row
+#   in the endpoint's feature order. Responses are the float64 predictions.
+JSON = "application/json"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+RAW_FLOAT64 = "application/x-float64"
+CSV = "text/csv"
+
+
+class PayloadError(ValueError):
+    """Raised when a request payload can't be read in its declared format."""
+
+
+class UnsupportedFormat(PayloadError):
+    """Raised when a request payload's Content-Type isn't supported."""
+
+
+def media_type(content_type):
+    """The media type of a Content-Type header, without parameters."""
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def _to_frame(df, feature_dtypes):
+    """Check a frame has every feature and cast the features to their dtypes."""
+    missing = set(feature_dtypes) - set(df.columns)
+    if missing:
+        raise PayloadError(f"Missing columns: {missing}")
+    try:
+        return df.astype(feature_dtypes)
+    except (TypeError, ValueError) as e:
+        raise PayloadError(f"Invalid column values: {e}") from e
+
+
+def read_columnar_json(body, feature_dtypes):
+    """Read a columnar JSON payload (`{"column": [values, ...], ...}`)."""
+    try:
+        columns = json.loads(body)
+        df = pd.DataFrame(columns)
+    except (TypeError, ValueError) as e:
+        raise PayloadError(f"Invalid columnar JSON: {e}") from e
+    return _to_frame(df, feature_dtypes)
+
+
+def read_arrow_stream(body, feature_dtypes):
+    """Read an Arrow IPC stream payload."""
+    try:
+        df = pa.ipc.open_stream(body).read_all().to_pandas()
+    except pa.ArrowInvalid as e:
+        raise PayloadError(f"Invalid Arrow stream: {e}") from e
+    return _to_frame(df, feature_dtypes)
+
+
+def read_raw_float64(body, feature_dtypes):
+    """Read a raw float64 payload with the features in `feature_dtypes` order."""
+    n_features = len(feature_dtypes)
+    if len(body) % (8 * n_features):
+        raise PayloadError(
+            f"Raw float64 payload must hold {n_features} values per row"
+        )
+    values = np.frombuffer(body, dtype="<f8").reshape(-1, n_features)
+    return _to_frame(pd.DataFrame(values, columns=list(feature_dtypes)), feature_dtypes)
+
+
+READERS = {
+    JSON: read_columnar_json,
+    ARROW_STREAM: read_arrow_stream,
+    RAW_FLOAT64: read_raw_float64,
+}
+
+
+def read_frame(body, content_type, feature_dtypes):
+    """Read a columnar request payload straight into a DataFrame, without
+    building an object per row.
+
+    Args:
+        body (bytes): Request payload.
+        content_type (str): Its Content-Type: Arrow IPC stream, raw float64 or
+        JSON (the default if missing). JSON must be columnar; row-oriented
+        JSON is validated by the endpoint's pydantic model instead.
+        feature_dtypes (dict): Dtype of each feature the model needs, in order.
+
+    Returns:
+        pd.DataFrame: Frame with (at least) the features, cast to their dtypes.
+    """
+    format = media_type(content_type) or JSON
+    if format not in READERS:
+        raise UnsupportedFormat(f"Unsupported Content-Type: {content_type}")
+    return READERS[format](body, feature_dtypes)
+
+
+def is_json_rows(body, content_type):
+    """Whether a payload is the original row-oriented JSON (a list of objects)."""
+    return media_type(content_type) in (JSON, "") and body.lstrip()[:1] == b"["
+
+
+def response_format(accept):
+    """Pick the response format for an Accept header. Defaults to JSON."""
+    for part in (accept or "").split(","):
+        requested = media_type(part)
+        if requested in (JSON, ARROW_STREAM, RAW_FLOAT64):
+            return requested
+    return JSON
+
+
+def encode_predictions(predictions, accept):
+    """Serialize predictions in the format requested by an Accept header.
+
+    Args:
+        predictions (array-like): One prediction per row.
+        accept (str): The request's Accept header.
+
+    Returns:
+        tuple: The response body (bytes) and its media type.
+    """
+    predictions = np.asarray(predictions)
+    format = response_format(accept)
+
+    if format == ARROW_STREAM:
+        table = pa.table({"predictions": predictions.astype("float64")})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes(), ARROW_STREAM
+
+    if format == RAW_FLOAT64:
+        return predictions.astype("<f8").tobytes(), RAW_FLOAT64
+
+    # json.dumps of a plain list is much faster than FastAPI's generic encoder
+    body = json.dumps({"predictions": predictions.tolist()}).encode("utf-8")
+    return body, JSON
@@ -0,0 +1,193 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Requests with more rows than this are hashed and looked up on a worker thread
+# rather than the event loop
+INLINE_ROWS = 1000
+
+
+class PredictionCache:
+    """LRU cache of predictions with a time to live, keyed by model version and
+    feature values.
+
+    Each row is keyed by a 64-bit hash of its features (see `row_keys()`), so
+    identical feature vectors share an entry no matter which request, payload
+    format or batch they arrive in. A request's rows are hashed in one
+    vectorized call, looked up, and only the misses (each distinct one once)
+    are sent to the model.
+
+    Entries are keyed by model version, so a new version never gets the old
+    one's predictions. Call `clear()` when the served model changes to free
+    them: predictions of requests that were looked up before the clear are
+    not cached.
+
+    Args:
+        features (list): Feature columns the model predicts from. Other
+        columns (e.g. dates) don't affect the key.
+        max_entries (int, optional): Maximum predictions kept. Defaults to
+        100,000.
+        ttl (float, optional): Seconds a prediction is kept. Defaults to 300.
+
+    Example:
+        >>> cache = PredictionCache(list(FEATURE_DTYPES), max_entries=10000)
+        >>> predictions = await cache.predict("5", df, predict_executor.predict)
+    """
+
+    def __init__(self, features, max_entries=100000, ttl=300.0):
+        self.features = list(features)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries = OrderedDict()  # (version, row key) -> (prediction, expiry)
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def row_keys(self, df):
+        """Hash each row's features. Values are compared as float64, so e.g. a
+        weekend flag of 1 and 1.0 give the same key.
+
+        Returns:
+            np.ndarray: One uint64 key per row.
+
+        Raises:
+            KeyError: If a feature column is missing.
+        """
+        features = df[self.features].astype("float64")
+        return pd.util.hash_pandas_object(features, index=False).to_numpy()
+
+    def _lookup(self, version, keys):
+        """Cached predictions of the keys (NaN for misses) and a mask of hits."""
+        predictions = np.full(len(keys), np.nan)
+        hit = np.zeros(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            for i, key in enumerate(keys.tolist()):
+                entry = self._entries.get((version, key))
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[(version, key)]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end((version, key))
+                predictions[i] = entry[0]
+                hit[i] = True
+            self.hits += int(hit.sum())
+            self.misses += len(keys) - int(hit.sum())
+        return predictions, hit
+
+    def _hash_and_lookup(self, version, df):
+        keys = self.row_keys(df)
+        return keys, self._lookup(version, keys)
+
+    def _store(self, version, keys, predictions, generation):
+        expiry = time.monotonic() + self.ttl
+        with self._lock:
+            if generation != self._generation:
+                # the cache was cleared while the model predicted
+                return
+            for key, prediction in zip(keys.tolist(), predictions.tolist()):
+                self._entries[(version, key)] = (prediction, expiry)
+                self._entries.move_to_end((version, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def predict(self, version, df, predict):
+        """Predict on `df`, using cached predictions where possible.
+
+        Args:
+            version (str): Version of the model `predict` uses.
+            df (pd.DataFrame): Rows to predict on.
+            predict (callable): Async function predicting on a DataFrame, called
+            with the rows that aren't cached (if any).
+
+        Returns:
+            np.ndarray: One prediction per row of `df`.
+        """
+        generation = self._generation
+        try:
+            keys, (predictions, hit) = await self._run(
+                len(df), self._hash_and_lookup, version, df
+            )
+        except KeyError:
+            # missing features, let the model report the error
+            return await predict(df)
+        if hit.all():
+            return predictions
+
+        # predict each distinct missing row once
+        missing = np.flatnonzero(~hit)
+        missing_keys, first, inverse = np.unique(
+            keys[missing], return_index=True, return_inverse=True
+        )
+        computed = np.asarray(
+            await predict(df.iloc[missing[first]].reset_index(drop=True)),
+            dtype="float64",
+        )
+        predictions[missing] = computed[inverse]
+        await self._run(
+            len(missing_keys), self._store, version, missing_keys, computed, generation
+        )
+        return predictions
+
+    async def _run(self, n_rows, func, *args):
+        """Call `func` on the event loop for small requests, and on a worker
+        thread for big ones so they don't hold up other requests."""
+        if n_rows <= INLINE_ROWS:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def clear(self):
+        """Drop every cached prediction, e.g. when the served model changes."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        """Hit and miss counts (in rows) and the hit rate so far."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def prediction_cache_from_env(features):
+    """Create a `PredictionCache` if it is enabled through environment variables.
+
+    - `PREDICTION_CACHE_SIZE`: maximum predictions kept. The cache is disabled
+      if unset or 0.
+    - `PREDICTION_CACHE_TTL`: seconds a prediction is kept (defaults to 300).
+
+    Args:
+        features (list): Feature columns the model predicts from.
+
+    Returns:
+        PredictionCache: The cache, or None if it is disabled.
+    """
+    max_entries = int(os.getenv("PREDICTION_CACHE_SIZE", "0"))
+    if max_entries <= 0:
+        return None
+
+    return PredictionCache(
+        features,
+        max_entries=max_entries,
+        ttl=float(os.getenv("PREDICTION_CACHE_TTL", "300")),
+    )
@@ -0,0 +1,321 @@
+import datetime
+import glob
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Finished segments are renamed from `*.parquet.inprogress` to `*.parquet`, so
+# readers only ever see complete files
+SEGMENT_SUFFIX = ".parquet"
+INPROGRESS_SUFFIX = ".inprogress"
+
+# Columns logged for every prediction, ahead of the model's features
+LOG_COLUMNS = [
+    ("prediction_date", pa.timestamp("us")),
+    ("request_id", pa.string()),
+    ("request_type", pa.string()),
+    ("status", pa.string()),
+    ("error", pa.string()),
+]
+
+_STOP = object()
+
+
+def log_schema(feature_dtypes):
+    """Arrow schema of the logs: one row per prediction, with the request
+    details, each feature and the prediction.
+
+    Args:
+        feature_dtypes (dict): Dtype of each feature to log, e.g. "float64".
+
+    Returns:
+        pa.Schema: The schema.
+    """
+    features = [
+        (name, pa.from_numpy_dtype(pd.api.types.pandas_dtype(dtype)))
+        for name, dtype in feature_dtypes.items()
+    ]
+    return pa.schema(LOG_COLUMNS + features + [("predictions", pa.float64())])
+
+
+class PredictionLogSink:
+    """Log predictions from a background thread into Parquet segment files.
+
+    `log()` only puts the request on an in-memory queue, so logging stays out of
+    the request path. A writer thread turns queued requests into one row per
+    prediction and appends them to the current segment every `flush_rows` rows
+    or `flush_interval` seconds, whichever comes first. Segments are rotated
+    after `segment_rows` rows or `segment_seconds` seconds.
+
+    Each process writes its own segments, named after the host, process ID and
+    start time, so several uvicorn workers can log to the same directory without
+    interleaving writes. A segment is written as `*.parquet.inprogress` and
+    renamed to `*.parquet` once it is closed.
+
+    Args:
+        log_dir (str): Directory to write segments to.
+        feature_dtypes (dict): Dtype of each feature to log. Other columns of the
+        logged DataFrames are ignored and missing ones are logged as nulls.
+        flush_rows (int, optional): Rows buffered before writing. Defaults to
+        10,000.
+        flush_interval (float, optional): Maximum seconds rows are buffered.
+        Defaults to 1.
+        segment_rows (int, optional): Rows per segment. Defaults to 1,000,000.
+        segment_seconds (float, optional): Maximum seconds a segment stays open.
+        Defaults to 3600.
+        max_queue (int, optional): Requests that can wait for the writer. Once
+        full, further requests aren't logged (see `stats()`) rather than slowing
+        down predictions. Defaults to 10,000.
+
+    Example:
+        >>> sink = PredictionLogSink("prediction_logs", FEATURE_DTYPES)
+        >>> sink.start()
+        >>> sink.log("single", df, predictions)
+        >>> sink.close()
+    """
+
+    def __init__(
+        self,
+        log_dir,
+        feature_dtypes,
+        flush_rows=10_000,
+        flush_interval=1.0,
+        segment_rows=1_000_000,
+        segment_seconds=3600.0,
+        max_queue=10_000,
+    ):
+        self.log_dir = log_dir
+        self.feature_dtypes = dict(feature_dtypes)
+        self.schema = log_schema(self.feature_dtypes)
+        # integer features are nullable so that missing columns can be logged
+        self._frame_dtypes = {
+            name: "Int64" if pd.api.types.is_integer_dtype(dtype) else dtype
+            for name, dtype in self.feature_dtypes.items()
+        }
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self.rows_written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._writer = None
+        self._segment_path = None
+        self._segment_rows = 0
+        self._segment_opened = None
+        self._segment_number = 0
+
+    def start(self):
+        """Start the writer thread. Call this in each worker process, e.g. on
+        application startup, since threads don't survive a fork."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._thread = threading.Thread(
+            target=self._run, name="prediction-log-sink", daemon=True
+        )
+        self._thread.start()
+
+    def log(self, request_type, df, predictions=None, status="success", error=None):
+        """Queue a request's predictions to be logged.
+
+        Args:
+            request_type (str): E.g. "single" or "batch".
+            df (pd.DataFrame): The request's input rows, or None if the request
+            failed before they could be read.
+            predictions (array-like, optional): One prediction per row, or None
+            if the request failed.
+            status (str, optional): "success" or "error".
+            error (str, optional): Error message of a failed request.
+        """
+        entry = (
+            datetime.datetime.now(),
+            uuid.uuid4().hex,
+            request_type,
+            pd.DataFrame() if df is None else df,
+            predictions,
+            status,
+            error,
+        )
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _to_table(self, entries):
+        """One row per prediction for a list of queued requests."""
+        frames = []
+        for entry in entries:
+            prediction_date, request_id, request_type, df, predictions = entry[:5]
+            status, error = entry[5:]
+            rows = pd.DataFrame(
+                {
+                    "prediction_date": prediction_date,
+                    "request_id": request_id,
+                    "request_type": request_type,
+                    "status": status,
+                    "error": error,
+                },
+                # a request that failed without any rows still gets one
+                index=range(max(len(df), 1)),
+            )
+            features = (
+                df.reindex(columns=list(self.feature_dtypes))
+                .astype(self._frame_dtypes)
+                .reset_index(drop=True)
+            )
+            rows = pd.concat([rows, features], axis=1)
+            rows["predictions"] = (
+                pd.Series(predictions, dtype="float64").to_numpy()
+                if predictions is not None
+                else None
+            )
+            frames.append(rows)
+
+        data = pd.concat(frames, ignore_index=True)
+        return pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+
+    def _open_segment(self):
+        opened = datetime.datetime.now()
+        self._segment_number += 1
+        name = (
+            f"{self._worker_id}-{opened:%Y%m%dT%H%M%S}-{self._segment_number:05d}"
+            f"{SEGMENT_SUFFIX}{INPROGRESS_SUFFIX}"
+        )
+        self._segment_path = os.path.join(self.log_dir, name)
+        self._writer = pq.ParquetWriter(self._segment_path, self.schema)
+        self._segment_rows = 0
+        self._segment_opened = time.monotonic()
+
+    def _close_segment(self):
+        """Finish the current segment and make it visible to readers."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._segment_path, self._segment_path[: -len(INPROGRESS_SUFFIX)])
+        self._writer = None
+
+    def _write(self, entries):
+        try:
+            table = self._to_table(entries)
+        except Exception:
+            # a malformed request shouldn't take the rest of the batch with it
+            tables = []
+            for entry in entries:
+                try:
+                    tables.append(self._to_table([entry]))
+                except Exception:
+                    self.dropped += 1
+            if not tables:
+                return
+            table = pa.concat_tables(tables)
+
+        if self._writer is None:
+            self._open_segment()
+        self._writer.write_table(table)
+        self._segment_rows += table.num_rows
+        self.rows_written += table.num_rows
+
+        if self._segment_rows >= self.segment_rows:
+            self._close_segment()
+
+    def _segment_expired(self):
+        return time.monotonic() - self._segment_opened >= self.segment_seconds
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            # wait for the first entry, then buffer until the batch is full or
+            # the flush interval has passed
+            try:
+                entries = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                entries = []
+            deadline = time.monotonic() + self.flush_interval
+            n_rows = sum(len(entry[3]) for entry in entries if entry is not _STOP)
+
+            while entries and n_rows < self.flush_rows:
+                timeout = deadline - time.monotonic()
+                if entries[-1] is _STOP or timeout <= 0:
+                    break
+                try:
+                    entries.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+                if entries[-1] is not _STOP:
+                    n_rows += len(entries[-1][3])
+
+            if entries and entries[-1] is _STOP:
+                stopping = True
+                entries.pop()
+            if entries:
+                self._write(entries)
+            if self._writer is not None and self._segment_expired():
+                self._close_segment()
+
+        self._close_segment()
+
+    def close(self):
+        """Write everything queued so far and finish the current segment."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def stats(self):
+        """Rows written, requests dropped and requests waiting to be written."""
+        return {
+            "rows_written": self.rows_written,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+def log_sink_from_env(feature_dtypes):
+    """Create a `PredictionLogSink` configured through environment variables:
+
+    - `PREDICTION_LOG_DIR`: directory for segments (defaults to "prediction_logs").
+    - `PREDICTION_LOG_FLUSH_ROWS`: rows buffered before writing.
+    - `PREDICTION_LOG_FLUSH_INTERVAL`: maximum seconds rows are buffered.
+    - `PREDICTION_LOG_SEGMENT_ROWS`: rows per segment.
+    - `PREDICTION_LOG_SEGMENT_SECONDS`: maximum seconds a segment stays open.
+
+    Args:
+        feature_dtypes (dict): Dtype of each feature to log.
+
+    Returns:
+        PredictionLogSink: The sink (not started yet).
+    """
+    return PredictionLogSink(
+        os.getenv("PREDICTION_LOG_DIR", "prediction_logs"),
+        feature_dtypes,
+        flush_rows=int(os.getenv("PREDICTION_LOG_FLUSH_ROWS", "10000")),
+        flush_interval=float(os.getenv("PREDICTION_LOG_FLUSH_INTERVAL", "1")),
+        segment_rows=int(os.getenv("PREDICTION_LOG_SEGMENT_ROWS", "1000000")),
+        segment_seconds=float(os.getenv("PREDICTION_LOG_SEGMENT_SECONDS", "3600")),
+    )
+
+
+def read_prediction_logs(log_dir="prediction_logs"):
+    """Read every finished log segment in a directory into one DataFrame.
+
+    Segments still being written (`*.parquet.inprogress`) are skipped.
+
+    Args:
+        log_dir (str, optional): Directory the segments were written to.
+
+    Returns:
+        pd.DataFrame: One row per logged prediction.
+    """
+    paths = sorted(glob.glob(os.path.join(log_dir, f"*{SEGMENT_SUFFIX}")))
+    if not paths:
+        return pd.DataFrame()
+    return pq.ParquetDataset(paths).read().to_pandas()
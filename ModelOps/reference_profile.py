@@ -0,0 +1,242 @@
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Quantiles summarized for every profiled column
+PROFILE_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+# PSI at or above which a column is flagged as drifted (a common rule of thumb:
+# < 0.1 no shift, 0.1 - 0.2 moderate shift, >= 0.2 significant shift)
+PSI_THRESHOLD = 0.2
+
+
+def profile_paths(run_id, data_dir="training_data"):
+    """Paths of the reference profile and cached reference predictions of a model
+    run, stored next to its training data.
+
+    Returns:
+        tuple: Path of the profile (JSON) and of the predictions (Parquet).
+    """
+    prefix = os.path.join(data_dir, run_id)
+    return f"{prefix}-reference_profile.json", f"{prefix}-reference_predictions.parquet"
+
+
+def _bins(values, n_bins):
+    """Histogram bins for a column: its distinct values if there are at most
+    `n_bins` of them (e.g. binary flags), otherwise quantile bin edges."""
+    distinct = np.unique(values)
+    if len(distinct) <= n_bins:
+        return {"values": distinct.tolist()}
+    edges = np.quantile(values, np.linspace(0, 1, n_bins + 1)[1:-1])
+    return {"edges": np.unique(edges).tolist()}
+
+
+def bin_counts(values, bins):
+    """Count values into a column's profile bins.
+
+    Args:
+        values (array-like): Values to count. Missing values are ignored.
+        bins (dict): The column's `bins` from the profile.
+
+    Returns:
+        np.ndarray: Count per bin. For distinct values there is an extra last
+        bin for values that weren't seen in the reference data.
+    """
+    values = np.asarray(values, dtype="float64")
+    values = values[~np.isnan(values)]
+
+    if "values" in bins:
+        distinct = np.asarray(bins["values"], dtype="float64")
+        idx = np.minimum(np.searchsorted(distinct, values), len(distinct) - 1)
+        idx = np.where(distinct[idx] == values, idx, len(distinct))
+        return np.bincount(idx, minlength=len(distinct) + 1)
+
+    edges = np.asarray(bins["edges"], dtype="float64")
+    return np.bincount(
+        np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1
+    )
+
+
+def population_stability_index(expected_counts, actual_counts, eps=1e-4):
+    """Population stability index between two histograms over the same bins.
+
+    Args:
+        expected_counts (array-like): Reference count per bin.
+        actual_counts (array-like): Current count per bin.
+        eps (float, optional): Floor for bin proportions, so empty bins don't
+        make the index infinite.
+
+    Returns:
+        float: The PSI (0 for identical distributions), or NaN if either
+        histogram is empty.
+    """
+    expected = np.asarray(expected_counts, dtype="float64")
+    actual = np.asarray(actual_counts, dtype="float64")
+    if expected.sum() == 0 or actual.sum() == 0:
+        return float("nan")
+    expected = np.maximum(expected / expected.sum(), eps)
+    actual = np.maximum(actual / actual.sum(), eps)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def summarize_column(values, n_bins=10):
+    """Summary stats, quantiles and a histogram of one numeric column."""
+    values = pd.to_numeric(pd.Series(values), errors="coerce").astype("float64")
+    present = values.dropna().to_numpy()
+    summary = {"count": int(len(present)), "missing": int(values.isna().sum())}
+    if not len(present):
+        return summary
+
+    bins = _bins(present, n_bins)
+    summary.update(
+        {
+            "mean": float(present.mean()),
+            "std": float(present.std()),
+            "min": float(present.min()),
+            "max": float(present.max()),
+            "quantiles": dict(
+                zip(
+                    map(str, PROFILE_QUANTILES),
+                    np.quantile(present, PROFILE_QUANTILES).tolist(),
+                )
+            ),
+            "bins": bins,
+            "counts": bin_counts(present, bins).tolist(),
+        }
+    )
+    return summary
+
+
+def build_reference_profile(run_id, training_data, predictions, n_bins=10):
+    """Profile a model's training data and its predictions on it.
+
+    Args:
+        run_id (str): MLflow run ID of the model.
+        training_data (pd.DataFrame): Data the model was trained on.
+        predictions (array-like): The model's predictions on `training_data`.
+        n_bins (int, optional): Histogram bins per column. Defaults to 10.
+
+    Returns:
+        dict: Profile with a summary (see `summarize_column()`) of every numeric
+        column and of the predictions.
+    """
+    numeric = training_data.select_dtypes("number")
+    columns = {name: summarize_column(numeric[name], n_bins) for name in numeric}
+    columns["predictions"] = summarize_column(predictions, n_bins)
+    return {
+        "run_id": run_id,
+        "created": datetime.datetime.now().isoformat(),
+        "n_rows": int(len(training_data)),
+        "n_bins": n_bins,
+        "columns": columns,
+    }
+
+
+def load_reference_profile(
+    run_id, model_uri=None, model=None, data_dir="training_data", n_bins=10
+):
+    """Load the reference profile of a model run, building it the first time.
+
+    Building it reads `{data_dir}/{run_id}-training_data.csv` and predicts on it,
+    which only happens once per run: the profile and the predictions (with the
+    target, for performance reports) are then saved next to the training data.
+
+    Args:
+        run_id (str): MLflow run ID of the model.
+        model_uri (str, optional): URI to load the model from, only needed if
+        the profile hasn't been built yet and `model` isn't given.
+        model (mlflow.pyfunc.PyFuncModel, optional): The model, if it is
+        already loaded.
+        data_dir (str, optional): Directory of the training data.
+        n_bins (int, optional): Histogram bins per column when building.
+
+    Returns:
+        dict: The profile (see `build_reference_profile()`).
+    """
+    profile_path, predictions_path = profile_paths(run_id, data_dir)
+    if os.path.exists(profile_path):
+        with open(profile_path) as f:
+            return json.load(f)
+
+    if model is None:
+        if model_uri is None:
+            raise ValueError(
+                f"No reference profile for run {run_id}: pass model_uri or model "
+                "to build it"
+            )
+        # only needed the first time, so MLflow isn't imported otherwise
+        import mlflow.pyfunc
+
+        model = mlflow.pyfunc.load_model(model_uri)
+
+    training_data = pd.read_csv(os.path.join(data_dir, f"{run_id}-training_data.csv"))
+    predictions = np.asarray(model.predict(training_data), dtype="float64")
+    profile = build_reference_profile(run_id, training_data, predictions, n_bins)
+
+    reference = pd.DataFrame({"predictions": predictions})
+    if "demand" in training_data:
+        reference.insert(0, "demand", training_data["demand"].to_numpy())
+    # several workers may build the profile at once, so each writes its own
+    # temporary files and renames them into place
+    tmp_path = f"{predictions_path}.{os.getpid()}.tmp"
+    reference.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, predictions_path)
+
+    # write the profile last, as its presence marks the cache as complete
+    tmp_path = f"{profile_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+    os.replace(tmp_path, profile_path)
+    return profile
+
+
+def load_reference_predictions(run_id, data_dir="training_data"):
+    """Cached predictions on the training data (with the target if it was
+    available), saved by `load_reference_profile()`."""
+    return pd.read_parquet(profile_paths(run_id, data_dir)[1])
+
+
+def compare_to_profile(profile, current, columns=None, psi_threshold=PSI_THRESHOLD):
+    """Compare a window of current data against a reference profile.
+
+    Args:
+        profile (dict): Reference profile.
+        current (pd.DataFrame): Current data, e.g. recent prediction logs.
+        columns (list, optional): Columns to compare. Defaults to every profiled
+        column in `current`.
+        psi_threshold (float, optional): PSI at or above which a column is
+        flagged as drifted.
+
+    Returns:
+        pd.DataFrame: One row per column with the reference and current mean and
+        standard deviation, the PSI and whether the column drifted.
+    """
+    if columns is None:
+        columns = [name for name in profile["columns"] if name in current]
+
+    rows = []
+    for name in columns:
+        reference = profile["columns"][name]
+        values = pd.to_numeric(current[name], errors="coerce").astype("float64")
+        psi = (
+            population_stability_index(
+                reference["counts"], bin_counts(values, reference["bins"])
+            )
+            if "bins" in reference
+            else float("nan")
+        )
+        rows.append(
+            {
+                "column": name,
+                "reference_mean": reference.get("mean"),
+                "current_mean": values.mean(),
+                "reference_std": reference.get("std"),
+                "current_std": values.std(),
+                "psi": psi,
+                "drifted": psi >= psi_threshold,
+            }
+        )
+    return pd.DataFrame(rows)
@@ -0,0 +1,258 @@
+"""Serve a FastAPI app from several pre-forked uvicorn workers.
+
+Example:
+    python serve_supervisor.py fastapi_app:app --workers 4 --port 5000
+"""
+
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import uvicorn
+
+
+class Supervisor:
+    """Run `workers` uvicorn processes forked from one parent that loaded the
+    model, so they share its memory instead of each loading a copy.
+
+    The parent imports the app and, if the app module has a `loader` (see
+    model_loader.py), loads the model. It then freezes the garbage collector,
+    so the collector doesn't write to (and thereby copy) the model's pages,
+    and forks the workers. They accept connections on one shared socket and
+    each set up their own executors, batcher and threads at startup. Pages are
+    only copied when a worker writes to them, e.g. when the model is hot
+    swapped.
+
+    Workers that exit are restarted. SIGTERM or SIGINT is passed on to the
+    workers, which stop accepting connections and finish the requests in
+    progress, and any still running after `graceful_timeout` seconds are
+    killed. An optional Streamlit app is run (and restarted) alongside.
+
+    Args:
+        app (str): The app as "module:attribute", e.g. "fastapi_app:app".
+        host (str, optional): Interface to listen on. Defaults to "0.0.0.0".
+        port (int, optional): Port to listen on. Defaults to 5000.
+        workers (int, optional): Worker processes. Defaults to 1.
+        pin_cpus (bool, optional): Pin each worker to its own CPU (Linux only).
+        graceful_timeout (float, optional): Seconds workers get to finish their
+        requests on shutdown. Defaults to 30.
+        streamlit (str, optional): Streamlit script to run alongside.
+
+    Example:
+        >>> Supervisor("fastapi_app:app", workers=4, streamlit="streamlit_app.py").run()
+    """
+
+    def __init__(
+        self,
+        app,
+        host="0.0.0.0",
+        port=5000,
+        workers=1,
+        pin_cpus=False,
+        graceful_timeout=30.0,
+        streamlit=None,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.pin_cpus = pin_cpus
+        self.graceful_timeout = graceful_timeout
+        self.streamlit = streamlit
+        self.restarts = 0
+        self._children = {}  # pid -> worker number
+        self._streamlit_process = None
+        self._stopping = False
+
+    def preload(self):
+        """Import the app and load its model in the parent process.
+
+        Returns:
+            The ASGI app.
+        """
+        module_name, attribute = self.app.split(":")
+        module = importlib.import_module(module_name)
+        loader = getattr(module, "loader", None)
+        if loader is not None:
+            loader.load()
+            print(loader.summary())
+        return getattr(module, attribute)
+
+    def _listen(self):
+        # asyncio only turns off Nagle's algorithm on connections from sockets
+        # with an explicit TCP protocol, otherwise small responses are delayed
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _cpus(self):
+        if hasattr(os, "sched_getaffinity"):
+            return sorted(os.sched_getaffinity(0))
+        return list(range(os.cpu_count() or 1))
+
+    def _spawn(self, app, sock, number):
+        """Fork worker `number`."""
+        pid = os.fork()
+        if pid:
+            self._children[pid] = number
+            return
+
+        # in the worker
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        gc.unfreeze()
+        if self.pin_cpus:
+            cpus = self._cpus()
+            if hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(0, {cpus[number % len(cpus)]})
+        config = uvicorn.Config(
+            app,
+            log_level="info",
+            timeout_graceful_shutdown=self.graceful_timeout,
+        )
+        try:
+            uvicorn.Server(config).run(sockets=[sock])
+        finally:
+            os._exit(0)
+
+    def _start_streamlit(self):
+        self._streamlit_process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", self.streamlit]
+        )
+
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT."""
+        sock = self._listen()
+        app = self.preload()
+        if self.streamlit is not None:
+            self._start_streamlit()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+
+        # objects created so far (the model above all) are left alone by the
+        # garbage collector from now on
+        gc.collect()
+        gc.freeze()
+        for number in range(self.workers):
+            self._spawn(app, sock, number)
+        print(f"Serving {self.app} on {self.host}:{self.port} with {self.workers} workers")
+
+        started = {number: time.monotonic() for number in range(self.workers)}
+        while not self._stopping:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid in self._children:
+                number = self._children.pop(pid)
+                print(f"Worker {number} (pid {pid}) exited with status {status}, restarting")
+                # don't restart a worker that keeps failing at startup in a tight loop
+                if time.monotonic() - started[number] < 1.0:
+                    time.sleep(1.0)
+                self.restarts += 1
+                started[number] = time.monotonic()
+                self._spawn(app, sock, number)
+            elif (
+                self._streamlit_process is not None
+                and self._streamlit_process.poll() is not None
+            ):
+                print("Streamlit exited, restarting")
+                self._start_streamlit()
+            else:
+                time.sleep(0.2)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the workers (and Streamlit), waiting up to `graceful_timeout`
+        seconds for them to finish the requests in progress."""
+        print(f"Shutting down {len(self._children)} workers...")
+        for pid in self._children:
+            os.kill(pid, signal.SIGTERM)
+        if self._streamlit_process is not None:
+            self._streamlit_process.terminate()
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self._children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self._children:
+            os.kill(pid, signal.SIGKILL)
+        if self._streamlit_process is not None:
+            try:
+                self._streamlit_process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._streamlit_process.kill()
+
+
+def supervisor_from_env(app, port=5000, streamlit=None, workers=None):
+    """Create a `Supervisor` configured through environment variables:
+
+    - `SERVE_WORKERS`: worker processes (defaults to `workers`, or the number
+      of CPUs available).
+    - `SERVE_PIN_CPUS`: set to "1" or "true" to pin each worker to a CPU.
+    - `SERVE_GRACEFUL_TIMEOUT`: seconds workers get to finish their requests
+      on shutdown (defaults to 30).
+
+    Args:
+        app (str): The app as "module:attribute".
+        port (int, optional): Port to listen on. Defaults to 5000.
+        streamlit (str, optional): Streamlit script to run alongside.
+        workers (int, optional): Worker processes if `SERVE_WORKERS` isn't set.
+        Defaults to the number of CPUs available.
+
+    Returns:
+        Supervisor: The supervisor (call `run()` to start it).
+    """
+    if workers is None:
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+        workers = cpus or os.cpu_count() or 1
+    return Supervisor(
+        app,
+        port=port,
+        workers=int(os.getenv("SERVE_WORKERS", str(workers))),
+        pin_cpus=os.getenv("SERVE_PIN_CPUS", "").lower() in ("1", "true"),
+        graceful_timeout=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")),
+        streamlit=streamlit,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("app", help='The app, e.g. "fastapi_app:app"')
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument(
+        "--pin-cpus", action="store_true", help="Pin each worker to its own CPU"
+    )
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--streamlit", help="Streamlit script to run alongside")
+    args = parser.parse_args()
+
+    Supervisor(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        pin_cpus=args.pin_cpus,
+        graceful_timeout=args.graceful_timeout,
+        streamlit=args.streamlit,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()